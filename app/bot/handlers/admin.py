@@ -336,9 +336,9 @@ async def admin_group_record_book_status(callback: CallbackQuery):
          return
          
     from app.bot.fio_mapping import get_fio_by_record_book
-    from app.core.repositories.subject import get_global_subject_stats, get_cluster_subject_stats
-    from app.core.repositories.rating import get_rating_position
-    from app.core.repositories.schedule import get_teachers_for_subject
+    from app.core.repositories.subject import get_global_subject_stats_bulk, get_cluster_subject_stats
+    from app.core.repositories.rating import get_rating_positions
+    from app.core.repositories.schedule import get_teachers_for_subjects
     
     rb_data = record_books[rec_idx]
     rb_num = rb_data['record_book']
@@ -350,37 +350,21 @@ async def admin_group_record_book_status(callback: CallbackQuery):
         return
 
     # Fetch rating info
-    rating_info = {}
-    for scope in ["cluster", "year", "all"]:
-        pos = await get_rating_position(rb_num, scope)
-        if pos:
-            rating_info[f"{scope}_pos"] = pos
-    
+    rating_info = await get_rating_positions(rb_num)
     if not rating_info:
         rating_info = None
 
     # Fetch subject stats
-    subject_stats = {}
     cluster_subject_stats = await get_cluster_subject_stats(cluster_id)
-    
-    for s in subjects:
-        subj_name = s.get("subject", "").strip()
-        if subj_name and subj_name not in subject_stats:
-            stats = await get_global_subject_stats(subj_name)
-            if stats:
-                subject_stats[subj_name] = stats["pass_rate"]
+    subject_names = [name for name in (s.get("subject", "").strip() for s in subjects) if name]
+    subject_stats = {
+        name: stats["pass_rate"] for name, stats in (await get_global_subject_stats_bulk(subject_names)).items()
+    }
 
     # Fetch teacher info
     teacher_map = {}
     if group_name:
-        seen_subjects = set()
-        for s in subjects:
-            subj_name = s.get("subject", "").strip()
-            if subj_name and subj_name not in seen_subjects:
-                seen_subjects.add(subj_name)
-                teachers = await get_teachers_for_subject(group_name, subj_name)
-                if teachers:
-                    teacher_map[subj_name] = teachers
+        teacher_map = await get_teachers_for_subjects(group_name, subject_names)
 
     # Use shared formatter
     fio_str = get_fio_by_record_book(rb_num)
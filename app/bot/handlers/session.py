@@ -10,9 +10,7 @@ from app.core.repositories.user import (
 from app.core.repositories.subject import (
     get_subject_note, save_subject_note
 )
-from app.core.repositories.rating import (
-    get_student_cluster_info, get_rating_position
-)
+from app.core.repositories.rating import get_student_cluster_info
 from app.bot.formatter import (
     get_course_from_semester, filter_results_by_settings, format_results, escape_md
 )
@@ -26,10 +24,10 @@ router = Router()
 
 
 async def show_results_view(target: Message | CallbackQuery, user_id: int, record_book_number: str):
-    from app.core.repositories.subject import get_global_subject_stats, get_cluster_subject_stats
-    from app.core.repositories.rating import get_rating_position, get_group_by_record_book
-    from app.core.repositories.schedule import get_teachers_for_subject
-    from app.core.database import get_db_connection
+    from app.core.repositories.subject import get_global_subject_stats_bulk, get_cluster_subject_stats
+    from app.core.repositories.rating import get_rating_positions, get_group_by_record_book
+    from app.core.repositories.schedule import get_teachers_for_subjects
+    from app.core.database import get_read_connection
     msg = target if isinstance(target, Message) else target.message
     if isinstance(target, Message):
         msg = await target.answer(f"🔍 Ищу результаты для зачетки: *{record_book_number}*...", parse_mode="Markdown")
@@ -46,26 +44,14 @@ async def show_results_view(target: Message | CallbackQuery, user_id: int, recor
         text = "❌ Ошибка при получении данных. Попробуйте позже."
         await msg.edit_text(text, reply_markup=get_session_results_keyboard())
     else:
-        # Получаем рейтинговую информацию (если доступна)
-        rating_info = {}
-        cluster_pos = await get_rating_position(record_book_number, "cluster")
-        if cluster_pos:
-            rating_info["cluster_pos"] = cluster_pos
-            
-        year_pos = await get_rating_position(record_book_number, "year")
-        if year_pos:
-            rating_info["year_pos"] = year_pos
-            
-        all_pos = await get_rating_position(record_book_number, "all")
-        if all_pos:
-            rating_info["all_pos"] = all_pos
-            
+        # Получаем рейтинговую информацию (если доступна) — все три позиции одним запросом
+        rating_info = await get_rating_positions(record_book_number)
         if not rating_info:
             rating_info = None
             
         # We need cluster_id to fetch cluster subject stats
         cluster_id = None
-        db = await get_db_connection()
+        db = await get_read_connection()
         async with db.execute("SELECT cluster_id FROM rating_data WHERE record_book = ?", (record_book_number,)) as cur:
             row = await cur.fetchone()
             if row and row[0]:
@@ -75,26 +61,16 @@ async def show_results_view(target: Message | CallbackQuery, user_id: int, recor
         if cluster_id:
             cluster_subject_stats = await get_cluster_subject_stats(cluster_id)
             
-        subject_stats = {}
-        for item in results_data:
-            subj_name = item.get("subject", "").strip()
-            if subj_name and subj_name not in subject_stats:
-                stats = await get_global_subject_stats(subj_name)
-                if stats:
-                    subject_stats[subj_name] = stats["pass_rate"]
+        subjects = [name for name in (item.get("subject", "").strip() for item in results_data) if name]
+        subject_stats = {
+            name: stats["pass_rate"] for name, stats in (await get_global_subject_stats_bulk(subjects)).items()
+        }
         
         # Определяем группу студента и преподавателей
         teacher_map = {}
         student_group = await get_group_by_record_book(record_book_number)
         if student_group:
-            seen_subjects = set()
-            for item in results_data:
-                subj_name = item.get("subject", "").strip()
-                if subj_name and subj_name not in seen_subjects:
-                    seen_subjects.add(subj_name)
-                    teachers = await get_teachers_for_subject(student_group, subj_name)
-                    if teachers:
-                        teacher_map[subj_name] = teachers
+            teacher_map = await get_teachers_for_subjects(student_group, subjects)
         
         formatted_text = format_results(results_data, settings, rating_info, subject_stats, cluster_subject_stats, teacher_map)
         if len(formatted_text) > 4000:
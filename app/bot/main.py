@@ -8,6 +8,7 @@ from apscheduler.schedulers.asyncio import AsyncIOScheduler
 from app.core.config import TELEGRAM_BOT_TOKEN
 from app.core.state import GlobalState
 from app.core.database import initialize_database
+from app.core.http_client import close_http_clients
 from app.services.schedule_sync import run_full_sync
 from app.bot.handlers import common, schedule, teachers, session, admin, rating, subject_rating
 
@@ -88,7 +89,10 @@ async def start_bot():
     await bot.set_my_commands(commands)
     
     await bot.delete_webhook(drop_pending_updates=True)
-    await dp.start_polling(bot)
+    try:
+        await dp.start_polling(bot)
+    finally:
+        await close_http_clients()
 
 if __name__ == "__main__":
     from app.core.logger import setup_logging
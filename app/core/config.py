@@ -20,6 +20,8 @@ BB_URL = config("BB_URL", default="https://bb.usurt.ru/")
 DATA_DIR = os.path.join(BASE_DIR, "data")
 DB_PATH = os.path.join(DATA_DIR, "schedule.db")
 DOWNLOAD_DIR = os.path.join(DATA_DIR, "schedules")
+# Число read-only подключений к SQLite для чтения (0 — всё через одно подключение)
+DB_READ_POOL_SIZE = config("DB_READ_POOL_SIZE", default=4, cast=int)
 
 # Настройки парсинга рейтинга
 _parsing_years_str = config("PARSING_YEARS", default="")
@@ -38,6 +40,35 @@ else:
 
 MAX_CONSECUTIVE_NOT_FOUND = config("MAX_CONSECUTIVE_NOT_FOUND", default=20, cast=int)
 RATING_PARSER_WORKERS = config("RATING_PARSER_WORKERS", default=3, cast=int)
+# Адаптивный лимит запросов к report.usurt.ru (общий для обхода, трекинга и живых запросов):
+# верхние границы темпа (HTTP-запросов/с) и окна параллельности, целевое время ответа (с)
+REPORT_RATE_MAX = config("REPORT_RATE_MAX", default=4.0, cast=float)
+REPORT_CONCURRENCY_MAX = config("REPORT_CONCURRENCY_MAX", default=8, cast=int)
+REPORT_TARGET_LATENCY = config("REPORT_TARGET_LATENCY", default=2.0, cast=float)
+
+# Общий keep-alive пул HTTP-соединений: всего соединений, на один хост, TTL кэша DNS и простоя (с)
+HTTP_POOL_LIMIT = config("HTTP_POOL_LIMIT", default=32, cast=int)
+HTTP_LIMIT_PER_HOST = config("HTTP_LIMIT_PER_HOST", default=10, cast=int)
+HTTP_DNS_CACHE_TTL = config("HTTP_DNS_CACHE_TTL", default=300, cast=int)
+HTTP_KEEPALIVE_TIMEOUT = config("HTTP_KEEPALIVE_TIMEOUT", default=30, cast=float)
+# Пакетная запись рейтинга: commit каждые N зачёток или T секунд
+RATING_FLUSH_RECORDS = config("RATING_FLUSH_RECORDS", default=200, cast=int)
+RATING_FLUSH_SECONDS = config("RATING_FLUSH_SECONDS", default=30, cast=float)
+
+# Параллельный обход Blackboard: число одновременных запросов, соединений на хост и попыток
+BB_CRAWL_CONCURRENCY = config("BB_CRAWL_CONCURRENCY", default=6, cast=int)
+BB_CRAWL_PER_HOST = config("BB_CRAWL_PER_HOST", default=6, cast=int)
+BB_CRAWL_RETRIES = config("BB_CRAWL_RETRIES", default=3, cast=int)
+
+# Число процессов для разбора xls-файлов расписания (1 — без пула процессов)
+SCHEDULE_PARSE_WORKERS = config("SCHEDULE_PARSE_WORKERS", default=min(4, os.cpu_count() or 1), cast=int)
+# Быстрое чтение xls/xlsx: строки целиком, без str() для каждой ячейки
+SCHEDULE_FAST_READER = config("SCHEDULE_FAST_READER", default=True, cast=bool)
+
+# Режим записи расписания в БД:
+#   "swap" — новая таблица собирается в schedule_staging и подменяется переименованием,
+#   "diff" — применяем только изменения, "full" — DELETE + полная вставка
+SCHEDULE_SYNC_MODE = config("SCHEDULE_SYNC_MODE", default="swap")
 DATA_DIR = os.path.join(BASE_DIR, "data")
 DB_PATH = os.path.join(DATA_DIR, "schedule.db")
 DOWNLOAD_DIR = os.path.join(DATA_DIR, "schedules")
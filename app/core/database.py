@@ -3,10 +3,24 @@ import aiosqlite
 import logging
 import json
 from typing import List, Dict, Any, Tuple
-from app.core.config import DB_PATH
+from urllib.request import pathname2url
+from app.core.config import DB_PATH, DB_READ_POOL_SIZE
 import os
 
 _global_db_conn = None
+# Пул read-only подключений для чтения из репозиториев (WAL позволяет читать параллельно с записью).
+# Принадлежит конкретному писателю: если _global_db_conn подменён или закрыт, чтение идёт через писателя.
+_read_pool: List[aiosqlite.Connection] = []
+_read_pool_owner = None
+_read_pool_next = 0
+
+# Индексы таблицы schedule. После публикации через staging-swap (см. schedule_sync)
+# у живой таблицы они могут называться "<имя>_alt" — SQLite не умеет переименовывать индексы.
+SCHEDULE_INDEXES = {
+    "idx_group_date": "(group_name, lesson_date)",
+    "idx_faculty_course_group": "(faculty, course, group_name)",
+    "idx_teacher_date": "(teacher, lesson_date)",
+}
 
 async def get_db_connection():
     """Возвращает глобальное подключение к БД."""
@@ -19,9 +33,49 @@ async def get_db_connection():
         _global_db_conn.row_factory = aiosqlite.Row
     return _global_db_conn
 
+async def open_read_pool(size: int = DB_READ_POOL_SIZE):
+    """Открывает пул read-only подключений (mode=ro, query_only) к той же БД, что и писатель."""
+    global _read_pool_owner, _read_pool_next
+    await close_read_pool()
+    if size <= 0 or DB_PATH == ":memory:":
+        return
+    writer = await get_db_connection()
+    uri = f"file:{pathname2url(os.path.abspath(DB_PATH))}?mode=ro"
+    try:
+        for _ in range(size):
+            conn = await aiosqlite.connect(uri, uri=True)
+            await conn.execute("PRAGMA query_only=ON;")
+            conn.row_factory = aiosqlite.Row
+            _read_pool.append(conn)
+    except Exception as e:
+        logging.error(f"Не удалось открыть пул чтения БД, чтение пойдёт через основное подключение: {e}")
+        await close_read_pool()
+        return
+    _read_pool_owner = writer
+    _read_pool_next = 0
+
+async def close_read_pool():
+    global _read_pool_owner
+    _read_pool_owner = None
+    while _read_pool:
+        await _read_pool.pop().close()
+
+async def get_read_connection():
+    """
+    Возвращает подключение для чтения: следующее из пула (по кругу) или,
+    если пул не открыт для текущего писателя, глобальное подключение.
+    """
+    global _read_pool_next
+    if not _read_pool or _read_pool_owner is None or _read_pool_owner is not _global_db_conn:
+        return await get_db_connection()
+    conn = _read_pool[_read_pool_next % len(_read_pool)]
+    _read_pool_next += 1
+    return conn
+
 async def close_db_connection():
-    """Закрывает глобальное подключение (для тестов/завершения)."""
+    """Закрывает глобальное подключение и пул чтения (для тестов/завершения)."""
     global _global_db_conn
+    await close_read_pool()
     if _global_db_conn is not None:
         await _global_db_conn.close()
         _global_db_conn = None
@@ -128,9 +182,71 @@ async def initialize_database():
             cluster_id INTEGER,
             is_expelled INTEGER DEFAULT 0,
             last_academic_year TEXT,
-            last_updated TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+            last_updated TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            cluster_dirty INTEGER DEFAULT 1
+        )
+    """)
+
+    # cluster_dirty = 1 — набор предметов изменился после последней кластеризации
+    try:
+        await db.execute("ALTER TABLE rating_data ADD COLUMN cluster_dirty INTEGER DEFAULT 1")
+        await db.commit()
+    except aiosqlite.OperationalError:
+        pass
+
+    # Нормализованные результаты по предметам (синхронизируются с rating_data.subjects_json при записи)
+    await db.execute("""
+        CREATE TABLE IF NOT EXISTS subjects (
+            id INTEGER PRIMARY KEY,
+            name TEXT NOT NULL UNIQUE
+        )
+    """)
+    await db.execute("""
+        CREATE TABLE IF NOT EXISTS rating_subjects (
+            record_book TEXT NOT NULL,
+            seq INTEGER NOT NULL,          -- порядок предмета в subjects_json
+            subject_id INTEGER NOT NULL REFERENCES subjects (id),
+            semester TEXT,
+            grade TEXT,
+            grade_value INTEGER,
+            passed INTEGER NOT NULL DEFAULT 0,
+            date TEXT,
+            PRIMARY KEY (record_book, seq)
+        )
+    """)
+    await db.execute("CREATE INDEX IF NOT EXISTS idx_rating_subjects_subject ON rating_subjects (subject_id, record_book)")
+
+    # Материализованный рейтинг неотчисленных: места и размеры областей (кластер, год, все).
+    # Пересчитывается rebuild_rating_ranks после кластеризации и импорта
+    await db.execute("""
+        CREATE TABLE IF NOT EXISTS rating_ranks (
+            record_book TEXT PRIMARY KEY,
+            enrollment_year INTEGER,
+            cluster_id INTEGER,
+            pass_rate REAL,
+            total_subjects INTEGER,
+            passed_subjects INTEGER,
+            cluster_rank INTEGER NOT NULL,
+            cluster_total INTEGER NOT NULL,
+            year_rank INTEGER NOT NULL,
+            year_total INTEGER NOT NULL,
+            all_rank INTEGER NOT NULL,
+            all_total INTEGER NOT NULL
+        )
+    """)
+    await db.execute("CREATE INDEX IF NOT EXISTS idx_rating_ranks_cluster ON rating_ranks (cluster_id, cluster_rank, record_book)")
+    await db.execute("CREATE INDEX IF NOT EXISTS idx_rating_ranks_year ON rating_ranks (enrollment_year, year_rank, record_book)")
+    await db.execute("CREATE INDEX IF NOT EXISTS idx_rating_ranks_all ON rating_ranks (all_rank, record_book)")
+
+    # Центроиды кластеров (набор предметов студента-основателя) для инкрементальной кластеризации
+    await db.execute("""
+        CREATE TABLE IF NOT EXISTS cluster_centroids (
+            cluster_id INTEGER PRIMARY KEY,
+            enrollment_year INTEGER NOT NULL,
+            subjects_json TEXT NOT NULL
         )
     """)
+    await db.execute("CREATE INDEX IF NOT EXISTS idx_cluster_centroids_year ON cluster_centroids (enrollment_year)")
     
     # Отчисленные студенты
     await db.execute("""
@@ -156,9 +272,13 @@ async def initialize_database():
         logging.error(f"Migration expelled_students error: {e}")
     
     # --- Индексы для оптимизации выборок ---
-    await db.execute("CREATE INDEX IF NOT EXISTS idx_group_date ON schedule (group_name, lesson_date)")
-    await db.execute("CREATE INDEX IF NOT EXISTS idx_faculty_course_group ON schedule (faculty, course, group_name)")
-    await db.execute("CREATE INDEX IF NOT EXISTS idx_teacher_date ON schedule (teacher, lesson_date)")
+    for index_name, columns in SCHEDULE_INDEXES.items():
+        async with db.execute(
+            "SELECT 1 FROM sqlite_master WHERE type = 'index' AND tbl_name = 'schedule' AND name IN (?, ?)",
+            (index_name, f"{index_name}_alt"),
+        ) as cursor:
+            if not await cursor.fetchone():
+                await db.execute(f"CREATE INDEX IF NOT EXISTS {index_name} ON schedule {columns}")
     await db.execute("CREATE INDEX IF NOT EXISTS idx_rating_cluster ON rating_data (cluster_id)")
     await db.execute("CREATE INDEX IF NOT EXISTS idx_rating_year ON rating_data (enrollment_year)")
 
@@ -240,4 +360,11 @@ async def initialize_database():
 
     await db.commit()
 
+    # Заполняем rating_subjects для записей, которых там ещё нет (первый запуск, импорт БД)
+    from app.core.repositories.rating import sync_rating_subjects, rebuild_rating_ranks
+    await sync_rating_subjects()
+    await rebuild_rating_ranks()
+
+    await open_read_pool()
+
 
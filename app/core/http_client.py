@@ -0,0 +1,67 @@
+# FILE: app/core/http_client.py
+"""
+Общий пул HTTP-соединений приложения для запросов к report.usurt.ru.
+
+Один TCPConnector на процесс: keep-alive соединения, кэш DNS и лимит на хост
+переиспользуются всеми запросами, поэтому TCP/TLS-рукопожатие платится один раз.
+Сессии (cookies, заголовки) при этом у каждого вызывающего свои — ASP.NET-сессия
+сайта привязана к cookies и не должна смешиваться между пользователями.
+Пул создаётся лениво и закрывается в lifespan веба и при остановке бота.
+"""
+import asyncio
+
+import aiohttp
+
+from app.core.config import HTTP_POOL_LIMIT, HTTP_LIMIT_PER_HOST, HTTP_DNS_CACHE_TTL, HTTP_KEEPALIVE_TIMEOUT
+
+_connector: aiohttp.TCPConnector | None = None
+_connector_loop: asyncio.AbstractEventLoop | None = None
+
+
+async def _close_connector(connector: aiohttp.TCPConnector):
+    await connector.close()
+
+
+def _discard_connector(connector: aiohttp.TCPConnector, loop: asyncio.AbstractEventLoop | None):
+    """
+    Закрывает коннектор, оставшийся от другого event loop. Закрывать его нужно
+    в его собственном loop; если тот уже закрыт, вместе с ним закрыт и селектор,
+    и освобождать в коннекторе больше нечего.
+    """
+    if connector.closed or loop is None or loop.is_closed():
+        return
+    asyncio.run_coroutine_threadsafe(_close_connector(connector), loop)
+
+
+def get_http_connector() -> aiohttp.TCPConnector:
+    """Возвращает общий коннектор текущего event loop (создаёт при первом вызове)."""
+    global _connector, _connector_loop
+    loop = asyncio.get_running_loop()
+    if _connector is None or _connector.closed or _connector_loop is not loop:
+        if _connector is not None and _connector_loop is not loop:
+            _discard_connector(_connector, _connector_loop)
+        _connector = aiohttp.TCPConnector(
+            limit=HTTP_POOL_LIMIT,
+            limit_per_host=HTTP_LIMIT_PER_HOST,
+            ttl_dns_cache=HTTP_DNS_CACHE_TTL,
+            keepalive_timeout=HTTP_KEEPALIVE_TIMEOUT,
+        )
+        _connector_loop = loop
+    return _connector
+
+
+def create_http_session(**kwargs) -> aiohttp.ClientSession:
+    """
+    Новая ClientSession со своими cookies поверх общего пула соединений.
+    Закрытие сессии пул не закрывает (connector_owner=False).
+    """
+    return aiohttp.ClientSession(connector=get_http_connector(), connector_owner=False, **kwargs)
+
+
+async def close_http_clients():
+    """Закрывает общий пул соединений (при остановке бота/веба и в тестах)."""
+    global _connector, _connector_loop
+    if _connector is not None:
+        await _connector.close()
+    _connector = None
+    _connector_loop = None
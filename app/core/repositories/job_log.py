@@ -1,7 +1,7 @@
 import json
 from datetime import datetime
 from typing import List
-from app.core.database import get_db_connection
+from app.core.database import get_db_connection, get_read_connection
 
 async def save_job_log(job_name: str, start_time: datetime, end_time: datetime, status: str, details: dict):
     db = await get_db_connection()
@@ -18,7 +18,7 @@ async def save_job_log(job_name: str, start_time: datetime, end_time: datetime,
     await db.commit()
 
 async def get_last_two_job_logs(job_name: str) -> List[dict]:
-    db = await get_db_connection()
+    db = await get_read_connection()
     async with db.execute(
         "SELECT start_time, end_time, status, details_json FROM job_logs WHERE job_name = ? ORDER BY start_time DESC LIMIT 2", 
         (job_name,)
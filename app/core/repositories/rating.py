@@ -1,7 +1,27 @@
 import json
+import logging
 from datetime import datetime
 from typing import List, Dict, Tuple
-from app.core.database import get_db_connection
+from app.core.database import get_db_connection, get_read_connection
+
+# Размер пачки параметров для IN (...) / executemany
+SQL_CHUNK = 500
+
+UPSERT_RATING_SQL = """
+    INSERT INTO rating_data
+        (record_book, enrollment_year, subjects_json, total_subjects,
+         passed_subjects, pass_rate, last_academic_year, last_updated)
+    VALUES (?, ?, ?, ?, ?, ?, ?, CURRENT_TIMESTAMP)
+    ON CONFLICT(record_book) DO UPDATE SET
+        subjects_json=excluded.subjects_json,
+        total_subjects=excluded.total_subjects,
+        passed_subjects=excluded.passed_subjects,
+        pass_rate=excluded.pass_rate,
+        last_academic_year=excluded.last_academic_year,
+        last_updated=CURRENT_TIMESTAMP,
+        cluster_dirty=CASE WHEN rating_data.subjects_json IS excluded.subjects_json
+                           THEN rating_data.cluster_dirty ELSE 1 END
+"""
 
 async def save_rating_record(
     record_book: str,
@@ -13,22 +33,119 @@ async def save_rating_record(
     last_academic_year: str,
 ):
     """Сохраняет или обновляет рейтинговые данные одной зачётки."""
+    await save_rating_records([(record_book, enrollment_year, subjects_json, total_subjects,
+                                passed_subjects, pass_rate, last_academic_year)])
+
+async def save_rating_records(records: List[tuple]):
+    """
+    Сохраняет пачку зачёток одной транзакцией.
+    records: [(record_book, enrollment_year, subjects_json, total_subjects,
+               passed_subjects, pass_rate, last_academic_year)]
+    """
+    if not records:
+        return
     db = await get_db_connection()
-    await db.execute("""
-        INSERT INTO rating_data
-            (record_book, enrollment_year, subjects_json, total_subjects,
-             passed_subjects, pass_rate, last_academic_year, last_updated)
-        VALUES (?, ?, ?, ?, ?, ?, ?, CURRENT_TIMESTAMP)
-        ON CONFLICT(record_book) DO UPDATE SET
-            subjects_json=excluded.subjects_json,
-            total_subjects=excluded.total_subjects,
-            passed_subjects=excluded.passed_subjects,
-            pass_rate=excluded.pass_rate,
-            last_academic_year=excluded.last_academic_year,
-            last_updated=CURRENT_TIMESTAMP
-    """, (record_book, enrollment_year, subjects_json, total_subjects,
-          passed_subjects, pass_rate, last_academic_year))
-    await db.commit()
+    try:
+        # rating_subjects переписываем только для зачёток, у которых изменился subjects_json
+        previous = {}
+        books = [rec[0] for rec in records]
+        for i in range(0, len(books), SQL_CHUNK):
+            chunk = books[i:i + SQL_CHUNK]
+            async with db.execute(
+                f"SELECT record_book, subjects_json FROM rating_data WHERE record_book IN ({','.join('?' * len(chunk))})",
+                chunk,
+            ) as cursor:
+                previous.update({row[0]: row[1] for row in await cursor.fetchall()})
+        changed = [(rec[0], rec[2]) for rec in records if rec[0] not in previous or previous[rec[0]] != rec[2]]
+
+        await db.executemany(UPSERT_RATING_SQL, records)
+        await _replace_rating_subjects(db, changed)
+        await db.commit()
+    except Exception:
+        await db.rollback()
+        raise
+
+async def _replace_rating_subjects(db, rows: List[Tuple[str, str]]):
+    """
+    Переписывает rating_subjects для зачёток rows: [(record_book, subjects_json)].
+    Не коммитит — вызывается внутри транзакции записи rating_data.
+    """
+    if not rows:
+        return
+    parsed = []
+    names = set()
+    for record_book, subjects_json in rows:
+        try:
+            items = json.loads(subjects_json) if subjects_json else []
+        except json.JSONDecodeError:
+            items = []
+        entries = [item for item in items if isinstance(item, dict) and item.get("subject")]
+        parsed.append((record_book, entries))
+        names.update(item["subject"] for item in entries)
+
+    await db.executemany("DELETE FROM rating_subjects WHERE record_book = ?", [(book,) for book, _ in rows])
+    if not names:
+        return
+
+    await db.executemany("INSERT OR IGNORE INTO subjects (name) VALUES (?)", [(name,) for name in names])
+    subject_ids = {}
+    names_list = list(names)
+    for i in range(0, len(names_list), SQL_CHUNK):
+        chunk = names_list[i:i + SQL_CHUNK]
+        async with db.execute(
+            f"SELECT id, name FROM subjects WHERE name IN ({','.join('?' * len(chunk))})", chunk
+        ) as cursor:
+            subject_ids.update({row[1]: row[0] for row in await cursor.fetchall()})
+
+    await db.executemany(
+        """
+        INSERT INTO rating_subjects (record_book, seq, subject_id, semester, grade, grade_value, passed, date)
+        VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+        """,
+        [
+            (book, seq, subject_ids[item["subject"]], item.get("semester"), item.get("grade"),
+             item.get("grade_value"), 1 if item.get("passed") else 0, item.get("date"))
+            for book, entries in parsed
+            for seq, item in enumerate(entries)
+        ],
+    )
+
+async def sync_rating_subjects(record_books: List[str] | None = None):
+    """
+    Приводит rating_subjects в соответствие с rating_data.subjects_json.
+    record_books=None — дозаполняет записи, которых ещё нет в rating_subjects,
+    и удаляет строки удалённых зачёток; иначе переписывает указанные зачётки.
+    """
+    db = await get_db_connection()
+    if record_books is None:
+        query = """
+            SELECT record_book, subjects_json FROM rating_data rd
+            WHERE subjects_json IS NOT NULL AND subjects_json NOT IN ('', '[]')
+              AND NOT EXISTS (SELECT 1 FROM rating_subjects rs WHERE rs.record_book = rd.record_book)
+        """
+        async with db.execute(query) as cursor:
+            rows = [(row[0], row[1]) for row in await cursor.fetchall()]
+    else:
+        rows = []
+        for i in range(0, len(record_books), SQL_CHUNK):
+            chunk = record_books[i:i + SQL_CHUNK]
+            async with db.execute(
+                f"SELECT record_book, subjects_json FROM rating_data WHERE record_book IN ({','.join('?' * len(chunk))})",
+                chunk,
+            ) as cursor:
+                rows.extend((row[0], row[1]) for row in await cursor.fetchall())
+    try:
+        for i in range(0, len(rows), SQL_CHUNK):
+            await _replace_rating_subjects(db, rows[i:i + SQL_CHUNK])
+        await db.execute(
+            "DELETE FROM rating_subjects WHERE record_book NOT IN (SELECT record_book FROM rating_data)"
+        )
+        await db.commit()
+    except Exception:
+        await db.rollback()
+        raise
+    if rows:
+        logging.info(f"rating_subjects: синхронизировано {len(rows)} зачёток")
 
 async def update_rating_cluster(record_book: str, cluster_id: int, is_expelled: int):
     """Обновляет кластер и статус отчисления."""
@@ -39,26 +156,59 @@ async def update_rating_cluster(record_book: str, cluster_id: int, is_expelled:
     )
     await db.commit()
 
+async def update_rating_clusters(updates: List[Tuple[str, int]]):
+    """
+    Пакетно проставляет кластеры (не отчисленным) одной транзакцией и снимает cluster_dirty.
+    updates: [(record_book, cluster_id)]
+    """
+    if not updates:
+        return
+    db = await get_db_connection()
+    try:
+        await db.executemany(
+            "UPDATE rating_data SET cluster_id = ?, is_expelled = 0, cluster_dirty = 0 WHERE record_book = ?",
+            [(cluster_id, record_book) for record_book, cluster_id in updates],
+        )
+        await db.commit()
+    except Exception:
+        await db.rollback()
+        raise
+
 async def is_student_expelled_in_db(record_book: str) -> bool:
     """Проверяет, есть ли студент в таблице отчисленных."""
-    db = await get_db_connection()
+    db = await get_read_connection()
     async with db.execute("SELECT 1 FROM expelled_students WHERE record_book = ?", (record_book,)) as cursor:
         row = await cursor.fetchone()
         return bool(row)
 
 async def save_expelled_student(record_book: str, enrollment_year: int, cluster_id: int):
     """Сохраняет студента как отчисленного и удаляет из основного рейтинга."""
+    await save_expelled_students([(record_book, enrollment_year, cluster_id)])
+
+async def save_expelled_students(students: List[Tuple[str, int, int]]):
+    """
+    Пакетно переносит студентов в expelled_students и удаляет их из rating_data
+    одной транзакцией. students: [(record_book, enrollment_year, cluster_id)]
+    """
+    if not students:
+        return
     db = await get_db_connection()
-    await db.execute("""
-        INSERT OR IGNORE INTO expelled_students (record_book, enrollment_year, cluster_id)
-        VALUES (?, ?, ?)
-    """, (record_book, enrollment_year, cluster_id))
-    await db.execute("DELETE FROM rating_data WHERE record_book = ?", (record_book,))
-    await db.commit()
+    try:
+        await db.executemany("""
+            INSERT OR IGNORE INTO expelled_students (record_book, enrollment_year, cluster_id)
+            VALUES (?, ?, ?)
+        """, students)
+        books = [(record_book,) for record_book, _, _ in students]
+        await db.executemany("DELETE FROM rating_data WHERE record_book = ?", books)
+        await db.executemany("DELETE FROM rating_subjects WHERE record_book = ?", books)
+        await db.commit()
+    except Exception:
+        await db.rollback()
+        raise
 
 async def get_expelled_statistics() -> dict:
     """Возвращает статистику по отчисленным студентам (с начала года, семестра, всего)."""
-    db = await get_db_connection()
+    db = await get_read_connection()
     
     now = datetime.now()
     
@@ -91,73 +241,137 @@ async def get_expelled_statistics() -> dict:
         "all_record_books": all_record_books
     }
 
-async def get_rating_position(record_book: str, scope: str = "all") -> tuple[int, int] | None:
+RANK_COLUMNS = "cluster_rank, cluster_total, year_rank, year_total, all_rank, all_total"
+
+async def rebuild_rating_ranks() -> int:
     """
-    Возвращает (позиция, всего) в рейтинге.
-    scope: 'cluster' — по специальности, 'year' — по году, 'all' — все неотчисленные.
+    Пересчитывает rating_ranks оконными функциями одной транзакцией.
+    Место = число неотчисленных с pass_rate строго больше + 1 (RANK), как в прежнем
+    подсчёте COUNT(*): без кластера область "cluster" — все, без pass_rate — первое место.
+    Returns: число строк в рейтинге.
     """
     db = await get_db_connection()
-    # Получаем данные текущего студента
+    try:
+        await db.execute("DELETE FROM rating_ranks")
+        await db.execute(f"""
+            INSERT INTO rating_ranks (record_book, enrollment_year, cluster_id, pass_rate,
+                                      total_subjects, passed_subjects, {RANK_COLUMNS})
+            SELECT record_book, enrollment_year, cluster_id, pass_rate, total_subjects, passed_subjects,
+                   CASE WHEN cluster_id IS NULL THEN all_rank ELSE cluster_rank END,
+                   CASE WHEN cluster_id IS NULL THEN all_total ELSE cluster_total END,
+                   CASE WHEN enrollment_year IS NULL THEN 1 ELSE year_rank END,
+                   CASE WHEN enrollment_year IS NULL THEN 0 ELSE year_total END,
+                   all_rank, all_total
+            FROM (
+                SELECT record_book, enrollment_year, cluster_id, pass_rate, total_subjects, passed_subjects,
+                       CASE WHEN pass_rate IS NULL THEN 1
+                            ELSE RANK() OVER (PARTITION BY cluster_id ORDER BY pass_rate DESC) END AS cluster_rank,
+                       COUNT(*) OVER (PARTITION BY cluster_id) AS cluster_total,
+                       CASE WHEN pass_rate IS NULL THEN 1
+                            ELSE RANK() OVER (PARTITION BY enrollment_year ORDER BY pass_rate DESC) END AS year_rank,
+                       COUNT(*) OVER (PARTITION BY enrollment_year) AS year_total,
+                       CASE WHEN pass_rate IS NULL THEN 1
+                            ELSE RANK() OVER (ORDER BY pass_rate DESC) END AS all_rank,
+                       COUNT(*) OVER () AS all_total
+                FROM rating_data
+                WHERE is_expelled = 0
+            )
+        """)
+        async with db.execute("SELECT COUNT(*) FROM rating_ranks") as cursor:
+            count = (await cursor.fetchone())[0]
+        await db.commit()
+    except Exception:
+        await db.rollback()
+        raise
+    return count
+
+async def _live_rating_positions(db, record_book: str) -> dict:
+    """Позиции одним проходом по rating_data — для зачёток, которых ещё нет в rating_ranks."""
     async with db.execute(
-        "SELECT pass_rate, enrollment_year, cluster_id FROM rating_data WHERE record_book = ? AND is_expelled = 0",
+        """
+        SELECT COUNT(*),
+               COALESCE(SUM(r.pass_rate > me.pass_rate), 0) + 1,
+               COALESCE(SUM(r.enrollment_year = me.enrollment_year), 0),
+               COALESCE(SUM(r.enrollment_year = me.enrollment_year AND r.pass_rate > me.pass_rate), 0) + 1,
+               COALESCE(SUM(r.cluster_id = me.cluster_id), 0),
+               COALESCE(SUM(r.cluster_id = me.cluster_id AND r.pass_rate > me.pass_rate), 0) + 1,
+               me.cluster_id IS NULL
+        FROM (
+            SELECT pass_rate, enrollment_year, cluster_id FROM rating_data
+            WHERE record_book = ? AND is_expelled = 0
+        ) me
+        JOIN rating_data r ON r.is_expelled = 0
+        """,
         (record_book,),
     ) as cursor:
         row = await cursor.fetchone()
-        if not row:
-            return None
-        my_rate, my_year, my_cluster = row[0], row[1], row[2]
-
-    # Формируем условие фильтрации
-    if scope == "cluster" and my_cluster is not None:
-        where = "is_expelled = 0 AND cluster_id = ?"
-        params = (my_cluster,)
-    elif scope == "year":
-        where = "is_expelled = 0 AND enrollment_year = ?"
-        params = (my_year,)
-    else:
-        where = "is_expelled = 0"
-        params = ()
-
-    # Позиция = сколько студентов имеют pass_rate строго больше + 1
-    async with db.execute(
-        f"SELECT COUNT(*) FROM rating_data WHERE {where} AND pass_rate > ?",
-        (*params, my_rate),
-    ) as cursor:
-        position = (await cursor.fetchone())[0] + 1
+    if not row or not row[0]:
+        return {}
+    all_total, all_pos, year_total, year_pos, cluster_total, cluster_pos, no_cluster = row
+    return {
+        # Без кластера позиция "cluster" считается по всем
+        "cluster_pos": (all_pos, all_total) if no_cluster else (cluster_pos, cluster_total),
+        "year_pos": (year_pos, year_total),
+        "all_pos": (all_pos, all_total),
+    }
 
-    async with db.execute(
-        f"SELECT COUNT(*) FROM rating_data WHERE {where}", params
-    ) as cursor:
-        total = (await cursor.fetchone())[0]
+async def get_rating_positions(record_book: str) -> dict:
+    """
+    Все три позиции в рейтинге: чтение строки rating_ranks по первичному ключу.
+    Returns: {"cluster_pos": (позиция, всего), "year_pos": ..., "all_pos": ...}
+    или {}, если зачётки нет среди неотчисленных.
+    """
+    db = await get_read_connection()
+    async with db.execute(f"SELECT {RANK_COLUMNS} FROM rating_ranks WHERE record_book = ?", (record_book,)) as cursor:
+        row = await cursor.fetchone()
+    if not row:
+        # Зачётка появилась после последнего пересчёта (или отчислена) — считаем по rating_data
+        return await _live_rating_positions(db, record_book)
+    return {"cluster_pos": (row[0], row[1]), "year_pos": (row[2], row[3]), "all_pos": (row[4], row[5])}
 
-    return position, total
+async def get_rating_position(record_book: str, scope: str = "all") -> tuple[int, int] | None:
+    """
+    Возвращает (позиция, всего) в рейтинге.
+    scope: 'cluster' — по специальности, 'year' — по году, 'all' — все неотчисленные.
+    """
+    positions = await get_rating_positions(record_book)
+    return positions.get(f"{scope if scope in ('cluster', 'year') else 'all'}_pos")
 
 async def get_top_students(scope: str = "all", scope_value=None, limit: int = 10) -> List[dict]:
     """
     Возвращает топ студентов по pass_rate.
     scope: 'cluster', 'year', 'all'.
+    Читается диапазон индекса rating_ranks; пока рейтинг не пересчитан — по rating_data.
     """
-    db = await get_db_connection()
+    db = await get_read_connection()
     if scope == "cluster" and scope_value is not None:
-        query = "SELECT record_book, pass_rate, total_subjects, passed_subjects FROM rating_data WHERE is_expelled = 0 AND cluster_id = ? ORDER BY pass_rate DESC LIMIT ?"
-        params = (scope_value, limit)
+        where, order, params = "cluster_id = ?", "cluster_rank", (scope_value, limit)
     elif scope == "year" and scope_value is not None:
-        query = "SELECT record_book, pass_rate, total_subjects, passed_subjects FROM rating_data WHERE is_expelled = 0 AND enrollment_year = ? ORDER BY pass_rate DESC LIMIT ?"
-        params = (scope_value, limit)
+        where, order, params = "enrollment_year = ?", "year_rank", (scope_value, limit)
     else:
-        query = "SELECT record_book, pass_rate, total_subjects, passed_subjects FROM rating_data WHERE is_expelled = 0 ORDER BY pass_rate DESC LIMIT ?"
-        params = (limit,)
+        where, order, params = "1", "all_rank", (limit,)
 
-    async with db.execute(query, params) as cursor:
+    async with db.execute(
+        f"SELECT record_book, pass_rate, total_subjects, passed_subjects FROM rating_ranks "
+        f"WHERE {where} ORDER BY {order}, record_book LIMIT ?",
+        params,
+    ) as cursor:
         rows = await cursor.fetchall()
-        return [
-            {"record_book": r[0], "pass_rate": r[1], "total": r[2], "passed": r[3]}
-            for r in rows
-        ]
+    if not rows:
+        async with db.execute(
+            f"SELECT record_book, pass_rate, total_subjects, passed_subjects FROM rating_data "
+            f"WHERE is_expelled = 0 AND {where} ORDER BY pass_rate DESC LIMIT ?",
+            params,
+        ) as cursor:
+            rows = await cursor.fetchall()
+    return [
+        {"record_book": r[0], "pass_rate": r[1], "total": r[2], "passed": r[3]}
+        for r in rows
+    ]
 
 async def get_all_rating_records(enrollment_year: int = None) -> List[dict]:
     """Все записи рейтинга (для кластеризации)."""
-    db = await get_db_connection()
+    db = await get_read_connection()
     if enrollment_year:
         query = "SELECT record_book, subjects_json, total_subjects, last_academic_year, cluster_id, is_expelled FROM rating_data WHERE enrollment_year = ?"
         params = (enrollment_year,)
@@ -172,9 +386,65 @@ async def get_all_rating_records(enrollment_year: int = None) -> List[dict]:
             for r in rows
         ]
 
+async def get_dirty_rating_records(enrollment_year: int) -> List[dict]:
+    """Записи года, у которых набор предметов изменился после последней кластеризации."""
+    db = await get_read_connection()
+    query = """
+        SELECT record_book, subjects_json, total_subjects, last_academic_year, cluster_id, is_expelled
+        FROM rating_data
+        WHERE enrollment_year = ? AND (cluster_dirty IS NULL OR cluster_dirty != 0)
+    """
+    async with db.execute(query, (enrollment_year,)) as cursor:
+        rows = await cursor.fetchall()
+        return [
+            {"record_book": r[0], "subjects_json": r[1], "total_subjects": r[2], "last_academic_year": r[3], "cluster_id": r[4], "is_expelled": r[5]}
+            for r in rows
+        ]
+
+async def mark_rating_clustered(record_books: List[str]):
+    """Снимает флаг cluster_dirty с обработанных кластеризацией зачёток."""
+    if not record_books:
+        return
+    db = await get_db_connection()
+    await db.executemany(
+        "UPDATE rating_data SET cluster_dirty = 0 WHERE record_book = ?",
+        [(book,) for book in record_books],
+    )
+    await db.commit()
+
+async def get_cluster_centroids(enrollment_year: int) -> Dict[int, set]:
+    """Центроиды кластеров года: {cluster_id: множество предметов}."""
+    db = await get_read_connection()
+    async with db.execute(
+        "SELECT cluster_id, subjects_json FROM cluster_centroids WHERE enrollment_year = ? ORDER BY cluster_id",
+        (enrollment_year,),
+    ) as cursor:
+        return {row[0]: set(json.loads(row[1])) for row in await cursor.fetchall()}
+
+async def save_cluster_centroids(enrollment_year: int, centroids: Dict[int, set], replace: bool = False):
+    """
+    Сохраняет центроиды кластеров года. replace=True — полная перекластеризация,
+    старые центроиды года удаляются в той же транзакции.
+    """
+    db = await get_db_connection()
+    try:
+        if replace:
+            await db.execute("DELETE FROM cluster_centroids WHERE enrollment_year = ?", (enrollment_year,))
+        await db.executemany(
+            "INSERT OR REPLACE INTO cluster_centroids (cluster_id, enrollment_year, subjects_json) VALUES (?, ?, ?)",
+            [
+                (cid, enrollment_year, json.dumps(sorted(subjects), ensure_ascii=False))
+                for cid, subjects in centroids.items()
+            ],
+        )
+        await db.commit()
+    except Exception:
+        await db.rollback()
+        raise
+
 async def get_student_cluster_info(record_book: str) -> dict | None:
     """Возвращает кластер и год зачисления студента."""
-    db = await get_db_connection()
+    db = await get_read_connection()
     async with db.execute(
         "SELECT cluster_id, enrollment_year, pass_rate, total_subjects, passed_subjects, is_expelled FROM rating_data WHERE record_book = ?",
         (record_book,),
@@ -193,7 +463,7 @@ async def get_student_cluster_info(record_book: str) -> dict | None:
 
 async def get_cluster_size(cluster_id: int) -> int:
     """Количество неотчисленных в кластере."""
-    db = await get_db_connection()
+    db = await get_read_connection()
     async with db.execute(
         "SELECT COUNT(*) FROM rating_data WHERE cluster_id = ? AND is_expelled = 0",
         (cluster_id,),
@@ -211,7 +481,7 @@ async def save_cluster_group(cluster_id: int, group_name: str, similarity: float
 
 async def get_group_by_cluster(cluster_id: int) -> str | None:
     """Возвращает имя группы по cluster_id."""
-    db = await get_db_connection()
+    db = await get_read_connection()
     async with db.execute(
         "SELECT group_name FROM cluster_groups WHERE cluster_id = ? LIMIT 1",
         (cluster_id,),
@@ -221,7 +491,7 @@ async def get_group_by_cluster(cluster_id: int) -> str | None:
 
 async def get_group_by_record_book(record_book: str) -> str | None:
     """record_book → cluster_id → group_name (через JOIN)."""
-    db = await get_db_connection()
+    db = await get_read_connection()
     async with db.execute("""
         SELECT cg.group_name 
         FROM rating_data rd
@@ -233,7 +503,7 @@ async def get_group_by_record_book(record_book: str) -> str | None:
 
 async def get_cluster_by_group(group_name: str) -> int | None:
     """Возвращает cluster_id по имени группы (регистронезависимо)."""
-    db = await get_db_connection()
+    db = await get_read_connection()
     async with db.execute(
         "SELECT cluster_id FROM cluster_groups WHERE LOWER(group_name) = LOWER(?)",
         (group_name,),
@@ -243,30 +513,30 @@ async def get_cluster_by_group(group_name: str) -> int | None:
 
 async def get_all_cluster_groups() -> List[dict]:
     """Все маппинги кластер → группа."""
-    db = await get_db_connection()
+    db = await get_read_connection()
     async with db.execute("SELECT cluster_id, group_name, similarity FROM cluster_groups") as cursor:
         rows = await cursor.fetchall()
         return [{"cluster_id": r[0], "group_name": r[1], "similarity": r[2]} for r in rows]
 
 async def get_cluster_subjects(cluster_id: int) -> set:
-    """Возвращает множество предметов для кластера из rating_data."""
-    db = await get_db_connection()
+    """Возвращает множество предметов для кластера (по одной зачётке кластера)."""
+    db = await get_read_connection()
     async with db.execute(
-        "SELECT subjects_json FROM rating_data WHERE cluster_id = ? AND is_expelled = 0 LIMIT 1",
+        """
+        SELECT DISTINCT s.name
+        FROM rating_subjects rs
+        JOIN subjects s ON s.id = rs.subject_id
+        WHERE rs.record_book = (
+            SELECT record_book FROM rating_data WHERE cluster_id = ? AND is_expelled = 0 LIMIT 1
+        )
+        """,
         (cluster_id,),
     ) as cursor:
-        row = await cursor.fetchone()
-        if not row or not row[0]:
-            return set()
-        try:
-            subjects = json.loads(row[0])
-            return {item["subject"] for item in subjects if item.get("subject")}
-        except (json.JSONDecodeError, KeyError):
-            return set()
+        return {row[0] for row in await cursor.fetchall()}
 
 async def get_all_distinct_clusters() -> List[int]:
     """Все уникальные cluster_id из rating_data."""
-    db = await get_db_connection()
+    db = await get_read_connection()
     async with db.execute(
         "SELECT DISTINCT cluster_id FROM rating_data WHERE cluster_id IS NOT NULL AND is_expelled = 0"
     ) as cursor:
@@ -275,7 +545,7 @@ async def get_all_distinct_clusters() -> List[int]:
 
 async def get_schedule_groups_subjects() -> Dict[str, dict]:
     """Возвращает {group_name: {'course': int, 'subjects': {subjects...}}} из расписания."""
-    db = await get_db_connection()
+    db = await get_read_connection()
     async with db.execute(
         "SELECT DISTINCT group_name, course, subject FROM schedule WHERE subject IS NOT NULL AND course IS NOT NULL"
     ) as cursor:
@@ -297,7 +567,7 @@ async def get_last_parsed_num(enrollment_year: int, max_hours: int = 24) -> int:
     Находит максимальный порядковый номер зачетки для года, 
     если записи обновлялись не позднее max_hours назад.
     """
-    db = await get_db_connection()
+    db = await get_read_connection()
     query = """
         SELECT MAX(CAST(SUBSTR(record_book, 5) AS INTEGER))
         FROM rating_data
@@ -313,7 +583,7 @@ async def get_records_count_by_year(enrollment_year: int) -> int:
     Возвращает количество записей рейтинга для указанного года зачисления.
     Используется для оценки общего количества при парсинге.
     """
-    db = await get_db_connection()
+    db = await get_read_connection()
     query = "SELECT COUNT(*) FROM rating_data WHERE enrollment_year = ?"
     async with db.execute(query, (enrollment_year,)) as cursor:
         row = await cursor.fetchone()
@@ -3,11 +3,11 @@ import logging
 import re
 from typing import List, Dict, Any, Tuple
 import aiosqlite
-from app.core.database import get_db_connection
+from app.core.database import get_db_connection, get_read_connection
 
 async def load_structure_from_db() -> Tuple[Dict[str, Any], List[str], List[str]]:
     """Загружает структуру меню и список преподавателей из БД асинхронно."""
-    db = await get_db_connection()
+    db = await get_read_connection()
 
     try:
         # 1. Загрузка структуры меню
@@ -35,7 +35,7 @@ async def load_structure_from_db() -> Tuple[Dict[str, Any], List[str], List[str]
         return {}, [], []
 
 async def get_schedule_by_group(group: str, date_str: str):
-    db = await get_db_connection()
+    db = await get_read_connection()
     async with db.execute(
         "SELECT * FROM schedule WHERE group_name = ? AND lesson_date = ? ORDER BY time", 
         (group, date_str)
@@ -43,20 +43,78 @@ async def get_schedule_by_group(group: str, date_str: str):
         return await cursor.fetchall()
 
 async def get_schedule_by_teacher(teacher_name: str, date_str: str):
-    db = await get_db_connection()
+    db = await get_read_connection()
     async with db.execute(
         "SELECT * FROM schedule WHERE teacher = ? AND lesson_date = ? ORDER BY time", 
         (teacher_name, date_str)
     ) as cursor:
         return await cursor.fetchall()
 
+_ASCII_LOWER = str.maketrans("ABCDEFGHIJKLMNOPQRSTUVWXYZ", "abcdefghijklmnopqrstuvwxyz")
+
+def _subject_matcher(subject: str):
+    """
+    Условие get_teachers_for_subject в Python: subject = ? OR subject = base
+    OR subject LIKE 'base (%п/г)' (LIKE в SQLite не различает регистр только латиницы).
+    """
+    base_subject = re.sub(r'\s*\(\d+\s*п/г\)', '', subject).strip()
+    prefix = (base_subject + ' (').translate(_ASCII_LOWER)
+    suffix = 'п/г)'
+
+    def matches(candidate: str) -> bool:
+        if candidate == subject or candidate == base_subject:
+            return True
+        folded = candidate.translate(_ASCII_LOWER)
+        return (len(folded) >= len(prefix) + len(suffix)
+                and folded.startswith(prefix) and folded.endswith(suffix))
+    return matches
+
+async def get_teachers_for_subjects(group_name: str, subjects) -> Dict[str, List[str]]:
+    """
+    Пакетный get_teachers_for_subject: преподаватели группы сразу для многих предметов.
+    Два запроса на группу (schedule и запасной teacher_stats) вместо двух на предмет.
+    Returns: {предмет: [преподаватели]} — только предметы, для которых кто-то найден.
+    """
+    db = await get_read_connection()
+    wanted = list(dict.fromkeys(subjects))
+    if not wanted:
+        return {}
+    matchers = {subject: _subject_matcher(subject) for subject in wanted}
+
+    def collect(rows, targets):
+        found = {}
+        for row_subject, teacher in rows:
+            for subject in targets:
+                if matchers[subject](row_subject):
+                    teachers = found.setdefault(subject, [])
+                    if teacher not in teachers:
+                        teachers.append(teacher)
+        return found
+
+    # 1. Текущее расписание группы
+    async with db.execute("""
+        SELECT DISTINCT subject, teacher FROM schedule
+        WHERE group_name = ? AND teacher IS NOT NULL AND teacher != 'Не указан'
+    """, (group_name,)) as cursor:
+        result = collect(await cursor.fetchall(), wanted)
+
+    # 2. Запасной вариант для ненайденных: teacher_stats (данные прошлых семестров)
+    missing = [subject for subject in wanted if subject not in result]
+    if missing:
+        async with db.execute(
+            "SELECT DISTINCT subject, teacher FROM teacher_stats WHERE group_name = ?", (group_name,)
+        ) as cursor:
+            result.update(collect(await cursor.fetchall(), missing))
+    return result
+
+
 async def log_broadcast(message_ids: list):
     db = await get_db_connection()
     await db.execute("INSERT INTO broadcast_log (message_ids_json) VALUES (?)", (json.dumps(message_ids),))
     await db.commit()
 
 async def get_last_broadcast() -> List[tuple] | None:
-    db = await get_db_connection()
+    db = await get_read_connection()
     async with db.execute("SELECT message_ids_json FROM broadcast_log ORDER BY id DESC LIMIT 1") as cursor:
         row = await cursor.fetchone()
         return json.loads(row[0]) if row else None
@@ -77,7 +135,7 @@ async def get_teachers_for_subject(group_name: str, subject: str) -> List[str]:
     Сначала ищет в текущем расписании (schedule), затем, если не найдено,
     использует teacher_stats как запасной источник (исторические данные).
     """
-    db = await get_db_connection()
+    db = await get_read_connection()
     # Убираем " (Nп/г)" для поиска базового предмета
     base_subject = re.sub(r'\s*\(\d+\s*п/г\)', '', subject).strip()
 
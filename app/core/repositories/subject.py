@@ -1,10 +1,10 @@
 import json
-from typing import List, Tuple
-from app.core.database import get_db_connection
+from typing import Dict, List, Tuple
+from app.core.database import get_db_connection, get_read_connection
 
 
 async def get_cached_session_results(record_book_number: str) -> Tuple[List[dict] | None, str | None]:
-    db = await get_db_connection()
+    db = await get_read_connection()
     async with db.execute("SELECT data_json, last_updated FROM session_cache WHERE record_book_number = ?", (record_book_number,)) as cursor:
         row = await cursor.fetchone()
         if row:
@@ -26,7 +26,7 @@ async def save_cached_session_results(record_book_number: str, data: List[dict])
     await db.commit()
 
 async def get_subject_note(user_id: int, subject_name: str) -> dict:
-    db = await get_db_connection()
+    db = await get_read_connection()
     async with db.execute("SELECT note_text, checklist_json FROM subject_notes WHERE user_id = ? AND subject_name = ?", (user_id, subject_name)) as cursor:
         row = await cursor.fetchone()
         if row:
@@ -68,13 +68,13 @@ async def unsubscribe_teacher(user_id: int, teacher_name: str):
     await db.commit()
 
 async def get_subscribed_teachers(user_id: int) -> List[str]:
-    db = await get_db_connection()
+    db = await get_read_connection()
     async with db.execute("SELECT teacher_name FROM teacher_subscriptions WHERE user_id = ?", (user_id,)) as cursor:
         rows = await cursor.fetchall()
         return [row[0] for row in rows]
 
 async def is_subscribed_to_teacher(user_id: int, teacher_name: str) -> bool:
-    db = await get_db_connection()
+    db = await get_read_connection()
     async with db.execute("SELECT 1 FROM teacher_subscriptions WHERE user_id = ? AND teacher_name = ?", (user_id, teacher_name)) as cursor:
         row = await cursor.fetchone()
         return bool(row)
@@ -122,9 +122,69 @@ async def save_cluster_subject_stat(cluster_id: int, subject: str, total: int, p
     """, (cluster_id, subject, total, passed, pass_rate, total_persons, passed_persons, person_pass_rate))
     await db.commit()
 
+async def rebuild_subject_stats() -> Tuple[int, int]:
+    """
+    Пересчитывает subject_global_stats и cluster_subject_stats агрегатами SQLite
+    по rating_subjects (INSERT ... SELECT) одной транзакцией.
+    Returns: (число глобальных записей, число кластерных записей)
+    """
+    db = await get_db_connection()
+    # Округление как в Python (round половины к чётному), а не ROUND() SQLite
+    await db.create_function("py_round", 2, round, deterministic=True)
+    rate = "py_round(CAST({0}passed AS REAL) / {0}total * 100, 1)"
+    try:
+        # Сдал ли студент предмет хотя бы раз — одна строка на (предмет, зачётка);
+        # название предмета без пробелов по краям, отчисленные не учитываются
+        await db.execute("DROP TABLE IF EXISTS temp.subject_persons")
+        await db.execute("""
+            CREATE TEMP TABLE subject_persons AS
+            SELECT TRIM(s.name) AS subject, rs.record_book, rd.cluster_id,
+                   COUNT(*) AS entries, SUM(rs.passed) AS passed_entries, MAX(rs.passed) AS passed
+            FROM rating_subjects rs
+            JOIN subjects s ON s.id = rs.subject_id
+            JOIN rating_data rd ON rd.record_book = rs.record_book
+            WHERE COALESCE(rd.is_expelled, 0) != 1 AND TRIM(s.name) != ''
+            GROUP BY TRIM(s.name), rs.record_book
+        """)
+        await db.execute("DELETE FROM subject_global_stats")
+        await db.execute("DELETE FROM cluster_subject_stats")
+        await db.execute(f"""
+            INSERT INTO subject_global_stats (subject, total_students, passed_students, pass_rate,
+                                              total_persons, passed_persons, person_pass_rate)
+            SELECT subject, e_total, e_passed, {rate.format("e_")}, p_total, p_passed, {rate.format("p_")}
+            FROM (
+                SELECT subject, SUM(entries) AS e_total, SUM(passed_entries) AS e_passed,
+                       COUNT(*) AS p_total, SUM(passed) AS p_passed
+                FROM subject_persons
+                GROUP BY subject
+            )
+        """)
+        await db.execute(f"""
+            INSERT INTO cluster_subject_stats (cluster_id, subject, total_students, passed_students, pass_rate,
+                                               total_persons, passed_persons, person_pass_rate)
+            SELECT cluster_id, subject, e_total, e_passed, {rate.format("e_")}, p_total, p_passed, {rate.format("p_")}
+            FROM (
+                SELECT cluster_id, subject, SUM(entries) AS e_total, SUM(passed_entries) AS e_passed,
+                       COUNT(*) AS p_total, SUM(passed) AS p_passed
+                FROM subject_persons
+                WHERE cluster_id IS NOT NULL AND cluster_id != 0
+                GROUP BY cluster_id, subject
+            )
+        """)
+        await db.execute("DROP TABLE temp.subject_persons")
+        async with db.execute("SELECT COUNT(*) FROM subject_global_stats") as cursor:
+            global_count = (await cursor.fetchone())[0]
+        async with db.execute("SELECT COUNT(*) FROM cluster_subject_stats") as cursor:
+            cluster_count = (await cursor.fetchone())[0]
+        await db.commit()
+    except Exception:
+        await db.rollback()
+        raise
+    return global_count, cluster_count
+
 async def get_cluster_subject_stats(cluster_id: int) -> dict:
     """Возвращает статистику по предметам для конкретного кластера. Формат: {subject: pass_rate}"""
-    db = await get_db_connection()
+    db = await get_read_connection()
     async with db.execute(
         "SELECT subject, pass_rate FROM cluster_subject_stats WHERE cluster_id = ?",
         (cluster_id,)
@@ -135,7 +195,7 @@ async def get_cluster_subject_stats(cluster_id: int) -> dict:
 
 async def get_subjects_with_stats() -> List[str]:
     """Возвращает список всех предметов, по которым есть статистика."""
-    db = await get_db_connection()
+    db = await get_read_connection()
     async with db.execute(
         "SELECT subject FROM subject_global_stats WHERE total_students > 0 ORDER BY subject"
     ) as cursor:
@@ -145,7 +205,7 @@ async def get_subjects_with_stats() -> List[str]:
 
 async def get_global_subject_stats(subject: str) -> dict | None:
     """Глобальная статистика по одному предмету."""
-    db = await get_db_connection()
+    db = await get_read_connection()
     async with db.execute(
         "SELECT total_students, passed_students, pass_rate, total_persons, passed_persons, person_pass_rate FROM subject_global_stats WHERE subject = ?",
         (subject,)
@@ -164,6 +224,32 @@ async def get_global_subject_stats(subject: str) -> dict | None:
             "person_pass_rate": row[5]
         }
 
+async def get_global_subject_stats_bulk(subjects) -> Dict[str, dict]:
+    """Глобальная статистика сразу для списка предметов: {предмет: статистика как в get_global_subject_stats}."""
+    from app.core.repositories.rating import SQL_CHUNK
+    db = await get_read_connection()
+    wanted = list(dict.fromkeys(subjects))
+    result = {}
+    for i in range(0, len(wanted), SQL_CHUNK):
+        chunk = wanted[i:i + SQL_CHUNK]
+        async with db.execute(
+            f"SELECT subject, total_students, passed_students, pass_rate, total_persons, passed_persons, person_pass_rate "
+            f"FROM subject_global_stats WHERE subject IN ({','.join('?' * len(chunk))})",
+            chunk,
+        ) as cursor:
+            for row in await cursor.fetchall():
+                result[row[0]] = {
+                    "total": row[1],
+                    "passed": row[2],
+                    "pass_rate": row[3],
+                    "total_subjects": row[1],
+                    "passed_subjects": row[2],
+                    "total_persons": row[4],
+                    "passed_persons": row[5],
+                    "person_pass_rate": row[6],
+                }
+    return result
+
 async def get_teacher_subject_rank(teacher: str, subject: str) -> tuple[int, int] | None:
     """Возвращает место преподавателя в рейтинге по предмету (место, всего преподавателей)."""
     # This call to get_subject_rating was buggy in original database.py.
@@ -182,7 +268,7 @@ async def get_teacher_subject_rank(teacher: str, subject: str) -> tuple[int, int
 
 async def get_record_books_in_cluster(cluster_id: int) -> List[dict]:
     """Возвращает список зачеток в кластере (с их общим pass_rate)."""
-    db = await get_db_connection()
+    db = await get_read_connection()
     async with db.execute(
         "SELECT record_book, pass_rate, total_subjects, passed_subjects FROM rating_data WHERE cluster_id = ? AND is_expelled = 0 ORDER BY record_book",
         (cluster_id,)
@@ -192,44 +278,47 @@ async def get_record_books_in_cluster(cluster_id: int) -> List[dict]:
 
 async def get_subject_status_in_cluster(cluster_id: int, subject: str) -> List[dict]:
     """Возвращает статусы зачеток кластера по конкретному предмету."""
-    db = await get_db_connection()
+    db = await get_read_connection()
+    # Первая (по порядку в зачётке) запись предмета у каждого студента кластера
     async with db.execute(
-        "SELECT record_book, subjects_json FROM rating_data WHERE cluster_id = ? AND is_expelled = 0 ORDER BY record_book",
-        (cluster_id,)
+        """
+        SELECT rd.record_book, rs.passed, rs.grade, rs.seq
+        FROM rating_data rd
+        LEFT JOIN rating_subjects rs
+               ON rs.record_book = rd.record_book
+              AND rs.subject_id = (SELECT id FROM subjects WHERE name = ?)
+        WHERE rd.cluster_id = ? AND rd.is_expelled = 0
+          AND rd.subjects_json IS NOT NULL AND rd.subjects_json != ''
+        ORDER BY rd.record_book, rs.seq
+        """,
+        (subject, cluster_id)
     ) as cursor:
         rows = await cursor.fetchall()
-        
+
     result = []
-    for row in rows:
-        rb = row[0]
-        subj_json = row[1]
-        if not subj_json:
+    seen = set()
+    for rb, passed, grade, seq in rows:
+        if rb in seen:
             continue
-        try:
-            subjects = json.loads(subj_json)
-            subj_data = next((s for s in subjects if s.get("subject") == subject), None)
-            if subj_data:
-                is_passed = subj_data.get("passed", False)
-                grade = subj_data.get("grade", "Нет оценки")
-                result.append({
-                    "record_book": rb,
-                    "status": "✅ Сдано" if is_passed else "❌ Не сдано",
-                    "mark": grade
-                })
-            else:
-                result.append({
-                    "record_book": rb,
-                    "status": "Нет в профиле",
-                    "mark": "-"
-                })
-        except json.JSONDecodeError:
-            pass
+        seen.add(rb)
+        if seq is not None:
+            result.append({
+                "record_book": rb,
+                "status": "✅ Сдано" if passed else "❌ Не сдано",
+                "mark": grade if grade is not None else "Нет оценки"
+            })
+        else:
+            result.append({
+                "record_book": rb,
+                "status": "Нет в профиле",
+                "mark": "-"
+            })
             
     return result
 
 async def get_record_book_subjects(record_book: str) -> List[dict]:
     """Возвращает список предметов и их статусы для зачетки."""
-    db = await get_db_connection()
+    db = await get_read_connection()
     async with db.execute(
         "SELECT subjects_json FROM rating_data WHERE record_book = ?",
         (record_book,)
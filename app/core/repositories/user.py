@@ -1,6 +1,6 @@
 import json
 from typing import List, Tuple
-from app.core.database import get_db_connection
+from app.core.database import get_db_connection, get_read_connection
 
 async def save_user_group_db(user_id: int, group_name: str | None):
     db = await get_db_connection()
@@ -11,7 +11,7 @@ async def save_user_group_db(user_id: int, group_name: str | None):
     await db.commit()
 
 async def get_user_group_db(user_id: int) -> str | None:
-    db = await get_db_connection()
+    db = await get_read_connection()
     async with db.execute("SELECT group_name FROM users WHERE user_id = ?", (user_id,)) as cursor:
         row = await cursor.fetchone()
         return row[0] if row else None 
@@ -30,7 +30,7 @@ async def save_record_book_number(user_id: int, number: str, username: str | Non
     await db.commit()
 
 async def get_record_book_number(user_id: int) -> str | None:
-    db = await get_db_connection()
+    db = await get_read_connection()
     async with db.execute("SELECT record_book_number FROM users WHERE user_id = ?", (user_id,)) as cursor:
         row = await cursor.fetchone()
         return row[0] if row else None 
@@ -41,7 +41,7 @@ async def update_user_settings(user_id: int, settings: dict):
     await db.commit()
 
 async def get_user_settings(user_id: int) -> dict:
-    db = await get_db_connection()
+    db = await get_read_connection()
     async with db.execute("SELECT settings FROM users WHERE user_id = ?", (user_id,)) as cursor:
         row = await cursor.fetchone()
         if row and row[0]:
@@ -52,21 +52,21 @@ async def get_user_settings(user_id: int) -> dict:
         return {} 
 
 async def get_all_user_ids() -> List[int]:
-    db = await get_db_connection()
+    db = await get_read_connection()
     async with db.execute("SELECT user_id FROM users") as cursor:
         rows = await cursor.fetchall()
         return [row[0] for row in rows]
 
 async def get_users_with_record_books() -> List[Tuple[int, str]]:
     """Возвращает список кортежей (user_id, record_book_number) для отслеживания сессии."""
-    db = await get_db_connection()
+    db = await get_read_connection()
     async with db.execute("SELECT user_id, record_book_number FROM users WHERE record_book_number IS NOT NULL") as cursor:
         rows = await cursor.fetchall()
         return [(row[0], row[1]) for row in rows]
 
 async def get_users_by_record_book(record_book: str) -> List[dict]:
     """Возвращает данные пользователей (id, username, first_name), привязанных к зачётке."""
-    db = await get_db_connection()
+    db = await get_read_connection()
     async with db.execute(
         "SELECT user_id, username, first_name FROM users WHERE record_book_number = ?", (record_book,)
     ) as cursor:
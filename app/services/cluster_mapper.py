@@ -11,38 +11,19 @@ from app.core.repositories.rating import (
     save_cluster_group,
     get_cluster_size,
 )
+from app.services.similarity import SubjectVocabulary, inclusion_matrix, inclusion_score_bits
 
 # Минимальное сходство для привязки кластера к группе
 MIN_SIMILARITY = 0.25
 
 
-import re
-
 def _similarity(cluster_subjects: set, group_subjects: set) -> float:
     """Точность вхождения текущих предметов группы в полный список предметов кластера."""
     if not cluster_subjects or not group_subjects:
         return 0.0
-    
-    # Очищаем предметы из расписания от подгрупп "(1п/г)" 
-    cleaned_group_subjects = set()
-    for s in group_subjects:
-        cleaned = re.sub(r'\s*\(\d+\s*п/г\)', '', s).strip()
-        cleaned_group_subjects.add(cleaned)
-    
-    cleaned_cluster_subjects = set()
-    for s in cluster_subjects:
-        cleaned = re.sub(r'\s*\(\d+\s*п/г\)', '', s).strip()
-        cleaned_cluster_subjects.add(cleaned)
-
-    intersection = len(cleaned_cluster_subjects & cleaned_group_subjects)
-    # Метрика поглощения: какой % предметов расписания есть у этих студентов?
-    inclusion = intersection / len(cleaned_group_subjects) if cleaned_group_subjects else 0.0
-    
-    # Небольшой штраф по Жаккару для разрешения спорных случаев между курсами
-    union = len(cleaned_cluster_subjects | cleaned_group_subjects)
-    jaccard = intersection / union if union > 0 else 0.0
-    
-    return inclusion + (jaccard * 0.1)
+    # Предметы из расписания очищаются от подгрупп "(1п/г)"
+    vocabulary = SubjectVocabulary(normalize=True)
+    return inclusion_score_bits(vocabulary.encode(cluster_subjects), vocabulary.encode(group_subjects))
 
 
 async def map_clusters_to_groups():
@@ -69,27 +50,41 @@ async def map_clusters_to_groups():
         if subj:
             cluster_data[cid] = subj
 
-    mapped = 0
+    # Словарь предметов строится один раз (подгруппы "(1п/г)" отбрасываются),
+    # дальше сравниваются битовые маски
+    vocabulary = SubjectVocabulary(normalize=True)
+    cluster_ids_by_course: dict[int, list[int]] = {}
+    cluster_masks_by_course: dict[int, list[int]] = {}
+    for cluster_id, cluster_subj in cluster_data.items():
+        # В текущем учебном году (2025/2026),
+        # ожидаемый курс студента = 2026 - год поступления
+        # Если cluster_id = 2022xxx -> год поступления = 2022 -> курс = 4
+        expected_course = 2026 - (cluster_id // 1000)
+        cluster_ids_by_course.setdefault(expected_course, []).append(cluster_id)
+        cluster_masks_by_course.setdefault(expected_course, []).append(vocabulary.encode(cluster_subj))
+
+    groups_by_course: dict[int, list[str]] = {}
     for group_name, group_data in group_subjects.items():
-        group_course = group_data["course"]
-        group_subj = group_data["subjects"]
-        
-        best_cluster = None
-        best_sim = 0.0
+        groups_by_course.setdefault(group_data["course"], []).append(group_name)
 
-        for cluster_id, cluster_subj in cluster_data.items():
-            # В текущем учебном году (2025/2026), 
-            # ожидаемый курс студента = 2026 - год поступления
-            # Если cluster_id = 2022xxx -> год поступления = 2022 -> курс = 4
-            expected_course = 2026 - (cluster_id // 1000)
-            
-            if group_course != expected_course:
-                continue
+    best_by_group: dict[str, tuple[int | None, float]] = {}
+    for course, group_names in groups_by_course.items():
+        course_clusters = cluster_ids_by_course.get(course, [])
+        group_masks = [vocabulary.encode(group_subjects[name]["subjects"]) for name in group_names]
+        # Все группы курса против всех кластеров курса одной матрицей
+        scores = inclusion_matrix(cluster_masks_by_course.get(course, []), group_masks)
+        for group_name, row in zip(group_names, scores):
+            best_cluster = None
+            best_sim = 0.0
+            for cluster_id, sim in zip(course_clusters, row):
+                if sim > best_sim:
+                    best_sim = sim
+                    best_cluster = cluster_id
+            best_by_group[group_name] = (best_cluster, best_sim)
 
-            sim = _similarity(cluster_subj, group_subj)
-            if sim > best_sim:
-                best_sim = sim
-                best_cluster = cluster_id
+    mapped = 0
+    for group_name in group_subjects:
+        best_cluster, best_sim = best_by_group[group_name]
 
         if best_cluster and best_sim >= MIN_SIMILARITY:
             # Сохраняем с нормализованным (обычно верхний регистр) именем, 
@@ -4,11 +4,22 @@
 """
 import json
 import logging
+import math
 import re
 from collections import defaultdict
 from typing import List, Dict
 
-from app.core.repositories.rating import get_all_rating_records, update_rating_cluster, save_expelled_student
+from app.core.repositories.rating import (
+    get_all_rating_records,
+    get_cluster_centroids,
+    get_dirty_rating_records,
+    mark_rating_clustered,
+    rebuild_rating_ranks,
+    save_cluster_centroids,
+    save_expelled_students,
+    update_rating_clusters,
+)
+from app.services.similarity import SubjectVocabulary, jaccard_bits
 
 # Минимальный процент совпадения предметов для объединения в один кластер
 SIMILARITY_THRESHOLD = 0.80
@@ -27,7 +38,7 @@ def _extract_subject_set(subjects_json: str) -> set:
 
 
 def _jaccard_similarity(set_a: set, set_b: set) -> float:
-    """Коэффициент Жаккара — мера сходства двух множеств."""
+    """Коэффициент Жаккара — мера сходства двух множеств (эталонная версия на set)."""
     if not set_a or not set_b:
         return 0.0
     intersection = len(set_a & set_b)
@@ -47,31 +58,123 @@ def _has_current_year_subjects(subjects_json: str) -> bool:
         return False
 
 
-def cluster_students(records: List[dict], base_year: int = 0) -> Dict[str, int]:
-    """
-    Группирует студентов по набору предметов.
-    Использует жадный алгоритм: берём первого неразмеченного студента,
-    создаём кластер, добавляем всех похожих.
-    
-    Returns: {record_book: cluster_id}
-    """
-    # Извлекаем множества предметов
+def _sorted_student_subjects(records: List[dict]) -> tuple[Dict[str, set], List[str]]:
+    """Множества предметов по зачёткам и порядок обхода жадного алгоритма."""
     student_subjects = {}
     for rec in records:
         subjects = _extract_subject_set(rec["subjects_json"])
         if subjects:  # Пропускаем пустые
             student_subjects[rec["record_book"]] = subjects
 
-    assignments = {}
-    cluster_id = (base_year * 1000) if base_year > 0 else 0
-    assigned = set()
-
     # Сортируем по количеству предметов (больше предметов = лучший представитель кластера)
     sorted_books = sorted(
         student_subjects.keys(),
         key=lambda rb: len(student_subjects[rb]),
         reverse=True,
     )
+    return student_subjects, sorted_books
+
+
+def _prefix_length(size: int, threshold: float) -> int:
+    """
+    Длина префикса для prefix filtering: если J(A, B) >= threshold, то префиксы A и B
+    (в общем порядке токенов) пересекаются. Эпсилон только удлиняет префикс — кандидатов
+    становится больше, но ни одна пара с J >= threshold не теряется.
+    """
+    return size - math.ceil(threshold * size - 1e-9) + 1
+
+
+def cluster_students(records: List[dict], base_year: int = 0) -> Dict[str, int]:
+    """
+    Группирует студентов по набору предметов.
+    Жадный алгоритм: берём первого неразмеченного студента, создаём кластер,
+    добавляем всех неразмеченных с J >= SIMILARITY_THRESHOLD.
+
+    Кандидаты ищутся через инвертированный индекс по префиксам множеств
+    (предметы интернированы в номера битов, от редких к частым), точный
+    Жаккар по битовым маскам считается только для них. Результат совпадает
+    с cluster_students_naive.
+
+    Returns: {record_book: cluster_id}
+    """
+    student_subjects, sorted_books = _sorted_student_subjects(records)
+
+    # Интернирование: редкие предметы получают меньшие id и попадают в префиксы
+    frequency = defaultdict(int)
+    for subjects in student_subjects.values():
+        for subject in subjects:
+            frequency[subject] += 1
+    vocabulary = SubjectVocabulary()
+    vocabulary.add(sorted(frequency, key=lambda subj: (frequency[subj], subj)))
+
+    masks = []
+    sizes = []
+    prefixes = []
+    index: Dict[int, List[int]] = defaultdict(list)
+    for pos, book in enumerate(sorted_books):
+        ids = sorted(vocabulary.ids[subject] for subject in student_subjects[book])
+        masks.append(vocabulary.encode(student_subjects[book]))
+        sizes.append(len(ids))
+        prefix = ids[:_prefix_length(len(ids), SIMILARITY_THRESHOLD)]
+        prefixes.append(prefix)
+        for token in prefix:
+            index[token].append(pos)
+
+    assignments = {}
+    cluster_id = (base_year * 1000) if base_year > 0 else 0
+    assigned = [False] * len(sorted_books)
+
+    for pos, book in enumerate(sorted_books):
+        if assigned[pos]:
+            continue
+
+        # Новый кластер с этим студентом как центроидом
+        cluster_id += 1
+        centroid = masks[pos]
+        centroid_size = sizes[pos]
+        assigned[pos] = True
+        assignments[book] = cluster_id
+        min_size = SIMILARITY_THRESHOLD * centroid_size - 1e-9
+        max_size = centroid_size / SIMILARITY_THRESHOLD + 1e-9
+
+        members = set()
+        checked = set()
+        for token in prefixes[pos]:
+            postings = index[token]
+            alive = []
+            for other in postings:
+                if assigned[other]:
+                    continue
+                alive.append(other)
+                if other in checked:
+                    continue
+                checked.add(other)
+                if not (min_size <= sizes[other] <= max_size):
+                    continue
+                if jaccard_bits(centroid, masks[other]) >= SIMILARITY_THRESHOLD:
+                    members.add(other)
+            # Размеченные больше никогда не станут кандидатами — выкидываем их из списка
+            index[token] = alive
+
+        for other in sorted(members):
+            assigned[other] = True
+            assignments[sorted_books[other]] = cluster_id
+
+    logging.info(f"Кластеризация: {len(assignments)} студентов → {cluster_id} кластеров")
+    return assignments
+
+
+def cluster_students_naive(records: List[dict], base_year: int = 0) -> Dict[str, int]:
+    """
+    Исходный O(n²) жадный алгоритм — эталон для тестов и бенчмарка.
+
+    Returns: {record_book: cluster_id}
+    """
+    student_subjects, sorted_books = _sorted_student_subjects(records)
+
+    assignments = {}
+    cluster_id = (base_year * 1000) if base_year > 0 else 0
+    assigned = set()
 
     for book in sorted_books:
         if book in assigned:
@@ -92,7 +195,6 @@ def cluster_students(records: List[dict], base_year: int = 0) -> Dict[str, int]:
                 assignments[other_book] = cluster_id
                 assigned.add(other_book)
 
-    logging.info(f"Кластеризация: {len(assignments)} студентов → {cluster_id} кластеров")
     return assignments
 
 
@@ -118,27 +220,125 @@ def detect_expelled(records: List[dict], clusters: Dict[str, int]) -> Dict[str,
     return expelled
 
 
-async def run_clustering(enrollment_year: int = 2022):
+def cluster_centroids(records: List[dict], clusters: Dict[str, int]) -> Dict[int, set]:
+    """
+    Центроиды кластеров — наборы предметов студентов-основателей
+    (в assignments основатель кластера всегда идёт первым).
+    """
+    subjects_by_book = {rec["record_book"]: rec["subjects_json"] for rec in records}
+    centroids = {}
+    for book, cid in clusters.items():
+        if cid not in centroids:
+            centroids[cid] = _extract_subject_set(subjects_by_book[book])
+    return centroids
+
+
+def assign_to_centroids(
+    records: List[dict], centroids: Dict[int, set], base_year: int = 0
+) -> tuple[Dict[str, int], Dict[int, set]]:
+    """
+    Инкрементальная кластеризация: студент остаётся в своём кластере, если ещё похож
+    на его центроид, иначе попадает к ближайшему центроиду с J >= SIMILARITY_THRESHOLD
+    (при равенстве — к меньшему cluster_id), иначе основывает новый кластер.
+
+    Returns: ({record_book: cluster_id}, {cluster_id: предметы} новых кластеров)
+    """
+    student_subjects, sorted_books = _sorted_student_subjects(records)
+    current = {rec["record_book"]: rec.get("cluster_id") for rec in records}
+
+    vocabulary = SubjectVocabulary()
+    cluster_ids = sorted(centroids)
+    centroid_masks = [vocabulary.encode(centroids[cid]) for cid in cluster_ids]
+    mask_by_id = dict(zip(cluster_ids, centroid_masks))
+    next_id = max([*cluster_ids, base_year * 1000 if base_year > 0 else 0]) + 1
+
+    assignments = {}
+    new_centroids = {}
+    for book in sorted_books:
+        mask = vocabulary.encode(student_subjects[book])
+        cid = current.get(book)
+        if cid in mask_by_id and jaccard_bits(mask, mask_by_id[cid]) >= SIMILARITY_THRESHOLD:
+            assignments[book] = cid
+            continue
+
+        best_cluster = None
+        best_sim = 0.0
+        for cluster_id, centroid in zip(cluster_ids, centroid_masks):
+            sim = jaccard_bits(mask, centroid)
+            if sim > best_sim:
+                best_sim = sim
+                best_cluster = cluster_id
+
+        if best_cluster is not None and best_sim >= SIMILARITY_THRESHOLD:
+            assignments[book] = best_cluster
+        else:
+            # Новый кластер — следующие изменившиеся студенты тоже могут к нему примкнуть
+            assignments[book] = next_id
+            new_centroids[next_id] = student_subjects[book]
+            cluster_ids.append(next_id)
+            centroid_masks.append(mask)
+            mask_by_id[next_id] = mask
+            next_id += 1
+
+    logging.info(
+        f"Инкрементальная кластеризация: {len(assignments)} студентов, новых кластеров {len(new_centroids)}"
+    )
+    return assignments, new_centroids
+
+
+async def run_clustering(enrollment_year: int = 2022, full: bool = False) -> dict | None:
     """
-    Полный цикл кластеризации: загрузка данных → кластеризация → определение отчисленных → сохранение.
+    Цикл кластеризации: загрузка данных → кластеризация → определение отчисленных → сохранение.
+
+    По умолчанию инкрементальный: обрабатываются только зачётки с изменившимися
+    предметами (cluster_dirty), они раскладываются по сохранённым центроидам.
+    full=True (или если центроидов года ещё нет) — полная перекластеризация года.
+    В БД пишутся только строки, у которых cluster_id действительно поменялся.
     """
-    records = await get_all_rating_records(enrollment_year)
-    if not records:
-        logging.warning("Нет данных для кластеризации")
-        return
+    centroids = {} if full else await get_cluster_centroids(enrollment_year)
+    if centroids:
+        records = await get_dirty_rating_records(enrollment_year)
+        if not records:
+            logging.info(f"Кластеризация {enrollment_year}: изменений нет")
+            return {"mode": "incremental", "records": 0, "updated": 0, "expelled": 0}
+        clusters, new_centroids = assign_to_centroids(records, centroids, base_year=enrollment_year)
+        await save_cluster_centroids(enrollment_year, new_centroids)
+        mode = "incremental"
+    else:
+        records = await get_all_rating_records(enrollment_year)
+        if not records:
+            logging.warning("Нет данных для кластеризации")
+            return None
+        clusters = cluster_students(records, base_year=enrollment_year)
+        await save_cluster_centroids(enrollment_year, cluster_centroids(records, clusters), replace=True)
+        mode = "full"
 
-    clusters = cluster_students(records, base_year=enrollment_year)
     expelled = detect_expelled(records, clusters)
 
-    # Сохраняем результаты в БД
+    # Сохраняем результаты в БД пакетами: по одной транзакции на обновления и отчисления
+    cluster_updates = []
+    expelled_students = []
+    unchanged_books = []
     for rec in records:
         book = rec["record_book"]
         cid = clusters.get(book, 0)
-        is_exp = expelled.get(book, False)
-        
-        if is_exp:
-            await save_expelled_student(book, enrollment_year, cid)
+        if expelled.get(book, False):
+            expelled_students.append((book, enrollment_year, cid))
+        elif cid != rec.get("cluster_id"):
+            cluster_updates.append((book, cid))
         else:
-            await update_rating_cluster(book, cid, 0)
+            unchanged_books.append(book)
 
-    logging.info(f"Кластеризация завершена для {enrollment_year} года")
+    await save_expelled_students(expelled_students)
+    await update_rating_clusters(cluster_updates)
+    await mark_rating_clustered(unchanged_books)
+    # Кластеры и отчисления поменялись — пересчитываем материализованный рейтинг
+    await rebuild_rating_ranks()
+    updated = len(cluster_updates)
+    expelled_count = len(expelled_students)
+
+    logging.info(
+        f"Кластеризация завершена для {enrollment_year} года ({mode}): "
+        f"{len(records)} зачёток, изменён кластер у {updated}, отчислено {expelled_count}"
+    )
+    return {"mode": mode, "records": len(records), "updated": updated, "expelled": expelled_count}
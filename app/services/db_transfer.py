@@ -2,6 +2,7 @@ import json
 import logging
 from typing import Dict, Any
 from app.core.database import get_db_connection
+from app.core.repositories.rating import rebuild_rating_ranks, sync_rating_subjects
 
 async def export_rating_data() -> str:
     """
@@ -37,12 +38,14 @@ async def import_rating_data(json_data: str) -> bool:
         db = await get_db_connection()
 
         # Import rating_data
+        imported_books = []
         if "rating_data" in data:
             for item in data["rating_data"]:
                 columns = ", ".join(item.keys())
                 placeholders = ", ".join(["?"] * len(item))
                 values = tuple(item.values())
                 await db.execute(f"INSERT OR REPLACE INTO rating_data ({columns}) VALUES ({placeholders})", values)
+                imported_books.append(item["record_book"])
 
         # Import cluster_groups
         if "cluster_groups" in data:
@@ -61,6 +64,10 @@ async def import_rating_data(json_data: str) -> bool:
                 await db.execute(f"INSERT OR REPLACE INTO teacher_stats ({columns}) VALUES ({placeholders})", values)
 
         await db.commit()
+
+        # Нормализованные предметы импортированных зачёток
+        await sync_rating_subjects(imported_books)
+        await rebuild_rating_ranks()
         return True
     except Exception as e:
         logging.exception("Error during rating data import")
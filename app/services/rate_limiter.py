@@ -0,0 +1,177 @@
+"""
+Общий адаптивный ограничитель запросов к report.usurt.ru.
+
+Темп задаёт token bucket (rate запросов в секунду, запас burst), число
+одновременных запросов — окно limit. Оба параметра подстраиваются по AIMD:
+быстрый успешный ответ немного увеличивает их (additive increase), таймаут,
+5xx или страница с истекшей ASP.NET-сессией — уменьшает вдвое
+(multiplicative decrease), не чаще раза за cooldown секунд.
+
+Через один экземпляр (report_limiter) идут все HTTP-запросы к сайту:
+ночной обход зачёток, отслеживание сессии и живые запросы из бота и веба.
+Живые запросы (interactive) обслуживаются раньше фоновых.
+"""
+import asyncio
+import heapq
+import itertools
+import time
+from contextlib import asynccontextmanager
+
+from app.core.config import REPORT_RATE_MAX, REPORT_CONCURRENCY_MAX, REPORT_TARGET_LATENCY
+
+
+class RequestSlot:
+    """Разрешение на один запрос; вызывающий код отмечает в нём неудачу."""
+
+    __slots__ = ("failed",)
+
+    def __init__(self):
+        self.failed = False
+
+    def fail(self):
+        self.failed = True
+
+
+class AdaptiveLimiter:
+    def __init__(
+        self,
+        max_rate: float,
+        max_limit: int,
+        target_latency: float,
+        min_rate: float = 0.2,
+        min_limit: int = 1,
+        rate: float | None = None,
+        limit: float | None = None,
+        rate_step: float = 0.05,
+        backoff: float = 0.5,
+        cooldown: float | None = None,
+    ):
+        self.max_rate = max_rate
+        self.min_rate = min(min_rate, max_rate)
+        self.max_limit = max(1, max_limit)
+        self.min_limit = max(1, min(min_limit, self.max_limit))
+        self.target_latency = target_latency
+        self.rate_step = rate_step
+        self.backoff = backoff
+        self.cooldown = target_latency if cooldown is None else cooldown
+        # Стартуем осторожно, дальше темп растёт сам, пока ответы быстрые
+        self.rate = rate if rate is not None else max(self.min_rate, max_rate / 4)
+        self.limit = float(limit if limit is not None else self.min_limit)
+
+        self.tokens = 1.0
+        self.in_flight = 0
+        self.successes = 0
+        self.failures = 0
+        self.decreases = 0
+        self._refilled_at = time.monotonic()
+        self._last_decrease = float("-inf")
+        self._waiters: list = []
+        self._seq = itertools.count()
+        self._timer: asyncio.TimerHandle | None = None
+
+    @property
+    def burst(self) -> float:
+        return max(1.0, self.limit)
+
+    def _refill(self):
+        now = time.monotonic()
+        self.tokens = min(self.burst, self.tokens + (now - self._refilled_at) * self.rate)
+        self._refilled_at = now
+
+    def _dispatch(self):
+        """Выдаёт разрешения ожидающим, пока есть токены и место в окне."""
+        self._timer = None
+        self._refill()
+        while self._waiters and self.in_flight < int(self.limit):
+            future = self._waiters[0][2]
+            if future.done():
+                heapq.heappop(self._waiters)
+                continue
+            if self.tokens < 1:
+                delay = (1 - self.tokens) / self.rate
+                self._timer = asyncio.get_running_loop().call_later(delay, self._dispatch)
+                return
+            heapq.heappop(self._waiters)
+            self.tokens -= 1
+            self.in_flight += 1
+            future.set_result(None)
+
+    def _schedule_dispatch(self):
+        if self._timer is not None:
+            self._timer.cancel()
+        self._dispatch()
+
+    async def _acquire(self, interactive: bool):
+        future = asyncio.get_running_loop().create_future()
+        heapq.heappush(self._waiters, (0 if interactive else 1, next(self._seq), future))
+        self._schedule_dispatch()
+        try:
+            await future
+        except asyncio.CancelledError:
+            if future.done() and not future.cancelled():
+                # Разрешение уже выдано — возвращаем место в окне
+                self._release()
+            raise
+
+    def _release(self):
+        self.in_flight -= 1
+        self._schedule_dispatch()
+
+    def _on_success(self, latency: float):
+        self.successes += 1
+        if latency <= self.target_latency:
+            self.limit = min(self.max_limit, self.limit + 1 / self.limit)
+            self.rate = min(self.max_rate, self.rate + self.rate_step)
+
+    def _on_failure(self):
+        self.failures += 1
+        now = time.monotonic()
+        # Пачка одновременных ошибок — один сигнал перегрузки, а не несколько
+        if now - self._last_decrease < self.cooldown:
+            return
+        self._last_decrease = now
+        self.decreases += 1
+        self.limit = max(self.min_limit, self.limit * self.backoff)
+        self.rate = max(self.min_rate, self.rate * self.backoff)
+        self.tokens = min(self.tokens, 0.0)
+
+    @asynccontextmanager
+    async def slot(self, interactive: bool = False):
+        """
+        Разрешение на один HTTP-запрос. Исключение внутри блока или slot.fail()
+        считаются сигналом перегрузки, иначе учитывается время ответа.
+        """
+        await self._acquire(interactive)
+        slot = RequestSlot()
+        started = time.monotonic()
+        try:
+            yield slot
+        except Exception:
+            self._on_failure()
+            raise
+        else:
+            if slot.failed:
+                self._on_failure()
+            else:
+                self._on_success(time.monotonic() - started)
+        finally:
+            self._release()
+
+    def snapshot(self) -> dict:
+        """Текущее состояние для логов и details_json задач."""
+        return {
+            "rate": round(self.rate, 3),
+            "limit": round(self.limit, 2),
+            "in_flight": self.in_flight,
+            "waiting": sum(1 for _, _, future in self._waiters if not future.done()),
+            "successes": self.successes,
+            "failures": self.failures,
+            "decreases": self.decreases,
+        }
+
+
+report_limiter = AdaptiveLimiter(
+    max_rate=REPORT_RATE_MAX,
+    max_limit=REPORT_CONCURRENCY_MAX,
+    target_latency=REPORT_TARGET_LATENCY,
+)
@@ -11,6 +11,9 @@ from typing import List, Dict, Any, Optional
 import aiohttp
 from bs4 import BeautifulSoup
 
+from app.core.http_client import create_http_session
+from app.services.rate_limiter import AdaptiveLimiter, report_limiter
+
 BASE_URL = "https://report.usurt.ru/uspev.aspx"
 
 # Ротация User-Agent для снижения заметности
@@ -30,6 +33,22 @@ GRADE_KEYWORDS = [
 SESSION_EXPIRED_MARKERS = ("asp.net session has expired",)
 
 
+class AspFormState:
+    """
+    Скрытые поля ASP.NET-формы (VIEWSTATE и др.), полученные одним GET и
+    переиспользуемые в POST следующих зачёток той же сессии (тех же cookies).
+    Сбрасывается, когда сессия истекла или POST не удался.
+    """
+
+    def __init__(self):
+        self.fields: Optional[dict] = None
+        self.refreshes = 0
+        self.reuses = 0
+
+    def invalidate(self):
+        self.fields = None
+
+
 def _extract_asp_fields(html: str) -> dict:
     """Извлекает скрытые ASP.NET поля (VIEWSTATE и др.) из HTML."""
     soup = BeautifulSoup(html, "html.parser")
@@ -174,35 +193,63 @@ def _is_session_expired(html: str) -> bool:
 async def scrape_record_book(
     session: aiohttp.ClientSession,
     record_book_number: str,
+    limiter: Optional[AdaptiveLimiter] = None,
+    interactive: bool = False,
+    form_state: Optional[AspFormState] = None,
 ) -> tuple[str, Optional[List[Dict[str, Any]]]]:
     """
     Парсит одну зачётку через HTTP.
+    С form_state поля формы переиспользуются между зачётками одной сессии:
+    на зачётку уходит один POST вместо GET + POST.
+    Каждый запрос ждёт разрешения общего лимитера (по умолчанию report_limiter);
+    таймауты, ошибки HTTP и истекшая сессия замедляют его для всех вызывающих.
     Returns: (status, data) — совместимо с UsurtScraper.get_session_results().
     """
+    limiter = limiter or report_limiter
+    form_state = form_state or AspFormState()
     try:
         for attempt in range(2):
-            # Шаг 1: GET для ASP.NET токенов
-            async with session.get(BASE_URL) as resp:
-                if resp.status != 200:
+            reused = form_state.fields is not None
+            if reused:
+                form_state.reuses += 1
+            else:
+                # Шаг 1: GET для ASP.NET токенов (только если их нет в сессии)
+                async with limiter.slot(interactive) as slot:
+                    async with session.get(BASE_URL) as resp:
+                        if resp.status != 200:
+                            slot.fail()
+                            return "ERROR", None
+                        html = await resp.text()
+
+                asp_fields = _extract_asp_fields(html)
+                if not asp_fields.get("__VIEWSTATE"):
+                    logging.warning(f"Не найден __VIEWSTATE для {record_book_number}")
                     return "ERROR", None
-                html = await resp.text()
-
-            asp_fields = _extract_asp_fields(html)
-            if not asp_fields.get("__VIEWSTATE"):
-                logging.warning(f"Не найден __VIEWSTATE для {record_book_number}")
-                return "ERROR", None
+                form_state.fields = asp_fields
+                form_state.refreshes += 1
 
             # Шаг 2: POST с номером зачётки
-            post_data = {**asp_fields}
+            post_data = {**form_state.fields}
             post_data["ReportViewer1$ctl00$ctl03$ctl00"] = record_book_number
             post_data["ReportViewer1$ctl00$ctl00"] = "Просмотр"
 
-            async with session.post(BASE_URL, data=post_data) as resp:
-                if resp.status != 200:
-                    return "ERROR", None
-                html = await resp.text()
+            async with limiter.slot(interactive) as slot:
+                async with session.post(BASE_URL, data=post_data) as resp:
+                    post_ok = resp.status == 200
+                    html = await resp.text() if post_ok else ""
+                expired = post_ok and _is_session_expired(html)
+                if not post_ok or expired:
+                    slot.fail()
+
+            if not post_ok:
+                form_state.invalidate()
+                if reused:
+                    # Возможно, устарели сохранённые поля — повторяем со свежим GET
+                    continue
+                return "ERROR", None
 
-            if _is_session_expired(html):
+            if expired:
+                form_state.invalidate()
                 logging.warning(
                     "Истекла ASP.NET-сессия при парсинге зачётки %s, повтор %s/2",
                     record_book_number,
@@ -235,9 +282,10 @@ async def scrape_all_records(
     year: int = 2022,
     start: int = 1,
     max_consecutive_not_found: int = 20,
-    delay_range: tuple = (2, 8),
+    delay_range: Optional[tuple] = None,
     on_result=None,
     on_progress=None,
+    workers: Optional[int] = None,
 ) -> dict:
     """
     Массовый парсинг зачёток за указанный год.
@@ -246,16 +294,19 @@ async def scrape_all_records(
         year: Год зачисления (префикс номера).
         start: Начальный порядковый номер.
         max_consecutive_not_found: Количество идущих подряд несуществующих зачеток для остановки парсинга года.
-        delay_range: Мин/макс задержка между запросами (сек) для антифрода.
+        delay_range: Мин/макс дополнительная пауза воркера между зачётками (сек);
+            темп запросов и так задаёт общий report_limiter.
         on_result: Async callback(record_book, status, data) — вызывается после каждой зачётки.
         on_progress: Async callback(current, total) — вызывается каждые 50 записей (total может быть None).
+        workers: Число воркеров года (по умолчанию RATING_PARSER_WORKERS); реальную
+            параллельность ограничивает окно report_limiter.
     
     Returns: Статистика {total, success, not_found, error}.
     """
     from app.core.config import RATING_PARSER_WORKERS
+    workers_count = workers or RATING_PARSER_WORKERS
     stats = {"total": 0, "success": 0, "not_found": 0, "error": 0}
     timeout = aiohttp.ClientTimeout(total=20) # Чуть больше для параллельности
-    connector = aiohttp.TCPConnector(limit=RATING_PARSER_WORKERS + 1, force_close=True)
     headers = {
         "Accept": "text/html,application/xhtml+xml",
         "Accept-Language": "ru-RU,ru;q=0.9",
@@ -264,12 +315,20 @@ async def scrape_all_records(
     consecutive_not_found = 0
     current_num = start
     stop_event = asyncio.Event()
-    semaphore = asyncio.Semaphore(RATING_PARSER_WORKERS)
+    semaphore = asyncio.Semaphore(workers_count)
     
     async def worker():
         nonlocal current_num, consecutive_not_found
         
-        async with aiohttp.ClientSession(timeout=timeout, connector=connector, headers=headers) as session:
+        # У каждого воркера своя сессия (cookies) и свои поля формы поверх общего
+        # пула соединений; User-Agent выбирается один раз на сессию,
+        # чтобы не менять его посреди ASP.NET-сессии
+        async with create_http_session(
+            timeout=timeout,
+            headers={**headers, "User-Agent": random.choice(USER_AGENTS)},
+        ) as session:
+            form_state = AspFormState()
+            form_states.append(form_state)
             while not stop_event.is_set():
                 async with semaphore:
                     if stop_event.is_set():
@@ -281,15 +340,12 @@ async def scrape_all_records(
                     
                     from app.core.repositories.rating import is_student_expelled_in_db
                     is_expelled = await is_student_expelled_in_db(record_book)
-                    
-                    # Ротация User-Agent
-                    session.headers["User-Agent"] = random.choice(USER_AGENTS)
                 
                 if is_expelled:
                     # Пропускаем HTTP запрос, если уже отчислен
                     status, data = "SUCCESS", []
                 else:
-                    status, data = await scrape_record_book(session, record_book)
+                    status, data = await scrape_record_book(session, record_book, form_state=form_state)
                 
                 # Синхронное обновление статистики
                 stats["total"] += 1
@@ -322,12 +378,15 @@ async def scrape_all_records(
                     stop_event.set()
                     break
 
-                # Небольшая задержка перед следующим запросом в этом воркере
-                await asyncio.sleep(random.uniform(*delay_range))
+                # Необязательная пауза перед следующим запросом в этом воркере
+                if delay_range:
+                    await asyncio.sleep(random.uniform(*delay_range))
 
     # Запускаем группу воркеров
-    workers = [worker() for _ in range(RATING_PARSER_WORKERS)]
-    await asyncio.gather(*workers)
+    form_states: list[AspFormState] = []
+    await asyncio.gather(*(worker() for _ in range(workers_count)))
+    stats["form_refreshes"] = sum(state.refreshes for state in form_states)
+    stats["form_reuses"] = sum(state.reuses for state in form_states)
 
     logging.info(f"Парсинг {year} года завершён: {stats}")
     return stats
@@ -10,8 +10,10 @@ import re
 import time
 from datetime import datetime
 
-from app.core.repositories.rating import save_rating_record
+from app.core.config import RATING_FLUSH_RECORDS, RATING_FLUSH_SECONDS
+from app.core.repositories.rating import save_rating_records
 from app.core.repositories.job_log import save_job_log, cleanup_old_job_logs
+from app.services.rate_limiter import report_limiter
 from app.services.rating_scraper import scrape_all_records
 from app.services.clustering import run_clustering
 from app.services.cluster_mapper import map_clusters_to_groups
@@ -41,37 +43,111 @@ def _compute_stats(data: list) -> dict:
     }
 
 
-async def _on_record_parsed(record_book: str, status: str, data: list | None):
-    """Callback: сохраняет результат парсинга одной зачётки в БД."""
-    if status != "SUCCESS" or not data:
-        return
+class RatingWriteBuffer:
+    """
+    Копит распарсенные зачётки и пишет их пачкой (executemany, один commit)
+    каждые max_records записей или max_seconds секунд.
+    Незаписанный хвост теряется при падении, но get_last_parsed_num считает только
+    закоммиченные записи, поэтому возобновление просто перепарсит этот хвост.
+    """
+
+    def __init__(self, max_records: int = RATING_FLUSH_RECORDS, max_seconds: float = RATING_FLUSH_SECONDS):
+        self.max_records = max_records
+        self.max_seconds = max_seconds
+        self.pending: list[tuple] = []
+        self.commits = 0
+        self.saved = 0
+        self._last_flush = time.monotonic()
+
+    async def add(self, row: tuple):
+        self.pending.append(row)
+        await self.maybe_flush()
+
+    async def maybe_flush(self):
+        if len(self.pending) >= self.max_records or (
+            self.pending and time.monotonic() - self._last_flush >= self.max_seconds
+        ):
+            await self.flush()
+
+    async def flush(self):
+        self._last_flush = time.monotonic()
+        if not self.pending:
+            return
+        batch, self.pending = self.pending, []
+        await save_rating_records(batch)
+        self.commits += 1
+        self.saved += len(batch)
 
+
+def _rating_row(record_book: str, data: list) -> tuple:
+    """Строка rating_data для save_rating_records."""
     # Год зачисления — первые 4 цифры номера зачётки
     enrollment_year = int(record_book[:4])
     stats = _compute_stats(data)
-
-    await save_rating_record(
-        record_book=record_book,
-        enrollment_year=enrollment_year,
-        subjects_json=json.dumps(data, ensure_ascii=False),
-        total_subjects=stats["total"],
-        passed_subjects=stats["passed"],
-        pass_rate=stats["pass_rate"],
-        last_academic_year=stats["last_academic_year"],
+    return (
+        record_book,
+        enrollment_year,
+        json.dumps(data, ensure_ascii=False),
+        stats["total"],
+        stats["passed"],
+        stats["pass_rate"],
+        stats["last_academic_year"],
     )
 
 
+def _make_record_handler(buffer: RatingWriteBuffer):
+    async def _on_record_parsed(record_book: str, status: str, data: list | None):
+        """Callback: кладёт результат парсинга одной зачётки в буфер записи."""
+        if status != "SUCCESS" or not data:
+            # Пустые ответы тоже двигают таймер сброса — хвост не залёживается
+            await buffer.maybe_flush()
+            return
+        await buffer.add(_rating_row(record_book, data))
+    return _on_record_parsed
+
+
+async def run_full_recluster() -> dict:
+    """
+    Полная перекластеризация всех годов (явное действие администратора):
+    кластеры и центроиды строятся заново, затем маппинг на группы и статистика.
+    """
+    from app.core.config import PARSING_YEARS
+    start_time = datetime.now()
+    details = {}
+    status = "ERROR"
+    try:
+        for year in PARSING_YEARS:
+            result = await run_clustering(enrollment_year=year, full=True)
+            if result:
+                details[str(year)] = result
+        await map_clusters_to_groups()
+        await calculate_subject_stats()
+        status = "SUCCESS"
+        return details
+    except Exception as e:
+        details["error"] = str(e)
+        logging.exception("Ошибка при полной перекластеризации")
+        raise
+    finally:
+        try:
+            await save_job_log("recluster", start_time, datetime.now(), status, details)
+        except Exception as e_log:
+            logging.error(f"Не удалось сохранить лог задачи: {e_log}")
+
+
 async def run_rating_update(bot=None, status_message=None):
     """
     Полный цикл обновления рейтинга:
-    1. Парсинг всех зачёток за указанные года
-    2. Кластеризация
+    1. Парсинг всех зачёток за указанные года (года параллельно, общий лимитер запросов)
+    2. Кластеризация каждого года сразу после его парсинга
     3. Маппинг кластеров на группы расписания
     4. Расчёт статистики преподавателей
     """
-    from app.core.repositories.rating import save_rating_record, get_last_parsed_num, get_records_count_by_year
+    from app.core.repositories.rating import get_last_parsed_num, get_records_count_by_year
     from app.core.repositories.job_log import save_job_log, cleanup_old_job_logs
-    from app.core.config import ADMIN_ID, PARSING_YEARS, MAX_CONSECUTIVE_NOT_FOUND
+    from app.core.config import (
+        ADMIN_ID, PARSING_YEARS, MAX_CONSECUTIVE_NOT_FOUND, REPORT_CONCURRENCY_MAX,
+    )
     start_time = datetime.now()
     logging.info(f"🏆 Начало обновления рейтинга: {start_time}...")
     
@@ -81,51 +157,50 @@ async def run_rating_update(bot=None, status_message=None):
     try:
         total_years = len(PARSING_YEARS)
         
-        # Предварительная оценка общего объема работ
-        estimated_total_all = 0
-        for y in PARSING_YEARS:
-            estimated_total_all += await get_records_count_by_year(y)
+        # Предварительная оценка объема работ по годам (для прогресс-бара)
+        estimated_by_year = {y: await get_records_count_by_year(y) for y in PARSING_YEARS}
         
         start_timestamp = time.time()
-        total_processed_in_session = 0
+        found_by_year = {y: 0 for y in PARSING_YEARS}
+        finished_years = set()
+        last_update_time = 0
+
+        def overall_percent() -> float:
+            """Средний прогресс по годам: завершённый год — 100%, идущий — найдено/оценка."""
+            done = 0.0
+            for y in PARSING_YEARS:
+                if y in finished_years:
+                    done += 1
+                elif estimated_by_year[y] > 0:
+                    done += min(found_by_year[y] / estimated_by_year[y], 0.99)
+            return done / (total_years or 1) * 100
         
-        def make_progress_callback(current_year: int, year_idx: int, estimated_total_year: int):
-            last_update_time = 0
-            
+        def make_progress_callback(current_year: int):
             async def _on_progress(current_absolute_in_year: int, total_in_session_override: int | None):
-                nonlocal total_processed_in_session, last_update_time
+                nonlocal last_update_time
+                found_by_year[current_year] = current_absolute_in_year
                 
-                # Троттлинг обновлений сообщения (раз в 5 секунд)
+                # Троттлинг обновлений сообщения (раз в 5 секунд на все года)
                 now = time.time()
                 if now - last_update_time < 5:
                     return
 
                 if bot and status_message:
-                    # Базовый процент для уже пройденных лет
-                    base_percent = (year_idx / total_years) * 100
-                    
-                    # Добавляем прогресс внутри текущего года
-                    year_weight = 100 / total_years
-                    inner_progress = 0
-                    if estimated_total_year > 0:
-                        inner_progress = min(current_absolute_in_year / (estimated_total_year or 1), 0.99)
-                    
-                    overall_percent = base_percent + (inner_progress * year_weight)
+                    percent = overall_percent()
                     
                     # Расчет ETA
                     elapsed = now - start_timestamp
-                    total_processed_in_session += 1 # Грубая прибавка при каждом вызове
-                    
                     eta_str = "считаю..."
-                    if elapsed > 10 and total_processed_in_session > 5:
-                        speed = total_processed_in_session / elapsed 
-                        percent_left = max(0, 100 - overall_percent)
-                        if overall_percent > 0:
-                            remaining_sec = (elapsed / overall_percent) * percent_left
-                            if remaining_sec > 60:
-                                eta_str = f"~{int(remaining_sec / 60)} мин"
-                            else:
-                                eta_str = f"~{int(remaining_sec)} сек"
+                    if elapsed > 10 and percent > 0:
+                        remaining_sec = (elapsed / percent) * max(0, 100 - percent)
+                        if remaining_sec > 60:
+                            eta_str = f"~{int(remaining_sec / 60)} мин"
+                        else:
+                            eta_str = f"~{int(remaining_sec)} сек"
+
+                    active = ", ".join(
+                        f"{y} ({found_by_year[y]})" for y in PARSING_YEARS if y not in finished_years
+                    )
 
                     # Индикатор активности
                     dot = "•" if int(now) % 2 == 0 else "◦"
@@ -133,8 +208,8 @@ async def run_rating_update(bot=None, status_message=None):
                     try:
                         await bot.edit_message_text(
                             f"🏆 Обновление рейтинга (парсинг зачёток + кластеризация)...\n"
-                            f"📊 Общий прогресс: {overall_percent:.1f}%\n"
-                            f"📁 Год: {current_year} (найдено {current_absolute_in_year}) {dot}\n"
+                            f"📊 Общий прогресс: {percent:.1f}%\n"
+                            f"📁 Года: {active or '—'} {dot}\n"
                             f"⏳ Осталось: {eta_str}",
                             chat_id=status_message.chat.id,
                             message_id=status_message.message_id
@@ -148,37 +223,62 @@ async def run_rating_update(bot=None, status_message=None):
                             logging.error(f"Failed to edit progress message: {e}")
             return _on_progress
 
-        aggregated_stats = {"total": 0, "success": 0, "not_found": 0, "error": 0}
+        aggregated_stats = {
+            "total": 0, "success": 0, "not_found": 0, "error": 0,
+            "form_refreshes": 0, "form_reuses": 0,
+        }
+        # Все года обходятся одновременно; темп и параллельность запросов к report.usurt.ru
+        # задаёт общий report_limiter (его же используют живые запросы из бота и веба)
+        write_buffers = []
+
+        async def process_year(year: int):
+            """Парсинг года, затем сразу его кластеризация — пока остальные года ещё парсятся."""
+            # Отдельный буфер на год: сброс хвоста перед кластеризацией не ждёт чужих записей
+            write_buffer = RatingWriteBuffer()
+            write_buffers.append(write_buffer)
 
-        # Шаг 1 & 2: Массовый парсинг и кластеризация для каждого года
-        for i, year in enumerate(PARSING_YEARS):
-            logging.info(f"Начинаем проверку года {year}...")
-            
-            # Получаем оценку общего количества для прогресс-бара
-            estimated_total_year = await get_records_count_by_year(year)
-            
             # Проверяем, можно ли продолжить парсинг
             last_parsed = await get_last_parsed_num(year)
             start_num = last_parsed + 1
             if start_num > 1:
                 logging.info(f"♻️ Возобновляем парсинг {year} года с номера {start_num:04d} (последний был {last_parsed:04d} за последние 24ч)")
+            else:
+                logging.info(f"Начинаем проверку года {year}...")
 
-            stats = await scrape_all_records(
-                year=year,
-                start=start_num,
-                max_consecutive_not_found=MAX_CONSECUTIVE_NOT_FOUND,
-                delay_range=(2, 8),
-                on_result=_on_record_parsed,
-                on_progress=make_progress_callback(year, i, estimated_total_year),
-            )
+            try:
+                stats = await scrape_all_records(
+                    year=year,
+                    start=start_num,
+                    max_consecutive_not_found=MAX_CONSECUTIVE_NOT_FOUND,
+                    on_result=_make_record_handler(write_buffer),
+                    on_progress=make_progress_callback(year),
+                    workers=REPORT_CONCURRENCY_MAX,
+                )
+            finally:
+                # Хвост года — до кластеризации (и при ошибке, чтобы не терять уже спаршенное)
+                await write_buffer.flush()
+            finished_years.add(year)
             logging.info(f"📊 Парсинг {year} завершён: {stats}")
             
             for k, v in stats.items():
                 if k in aggregated_stats:
                     aggregated_stats[k] += v
 
-            # Кластеризация и определение отчисленных для года
-            await run_clustering(enrollment_year=year)
+            # Кластеризация и определение отчисленных для года (только изменившиеся зачётки)
+            clustering_stats = await run_clustering(enrollment_year=year)
+            if clustering_stats:
+                details[f"clustering_{year}"] = clustering_stats
+
+        # Шаг 1 & 2: Массовый парсинг и кластеризация, все года параллельно
+        year_tasks = [asyncio.create_task(process_year(year)) for year in PARSING_YEARS]
+        try:
+            await asyncio.gather(*year_tasks)
+        except BaseException:
+            # Ошибка одного года останавливает остальные, как и при последовательном обходе
+            for task in year_tasks:
+                task.cancel()
+            await asyncio.gather(*year_tasks, return_exceptions=True)
+            raise
 
         if bot and status_message:
             try:
@@ -193,6 +293,9 @@ async def run_rating_update(bot=None, status_message=None):
                 pass
 
         details.update(aggregated_stats)
+        details["rating_records_saved"] = sum(b.saved for b in write_buffers)
+        details["rating_commits"] = sum(b.commits for b in write_buffers)
+        details["report_limiter"] = report_limiter.snapshot()
 
         # Шаг 3: Маппинг кластеров на группы расписания
         await map_clusters_to_groups()
@@ -11,6 +11,7 @@ from datetime import datetime, timedelta, timezone
 import aiohttp
 from bs4 import BeautifulSoup
 
+from app.core.http_client import create_http_session
 from app.core.repositories.subject import get_cached_session_results, save_cached_session_results
 from app.services.rating_scraper import scrape_record_book
 
@@ -27,10 +28,11 @@ class UsurtScraper:
 
     @staticmethod
     async def get_session_results(
-        record_book_number: str, use_cache: bool = True
+        record_book_number: str, use_cache: bool = True, interactive: bool = True
     ) -> tuple[str, List[Dict[str, Any]] | None]:
         """
         Получает результаты сессии по номеру зачётки.
+        interactive=False — фоновый запрос: в общем лимитере пропускает вперёд живые запросы.
         Returns: (status, data)
         Status: "SUCCESS", "NOT_FOUND", "ERROR"
         """
@@ -51,13 +53,13 @@ class UsurtScraper:
         # --- Запрос ---
         logging.info(f"HTTP-парсинг зачётки {record_book_number}...")
         timeout = aiohttp.ClientTimeout(total=15)
-        connector = aiohttp.TCPConnector(force_close=True)
 
         try:
-            async with aiohttp.ClientSession(
-                timeout=timeout, connector=connector, headers=_DEFAULT_HEADERS
-            ) as session:
-                status, results = await scrape_record_book(session, record_book_number)
+            # Свои cookies на запрос, соединения — из общего keep-alive пула
+            async with create_http_session(timeout=timeout, headers=_DEFAULT_HEADERS) as session:
+                status, results = await scrape_record_book(
+                    session, record_book_number, interactive=interactive
+                )
 
             if status == "SUCCESS" and results:
                 await save_cached_session_results(record_book_number, results)
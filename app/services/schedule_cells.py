@@ -0,0 +1,146 @@
+"""
+Разбор ячеек xls-расписания: занятие (предмет / преподаватель / аудитория) и дата.
+
+Одни и те же строки (предмет, преподаватель, аудитория) повторяются тысячи раз
+по группам и неделям, поэтому результат разбора кэшируется в ограниченном LRU
+по исходному тексту ячейки. Регулярные выражения компилируются один раз.
+"""
+import re
+from collections import OrderedDict
+from datetime import datetime
+
+MONTHS_MAP = {
+    'января': 1, 'февраля': 2, 'марта': 3, 'апреля': 4, 'мая': 5, 'июня': 6,
+    'июля': 7, 'августа': 8, 'сентября': 9, 'октября': 10, 'ноября': 11, 'декабря': 12
+}
+
+ACADEMIC_TITLES = ("преподаватель", "доцент", "профессор", "ассистент", "зав. кафедрой")
+
+LEADING_DASH_RE = re.compile(r'^\s*-\s*')
+TEACHER_NAME_RE = re.compile(r'^[А-ЯЁ][а-яё\-]+\s+([А-ЯЁ]\.\s*[А-ЯЁ]\.|[А-ЯЁ][а-яё]+\s+[А-ЯЁ][а-яё]+)')
+SUBGROUP_RE = re.compile(r'(\d\s*п/г)', re.IGNORECASE)
+NUMERIC_DATE_RE = re.compile(r'(\d{1,2})\.(\d{1,2})\.(\d{2,4})')
+TEXT_DATE_RE = re.compile(r'(\d+)\s+([а-я]+)', re.IGNORECASE)
+
+_MISSING = object()
+
+
+class LessonCellParser:
+    """
+    Разбор ячеек с LRU-кэшем по тексту ячейки. Возвращаемые словари общие
+    для одинаковых ячеек — вызывающий код не должен их изменять.
+    """
+
+    def __init__(self, maxsize: int = 20000):
+        self.maxsize = maxsize
+        self._lessons: OrderedDict = OrderedDict()
+        self._dates: OrderedDict = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def reset_counters(self):
+        self.hits = 0
+        self.misses = 0
+
+    def counters(self) -> dict:
+        """Счётчики кэша для details_json задачи синхронизации."""
+        total = self.hits + self.misses
+        return {
+            "cell_cache_hits": self.hits,
+            "cell_cache_misses": self.misses,
+            "cell_cache_hit_rate": round(self.hits / total, 4) if total else 0.0,
+        }
+
+    def _cached(self, cache: OrderedDict, key, compute):
+        value = cache.get(key, _MISSING)
+        if value is not _MISSING:
+            cache.move_to_end(key)
+            self.hits += 1
+            return value
+        self.misses += 1
+        value = compute()
+        cache[key] = value
+        if len(cache) > self.maxsize:
+            cache.popitem(last=False)
+        return value
+
+    def parse_lesson(self, cell_content):
+        if not isinstance(cell_content, str) or not cell_content.strip(): return None
+        return self._cached(self._lessons, cell_content, lambda: parse_lesson_cell(cell_content))
+
+    def parse_date(self, cell_content, context: dict):
+        if not isinstance(cell_content, str): return None
+        key = (cell_content, context.get('semester'), context.get('start_year'),
+               context.get('end_year'), context.get('year'))
+        return self._cached(self._dates, key, lambda: parse_date_cell(cell_content, context))
+
+
+def parse_lesson_cell(cell_content):
+    if not isinstance(cell_content, str) or not cell_content.strip(): return None
+    lines = [LEADING_DASH_RE.sub('', line).strip() for line in cell_content.split('\n') if line.strip()]
+    if not lines: return None
+
+    subject = lines[0]
+    teacher = "Не указан"
+    location = "Не указана"
+    location_parts = []
+
+    if len(lines) > 1:
+        teacher_found = False
+        for line in lines[1:]:
+            if teacher_found:
+                location_parts.append(line)
+                continue
+            line_lower = line.lower()
+            if line_lower == "не указан": continue
+
+            is_academic = any(k in line_lower for k in ACADEMIC_TITLES)
+            if is_academic or TEACHER_NAME_RE.match(line):
+                teacher = line
+                teacher_found = True
+            else:
+                location_parts.append(line)
+        location = " ".join(location_parts) if location_parts else "Не указана"
+
+    subgroup_match = SUBGROUP_RE.search(cell_content)
+    if subgroup_match:
+        subject += f" ({subgroup_match.group(1).replace(' ', '')})"
+
+    return {"subject": subject, "teacher": teacher, "location": location}
+
+
+def parse_date_cell(cell_content, context: dict):
+    if not isinstance(cell_content, str): return None
+
+    date_match = NUMERIC_DATE_RE.search(cell_content)
+    if date_match:
+        try:
+            day = int(date_match.group(1))
+            month = int(date_match.group(2))
+            year_str = date_match.group(3)
+            year = int(year_str) + 2000 if len(year_str) == 2 else int(year_str)
+            return datetime(year, month, day).strftime('%Y-%m-%d')
+        except ValueError:
+            pass
+
+    match = TEXT_DATE_RE.search(cell_content)
+    if match:
+        day = int(match.group(1))
+        month = MONTHS_MAP.get(match.group(2).lower())
+        if month:
+            target_year = context.get('year', datetime.now().year)
+            if 'semester' in context:
+                if context['semester'] == 1:
+                    target_year = context['start_year'] if month >= 9 else context['end_year']
+                elif context['semester'] == 2:
+                    target_year = context['end_year']
+            else:
+                if month > 9 and datetime.now().month < 5:
+                    target_year = datetime.now().year - 1
+                else:
+                    target_year = datetime.now().year
+            try:
+                return datetime(target_year, month, day).strftime('%Y-%m-%d')
+            except ValueError:
+                return None
+    return None
@@ -1,31 +1,126 @@
 import asyncio
+import hashlib
+import json
+import multiprocessing
 import os
+import random
 import re
-import shutil
 import logging
 import sqlite3
 import ssl
+import time
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from collections import defaultdict
 from datetime import datetime, timezone
 from urllib.parse import urljoin, unquote, quote
 
 import aiohttp
 from bs4 import BeautifulSoup
 
-from app.core.config import DOWNLOAD_DIR, DB_PATH, BB_LOGIN, BB_PASSWORD, BB_URL
+from app.core.config import (
+    DATA_DIR, DOWNLOAD_DIR, DB_PATH, BB_LOGIN, BB_PASSWORD, BB_URL, SCHEDULE_SYNC_MODE,
+    BB_CRAWL_CONCURRENCY, BB_CRAWL_PER_HOST, BB_CRAWL_RETRIES, SCHEDULE_PARSE_WORKERS,
+    SCHEDULE_FAST_READER,
+)
+from app.core.database import SCHEDULE_INDEXES
 from app.core.logger import setup_logging
 from app.core.repositories.job_log import save_job_log, cleanup_old_job_logs
+from app.services.schedule_cells import LessonCellParser
 
 
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
 # --- CONSTANTS ---
-MONTHS_MAP = {
-    'января': 1, 'февраля': 2, 'марта': 3, 'апреля': 4, 'мая': 5, 'июня': 6,
-    'июля': 7, 'августа': 8, 'сентября': 9, 'октября': 10, 'ноября': 11, 'декабря': 12
-}
 
 # Базовый путь CMS к расписанию очной формы
 CMS_SCHEDULE_BASE = "/webapps/cmsmain/webui/institution/Расписание/Очная форма обучения"
 
+STAGING_TABLE = "schedule_staging"
+PREVIOUS_TABLE = "schedule_previous"
+CREATE_STAGING_SQL = f"""
+    CREATE TABLE {STAGING_TABLE} (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        faculty TEXT,
+        course TEXT,
+        group_name TEXT,
+        week_type TEXT,
+        lesson_date TEXT,
+        time TEXT,
+        subject TEXT,
+        teacher TEXT,
+        location TEXT
+    )
+"""
+
+INSERT_LESSON_SQL = """
+    INSERT INTO schedule (group_name, lesson_date, time, subject, teacher, location, week_type, faculty, course)
+    VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+"""
+
+# Манифест скачанных файлов и кэш распарсенных строк
+MANIFEST_PATH = os.path.join(DATA_DIR, "schedule_manifest.json")
+PARSE_CACHE_DIR = os.path.join(DATA_DIR, "schedule_parse_cache")
+# Увеличивать при изменении логики парсинга, чтобы сбросить кэш распарсенных строк
+PARSER_VERSION = 1
+
+
+def file_sha256(path: str) -> str:
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1 << 16), b""):
+            h.update(chunk)
+    return h.hexdigest()
+
+
+def parsed_cache_key(sha256: str, rel_path: str) -> str:
+    """
+    Ключ кэша распарсенных строк: содержимое файла + его путь внутри DOWNLOAD_DIR
+    (из пути выводятся факультет, курс и тип недели).
+    """
+    raw = f"{PARSER_VERSION}:{sha256}:{rel_path.replace(os.sep, '/')}"
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+
+def _cell_str(value) -> str:
+    """Приводит значение ячейки к строке так же, как старый _read_rows."""
+    if value is None:
+        return ""
+    return value if isinstance(value, str) else str(value)
+
+
+class ScheduleManifest:
+    """
+    Персистентный манифест: URL → {path, etag, last_modified, size, sha256, parsed_key}.
+    Позволяет отправлять условные GET и не скачивать неизменившиеся файлы.
+    """
+
+    def __init__(self, path: str = MANIFEST_PATH):
+        self.path = path
+        self.entries: dict[str, dict] = {}
+
+    def load(self):
+        try:
+            with open(self.path, encoding="utf-8") as f:
+                self.entries = json.load(f)
+        except (OSError, json.JSONDecodeError):
+            self.entries = {}
+
+    def save(self):
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        tmp_path = self.path + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(self.entries, f, ensure_ascii=False, indent=1)
+        os.replace(tmp_path, self.path)
+
+    def get(self, url: str) -> dict | None:
+        return self.entries.get(url)
+
+    def update(self, url: str, **fields):
+        self.entries.setdefault(url, {}).update(fields)
+
+    def retain(self, urls: set[str]):
+        """Удаляет записи о файлах, которых больше нет на сервере."""
+        self.entries = {url: entry for url, entry in self.entries.items() if url in urls}
+
 
 class ScheduleFetcher:
     """
@@ -39,19 +134,56 @@ class ScheduleFetcher:
         self.password = BB_PASSWORD
         self.base_url = BB_URL.rstrip("/")
         self._session: aiohttp.ClientSession | None = None
+        self.manifest = ScheduleManifest()
+        self.changed_files = 0
+        self.max_retries = max(1, BB_CRAWL_RETRIES)
+        self.backoff_base = 1.0
+        # Ограничивает число одновременных запросов к bb.usurt.ru (листинги + скачивания)
+        self._semaphore = asyncio.Semaphore(max(1, BB_CRAWL_CONCURRENCY))
 
     def ensure_download_dir(self):
-        if os.path.exists(self.download_dir):
-            logging.info(f"Удаляем старую папку с расписаниями: {self.download_dir}")
-            shutil.rmtree(self.download_dir)
-        logging.info(f"Создаем пустую папку для расписаний: {self.download_dir}")
+        # Папку не очищаем: неизменившиеся файлы остаются на диске и не скачиваются повторно
         os.makedirs(self.download_dir, exist_ok=True)
 
+    def _prune_stale_files(self, keep_paths: set[str]):
+        """Удаляет с диска файлы, которые больше не публикуются на Blackboard."""
+        keep = {os.path.abspath(p) for p in keep_paths}
+        for dirpath, _, filenames in os.walk(self.download_dir):
+            for filename in filenames:
+                path = os.path.abspath(os.path.join(dirpath, filename))
+                if path not in keep:
+                    logging.info(f"Удаляем устаревший файл расписания: {path}")
+                    os.remove(path)
+        for dirpath, dirnames, filenames in os.walk(self.download_dir, topdown=False):
+            if dirpath != self.download_dir and not os.listdir(dirpath):
+                os.rmdir(dirpath)
+
+    async def _with_retry(self, what: str, func, *args):
+        """
+        Выполняет запрос под семафором с повтором и экспоненциальной задержкой с джиттером.
+        Повторяются сетевые ошибки, таймауты и ответы 5xx.
+        """
+        for attempt in range(1, self.max_retries + 1):
+            try:
+                async with self._semaphore:
+                    return await func(*args)
+            except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+                if attempt == self.max_retries:
+                    raise
+                delay = self.backoff_base * (2 ** (attempt - 1)) * random.uniform(0.5, 1.5)
+                logging.warning(f"{what}: {e!r}, повтор {attempt}/{self.max_retries - 1} через {delay:.1f}с")
+                await asyncio.sleep(delay)
+
+    async def _fetch_text(self, url: str) -> str:
+        async with self._session.get(url) as resp:
+            if resp.status >= 500:
+                resp.raise_for_status()
+            return await resp.text()
+
     async def _get_page(self, url: str) -> BeautifulSoup:
         """GET запрос и парсинг HTML."""
-        async with self._session.get(url) as resp:
-            text = await resp.text()
-            return BeautifulSoup(text, "html.parser")
+        text = await self._with_retry(f"GET {url}", self._fetch_text, url)
+        return BeautifulSoup(text, "html.parser")
 
     async def login_to_bb(self):
         """Авторизация через POST-форму с nonce."""
@@ -183,35 +315,116 @@ class ScheduleFetcher:
 
         return files
 
+    async def _fetch_file(self, url: str, headers: dict, tmp_path: str) -> tuple[int, str | None, int, str | None, str | None]:
+        """
+        Потоково пишет ответ в tmp_path (без буферизации всего файла в памяти).
+        Returns: (status, sha256, size, etag, last_modified).
+        """
+        async with self._session.get(url, headers=headers) as resp:
+            if resp.status >= 500:
+                resp.raise_for_status()
+            if resp.status != 200:
+                return resp.status, None, 0, None, None
+            digest = hashlib.sha256()
+            size = 0
+            os.makedirs(os.path.dirname(tmp_path), exist_ok=True)
+            with open(tmp_path, "wb") as f:
+                async for chunk in resp.content.iter_chunked(1 << 16):
+                    digest.update(chunk)
+                    size += len(chunk)
+                    f.write(chunk)
+            return resp.status, digest.hexdigest(), size, resp.headers.get("ETag"), resp.headers.get("Last-Modified")
+
     async def _download_file(self, url: str, save_path: str) -> bool:
-        """Скачивает файл по URL и сохраняет на диск."""
+        """
+        Скачивает файл по URL и сохраняет на диск.
+        Если файл уже есть и сервер ответил 304 (или совпал sha256), файл не перезаписывается.
+        """
+        entry = self.manifest.get(url) or {}
+        headers = {}
+        if os.path.exists(save_path) and entry.get("path") == save_path:
+            if entry.get("etag"):
+                headers["If-None-Match"] = entry["etag"]
+            if entry.get("last_modified"):
+                headers["If-Modified-Since"] = entry["last_modified"]
+
+        tmp_path = save_path + ".part"
         try:
-            async with self._session.get(url) as resp:
-                if resp.status != 200:
-                    logging.warning(f"HTTP {resp.status} при скачивании {url}")
-                    return False
-                content = await resp.read()
-                os.makedirs(os.path.dirname(save_path), exist_ok=True)
-                with open(save_path, "wb") as f:
-                    f.write(content)
-                return True
+            status, sha256, size, etag, last_modified = await self._with_retry(
+                f"Скачивание {url}", self._fetch_file, url, headers, tmp_path
+            )
         except Exception as e:
             logging.error(f"Ошибка скачивания {url}: {e}")
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
             return False
+        if status == 304:
+            return True
+        if status != 200:
+            logging.warning(f"HTTP {status} при скачивании {url}")
+            return False
+
+        if sha256 == entry.get("sha256") and os.path.exists(save_path):
+            os.remove(tmp_path)
+        else:
+            os.replace(tmp_path, save_path)
+            self.changed_files += 1
+        rel_path = os.path.relpath(save_path, self.download_dir)
+        self.manifest.update(
+            url,
+            path=save_path,
+            etag=etag,
+            last_modified=last_modified,
+            size=size,
+            sha256=sha256,
+            parsed_key=parsed_cache_key(sha256, rel_path),
+        )
+        return True
 
-    async def run(self) -> list[str]:
+    async def _collect_week_targets(self, week_name: str, week_path: str) -> list[tuple[str, str]]:
+        """Возвращает [(download_url, save_path)] для всех файлов недели (факультеты обходятся параллельно)."""
+        logging.info(f"=== ОБРАБОТКА: {week_name.upper()} ===")
+        safe_week = re.sub(r'[\\/*?:"<>|]', "_", week_name).strip()
+
+        faculties = await self._get_faculty_folders(week_path)
+        if not faculties:
+            # Файлы могут лежать прямо в папке недели (без подпапок факультетов)
+            xls_files = await self._get_xls_links(week_path)
+            return [
+                (dl_url, os.path.join(self.download_dir, "Общее", f"{safe_week}_{filename}"))
+                for filename, dl_url in xls_files
+            ]
+
+        per_faculty = await asyncio.gather(*(self._get_xls_links(path) for path in faculties.values()))
+        targets = []
+        for faculty_name, xls_files in zip(faculties, per_faculty):
+            if not xls_files:
+                continue
+            logging.info(f"  📁 {faculty_name}: {len(xls_files)} файлов")
+            for filename, dl_url in xls_files:
+                save_path = os.path.join(self.download_dir, faculty_name, f"{safe_week}_{filename}")
+                targets.append((dl_url, save_path))
+        return targets
+
+    async def run(self, on_file=None) -> list[str]:
         """Основной процесс: логин → обход недель → факультеты → скачивание .xls.
-        Возвращает список путей к скачанным файлам."""
+        Возвращает список путей ко всем актуальным файлам (скачанным и неизменившимся).
+        Количество реально изменившихся файлов — в self.changed_files.
+
+        on_file: async callback(save_path) — вызывается сразу, как только файл готов на диске
+        (скачан, не изменился, или при ошибке осталась прошлая версия)."""
         self.ensure_download_dir()
-        downloaded_files = []
+        self.manifest.load()
+        self.changed_files = 0
 
         # SSL-контекст без проверки сертификата (bb.usurt.ru использует самоподписанный)
         ssl_ctx = ssl.create_default_context()
         ssl_ctx.check_hostname = False
         ssl_ctx.verify_mode = ssl.CERT_NONE
 
-        connector = aiohttp.TCPConnector(ssl=ssl_ctx)
-        timeout = aiohttp.ClientTimeout(total=30)
+        connector = aiohttp.TCPConnector(ssl=ssl_ctx, limit_per_host=max(1, BB_CRAWL_PER_HOST))
+        # Таймауты на соединение и чтение вместо общего: большие файлы качаются дольше 30с
+        timeout = aiohttp.ClientTimeout(total=None, sock_connect=15, sock_read=30)
         headers = {"User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) Chrome/120.0.0.0 Safari/537.36"}
 
         async with aiohttp.ClientSession(connector=connector, timeout=timeout, headers=headers) as session:
@@ -225,34 +438,36 @@ class ScheduleFetcher:
                     logging.error("Не удалось найти папки недель.")
                     return []
 
-                for week_name, week_path in week_folders.items():
-                    logging.info(f"=== ОБРАБОТКА: {week_name.upper()} ===")
-
-                    faculties = await self._get_faculty_folders(week_path)
-                    if not faculties:
-                        # Файлы могут лежать прямо в папке недели (без подпапок факультетов)
-                        xls_files = await self._get_xls_links(week_path)
-                        for filename, dl_url in xls_files:
-                            safe_week = re.sub(r'[\\/*?:"<>|]', "_", week_name).strip()
-                            save_path = os.path.join(self.download_dir, "Общее", f"{safe_week}_{filename}")
-                            if await self._download_file(dl_url, save_path):
-                                downloaded_files.append(save_path)
-                        continue
-
-                    for faculty_name, faculty_path in faculties.items():
-                        xls_files = await self._get_xls_links(faculty_path)
-                        if not xls_files:
-                            continue
-
-                        logging.info(f"  📁 {faculty_name}: {len(xls_files)} файлов")
-                        for filename, dl_url in xls_files:
-                            safe_week = re.sub(r'[\\/*?:"<>|]', "_", week_name).strip()
-                            final_filename = f"{safe_week}_{filename}"
-                            save_path = os.path.join(self.download_dir, faculty_name, final_filename)
-                            if await self._download_file(dl_url, save_path):
-                                downloaded_files.append(save_path)
-
-                logging.info(f"=== ВСЕ НЕДЕЛИ ОБРАБОТАНЫ: {len(downloaded_files)} файлов скачано ===")
+                per_week = await asyncio.gather(
+                    *(self._collect_week_targets(name, path) for name, path in week_folders.items())
+                )
+                # save_path → url; при совпадении путей побеждает последний, как при последовательном обходе
+                targets = {}
+                for week_targets in per_week:
+                    for dl_url, save_path in week_targets:
+                        targets[save_path] = dl_url
+
+                async def download(dl_url: str, save_path: str) -> bool:
+                    ok = await self._download_file(dl_url, save_path)
+                    if on_file and (ok or os.path.exists(save_path)):
+                        await on_file(save_path)
+                    return ok
+
+                results = await asyncio.gather(
+                    *(download(dl_url, save_path) for save_path, dl_url in targets.items())
+                )
+                downloaded_files = [save_path for save_path, ok in zip(targets, results) if ok]
+                seen_urls = set(targets.values())
+                # Пути всех опубликованных файлов: при ошибке скачивания остаётся прошлая версия
+                expected_paths = set(targets)
+
+                self.manifest.retain(seen_urls)
+                self.manifest.save()
+                self._prune_stale_files(expected_paths)
+                logging.info(
+                    f"=== ВСЕ НЕДЕЛИ ОБРАБОТАНЫ: {len(downloaded_files)} файлов, "
+                    f"изменилось {self.changed_files} ==="
+                )
                 return downloaded_files
 
             except Exception as e:
@@ -263,10 +478,19 @@ class ScheduleFetcher:
 
 
 class ScheduleProcessor:
-    def __init__(self):
+    def __init__(self, mode: str = SCHEDULE_SYNC_MODE):
         self.db_path = DB_PATH
         self.schedules_dir = DOWNLOAD_DIR
         self.current_year = datetime.now().year
+        self.mode = mode
+        self.stats: dict = {}
+        self.parse_cache_dir = PARSE_CACHE_DIR
+        self.parse_cache_hits = 0
+        self.parse_cache_misses = 0
+        self.parse_workers = SCHEDULE_PARSE_WORKERS
+        self.fast_reader = SCHEDULE_FAST_READER
+        self.cell_parser = LessonCellParser()
+        self._used_cache_paths: set = set()
 
     def determine_week_type(self, filename):
         filename_lower = filename.lower()
@@ -282,74 +506,10 @@ class ScheduleProcessor:
         return None
 
     def parse_date_from_cell(self, cell_content, context):
-        if not isinstance(cell_content, str): return None
-        
-        date_match = re.search(r'(\d{1,2})\.(\d{1,2})\.(\d{2,4})', cell_content)
-        if date_match:
-            try:
-                day = int(date_match.group(1))
-                month = int(date_match.group(2))
-                year_str = date_match.group(3)
-                year = int(year_str) + 2000 if len(year_str) == 2 else int(year_str)
-                return datetime(year, month, day).strftime('%Y-%m-%d')
-            except ValueError:
-                pass
-                
-        match = re.search(r'(\d+)\s+([а-я]+)', cell_content, re.IGNORECASE)
-        if match:
-            day = int(match.group(1))
-            month = MONTHS_MAP.get(match.group(2).lower())
-            if month:
-                target_year = context.get('year', datetime.now().year)
-                if 'semester' in context:
-                    if context['semester'] == 1:
-                        target_year = context['start_year'] if month >= 9 else context['end_year']
-                    elif context['semester'] == 2:
-                        target_year = context['end_year']
-                else:
-                    if month > 9 and datetime.now().month < 5:
-                        target_year = datetime.now().year - 1
-                    else:
-                        target_year = datetime.now().year
-                try:
-                    return datetime(target_year, month, day).strftime('%Y-%m-%d')
-                except ValueError:
-                    return None
-        return None
+        return self.cell_parser.parse_date(cell_content, context)
 
     def parse_lesson_cell(self, cell_content):
-        if not isinstance(cell_content, str) or not cell_content.strip(): return None
-        lines = [re.sub(r'^\s*-\s*', '', line).strip() for line in cell_content.split('\n') if line.strip()]
-        if not lines: return None
-            
-        subject = lines[0]
-        teacher = "Не указан"
-        location = "Не указана"
-        location_parts = []
-        
-        if len(lines) > 1:
-            teacher_found = False
-            for i in range(1, len(lines)):
-                line = lines[i]
-                if not teacher_found and line.lower() == "не указан": continue
-                
-                if not teacher_found:
-                    is_academic = any(k in line.lower() for k in ["преподаватель", "доцент", "профессор", "ассистент", "зав. кафедрой"])
-                    is_name_format = re.match(r'^[А-ЯЁ][а-яё\-]+\s+([А-ЯЁ]\.\s*[А-ЯЁ]\.|[А-ЯЁ][а-яё]+\s+[А-ЯЁ][а-яё]+)', line)
-                    if is_academic or is_name_format:
-                        teacher = line
-                        teacher_found = True
-                    else:
-                        location_parts.append(line)
-                else:
-                    location_parts.append(line)
-            location = " ".join(location_parts) if location_parts else "Не указана"
-            
-        subgroup_match = re.search(r'(\d\s*п/г)', cell_content, re.IGNORECASE)
-        if subgroup_match:
-            subject += f" ({subgroup_match.group(1).replace(' ', '')})"
-            
-        return {"subject": subject, "teacher": teacher, "location": location}
+        return self.cell_parser.parse_lesson(cell_content)
 
     def _read_rows(self, file_path: str) -> list[list[str]]:
         """Читает все строки Excel файла через xlrd (.xls) или openpyxl (.xlsx)."""
@@ -385,6 +545,97 @@ class ScheduleProcessor:
                     return rows
                 raise
 
+    @staticmethod
+    def _iter_openpyxl_rows(file_path: str):
+        import openpyxl
+        wb = openpyxl.load_workbook(file_path, read_only=True, data_only=True)
+        try:
+            yield from wb.active.iter_rows(values_only=True)
+        finally:
+            wb.close()
+
+    def _iter_raw_rows(self, file_path: str):
+        """
+        Быстрое чтение: строки целиком (xlrd row_values / openpyxl values_only)
+        с исходными значениями ячеек, без приведения каждой ячейки к str.
+        """
+        if file_path.endswith(".xlsx"):
+            yield from self._iter_openpyxl_rows(file_path)
+            return
+        import xlrd
+        from xlrd.biffh import XLRDError
+        try:
+            wb = xlrd.open_workbook(file_path)
+        except XLRDError as e:
+            if "Excel xlsx file; not supported" in str(e):
+                # Файл называется .xls, но внутри это .xlsx
+                yield from self._iter_openpyxl_rows(file_path)
+                return
+            raise
+        ws = wb.sheet_by_index(0)
+        for rx in range(ws.nrows):
+            yield ws.row_values(rx)
+
+    def _lessons_from_raw_rows(self, raw_rows, file_context, week_type, faculty, course) -> list[tuple]:
+        """
+        Быстрый разбор: до заголовка строки приводятся к str целиком, после — только
+        колонки дня, времени и групп; пустые ячейки пропускаются без аллокаций.
+        Результат совпадает с разбором через _read_rows.
+        """
+        rows = iter(raw_rows)
+        headers = None
+        for row in rows:
+            str_row = [_cell_str(v) for v in row]
+            if 'День' in str_row or ('Day' in str_row and 'Time' in str_row):
+                headers = [h.strip() for h in str_row]
+                break
+        if headers is None: return []
+
+        day_col = headers.index('День') if 'День' in headers else (headers.index('Day') if 'Day' in headers else -1)
+        time_col = headers.index('Часы') if 'Часы' in headers else (headers.index('Time') if 'Time' in headers else -1)
+        if day_col == -1 or time_col == -1: return []
+
+        skip = {day_col, time_col}
+        group_cols = [(idx, headers[idx].strip()) for idx in range(len(headers))
+                      if idx not in skip and headers[idx] and headers[idx] != 'nan']
+
+        lessons_list = []
+        current_date_str = None
+        current_time_slot = None
+        for row in rows:
+            row_len = len(row)
+            day_val = row[day_col] if day_col < row_len else None
+            if day_val is not None and day_val != "":
+                potential_date = self.parse_date_from_cell(_cell_str(day_val), file_context)
+                if potential_date:
+                    current_date_str = potential_date
+                    current_time_slot = None
+
+            if not current_date_str: continue
+
+            time_val = row[time_col] if time_col < row_len else None
+            raw_time = _cell_str(time_val).strip() if time_val is not None else ""
+            if raw_time and "nan" not in raw_time.lower():
+                time_slot = raw_time
+                current_time_slot = time_slot
+            elif current_time_slot:
+                time_slot = current_time_slot
+            else:
+                continue
+
+            for col_idx, group_name in group_cols:
+                if col_idx >= row_len: continue
+                cell_val = row[col_idx]
+                if cell_val is None or cell_val == "": continue
+                lesson_info = self.parse_lesson_cell(_cell_str(cell_val))
+                if lesson_info:
+                    lessons_list.append((
+                        group_name, current_date_str, time_slot,
+                        lesson_info['subject'], lesson_info['teacher'], lesson_info['location'],
+                        week_type, faculty, course
+                    ))
+        return lessons_list
+
     def process_single_file(self, file_path, faculty="Неизвестно", course="N/A"):
         lessons_list = []
         filename = os.path.basename(file_path)
@@ -401,6 +652,11 @@ class ScheduleProcessor:
             file_context['year'] = self.current_year
             
         try:
+            if self.fast_reader:
+                return self._lessons_from_raw_rows(
+                    self._iter_raw_rows(file_path), file_context, week_type, faculty, course
+                )
+
             rows = self._read_rows(file_path)
             if not rows:
                 return []
@@ -465,57 +721,456 @@ class ScheduleProcessor:
             logging.error(f"Error processing {filename}: {e}")
             return []
 
+    @staticmethod
+    def lesson_key(lesson: tuple) -> tuple:
+        """Стабильный ключ занятия: (группа, дата, время, предмет, преподаватель, аудитория)."""
+        return lesson[:6]
+
+    def job_for_path(self, file_path: str) -> tuple[str, str, str]:
+        """(file_path, faculty, course) — факультет и курс выводятся из пути внутри папки расписаний."""
+        relative_path = os.path.relpath(os.path.dirname(file_path), self.schedules_dir)
+        path_parts = relative_path.split(os.sep)
+        faculty = path_parts[0] if path_parts else "Неизвестно"
+        course_str = path_parts[1] if len(path_parts) > 1 else "Без курса"
+        course = re.search(r'\d+', course_str).group(0) if re.search(r'\d+', course_str) else "N/A"
+        if course == "N/A":
+            match = re.search(r'(\d+)\s*курс', os.path.basename(file_path), re.IGNORECASE)
+            if match: course = match.group(1)
+        return file_path, faculty, course
+
+    def _iter_schedule_files(self):
+        """Yields (file_path, faculty, course) для всех файлов в папке расписаний."""
+        for dirpath, _, filenames in os.walk(self.schedules_dir):
+            if dirpath == self.schedules_dir: continue
+            for filename in filenames:
+                yield self.job_for_path(os.path.join(dirpath, filename))
+
+    def _cache_path(self, file_path: str) -> str | None:
+        """Путь к кэшу распарсенных строк файла (ключ — sha256 содержимого + относительный путь)."""
+        try:
+            rel_path = os.path.relpath(file_path, self.schedules_dir)
+            key = parsed_cache_key(file_sha256(file_path), rel_path)
+        except OSError:
+            return None
+        return os.path.join(self.parse_cache_dir, f"{key}.json")
+
+    def _load_cached(self, cache_path: str | None) -> list[tuple] | None:
+        if not cache_path:
+            return None
+        try:
+            with open(cache_path, encoding="utf-8") as f:
+                return [tuple(row) for row in json.load(f)]
+        except (OSError, json.JSONDecodeError):
+            return None
+
+    def _store_cached(self, cache_path: str | None, lessons: list[tuple]):
+        if not cache_path:
+            return
+        try:
+            os.makedirs(self.parse_cache_dir, exist_ok=True)
+            with open(cache_path, "w", encoding="utf-8") as f:
+                json.dump(lessons, f, ensure_ascii=False)
+        except OSError as e:
+            logging.warning(f"Не удалось сохранить кэш разбора {cache_path}: {e}")
+
+    def _prune_parse_cache(self, used_paths: set):
+        if not os.path.isdir(self.parse_cache_dir):
+            return
+        for name in os.listdir(self.parse_cache_dir):
+            path = os.path.join(self.parse_cache_dir, name)
+            if name.endswith(".json") and path not in used_paths:
+                os.remove(path)
+
+    def parse_files(self, jobs: list[tuple[str, str, str]]) -> list[list[tuple]]:
+        """
+        Разбирает файлы [(file_path, faculty, course)] и возвращает занятия в том же порядке.
+        При parse_workers > 1 файлы разбираются параллельно в пуле процессов.
+        """
+        workers = min(self.parse_workers, len(jobs))
+        if workers <= 1:
+            return [self.process_single_file(*job) for job in jobs]
+
+        logging.info(f"Разбор {len(jobs)} файлов в {workers} процессах...")
+        ctx = multiprocessing.get_context("spawn")
+        with ProcessPoolExecutor(max_workers=workers, mp_context=ctx) as pool:
+            return [self.merge_worker_result(result) for result in pool.map(_parse_file_worker, jobs)]
+
+    def merge_worker_result(self, result: tuple[list[tuple], int, int]) -> list[tuple]:
+        """Переносит счётчики кэша ячеек из процесса-воркера и возвращает его занятия."""
+        lessons, hits, misses = result
+        self.cell_parser.hits += hits
+        self.cell_parser.misses += misses
+        return lessons
+
+    def collect_lessons(self) -> list[tuple]:
+        """Обходит папку с расписаниями и возвращает все занятия из всех файлов."""
+        self.parse_cache_hits = 0
+        self.parse_cache_misses = 0
+        self.cell_parser.reset_counters()
+        used_paths = set()
+
+        per_file: list[list[tuple] | None] = []
+        misses = []  # (index, job, cache_path)
+        for job in self._iter_schedule_files():
+            cache_path = self._cache_path(job[0])
+            if cache_path:
+                used_paths.add(cache_path)
+            cached = self._load_cached(cache_path)
+            if cached is not None:
+                self.parse_cache_hits += 1
+                per_file.append(cached)
+            else:
+                self.parse_cache_misses += 1
+                per_file.append(None)
+                misses.append((len(per_file) - 1, job, cache_path))
+
+        if misses:
+            parsed = self.parse_files([job for _, job, _ in misses])
+            for (idx, _, cache_path), lessons in zip(misses, parsed):
+                per_file[idx] = lessons
+                self._store_cached(cache_path, lessons)
+
+        self._prune_parse_cache(used_paths)
+        return [lesson for lessons in per_file for lesson in lessons]
+
+    def _apply_full(self, cursor, all_lessons: list[tuple]) -> dict:
+        """Старый режим: очищает таблицу и вставляет все занятия заново."""
+        cursor.execute("DELETE FROM schedule;")
+        removed = cursor.rowcount
+        cursor.executemany(INSERT_LESSON_SQL, all_lessons)
+        return {"inserted": len(all_lessons), "removed": removed, "changed": 0, "unchanged": 0}
+
+    def _apply_diff(self, cursor, all_lessons: list[tuple]) -> dict:
+        """
+        Применяет к таблице только разницу между текущим содержимым и новыми занятиями.
+        Занятия сопоставляются по lesson_key; если ключ совпал, но отличаются
+        week_type/faculty/course — строка обновляется на месте.
+        """
+        existing = defaultdict(list)
+        cursor.execute("""
+            SELECT id, group_name, lesson_date, time, subject, teacher, location, week_type, faculty, course
+            FROM schedule
+        """)
+        for row in cursor.fetchall():
+            existing[tuple(row[1:7])].append((row[0], tuple(row[7:])))
+
+        incoming = defaultdict(list)
+        for lesson in all_lessons:
+            incoming[self.lesson_key(lesson)].append(tuple(lesson[6:]))
+
+        to_insert, to_delete, to_update = [], [], []
+        unchanged = 0
+        for key, new_extras in incoming.items():
+            old_rows = existing.pop(key, [])
+            # Сначала сопоставляем полностью совпадающие строки, затем оставшиеся — как изменённые
+            remaining_old = []
+            pending_new = list(new_extras)
+            for row_id, old_extra in old_rows:
+                if old_extra in pending_new:
+                    pending_new.remove(old_extra)
+                    unchanged += 1
+                else:
+                    remaining_old.append(row_id)
+            for row_id, extra in zip(remaining_old, pending_new):
+                to_update.append((*extra, row_id))
+            for extra in pending_new[len(remaining_old):]:
+                to_insert.append((*key, *extra))
+            to_delete.extend((row_id,) for row_id in remaining_old[len(pending_new):])
+
+        # Ключи, которых больше нет в файлах
+        for old_rows in existing.values():
+            to_delete.extend((row_id,) for row_id, _ in old_rows)
+
+        if to_delete:
+            cursor.executemany("DELETE FROM schedule WHERE id = ?", to_delete)
+        if to_update:
+            cursor.executemany(
+                "UPDATE schedule SET week_type = ?, faculty = ?, course = ? WHERE id = ?", to_update
+            )
+        if to_insert:
+            cursor.executemany(INSERT_LESSON_SQL, to_insert)
+
+        return {
+            "inserted": len(to_insert),
+            "removed": len(to_delete),
+            "changed": len(to_update),
+            "unchanged": unchanged,
+        }
+
+    def _apply(self, all_lessons: list[tuple]) -> bool:
+        """Записывает занятия в schedule одной транзакцией (diff или full) и заполняет self.stats."""
+        if self.mode == "swap":
+            self._reset_staging_table()
+            self.stage_lessons(all_lessons)
+            return self._publish_swap()
+
+        conn = sqlite3.connect(self.db_path)
+        try:
+            cursor = conn.cursor()
+            cursor.execute("BEGIN TRANSACTION;")
+            if self.mode == "full":
+                stats = self._apply_full(cursor, all_lessons)
+            else:
+                stats = self._apply_diff(cursor, all_lessons)
+            cursor.execute(f"DROP TABLE IF EXISTS {STAGING_TABLE}")
+            conn.commit()
+            self.stats = {
+                "mode": self.mode,
+                "lessons_total": len(all_lessons),
+                "parse_cache_hits": self.parse_cache_hits,
+                "parse_cache_misses": self.parse_cache_misses,
+                **self.cell_parser.counters(),
+                **stats,
+            }
+            logging.info(
+                f"Updated DB ({self.mode}): {len(all_lessons)} lessons, "
+                f"+{stats['inserted']} -{stats['removed']} ~{stats['changed']}"
+            )
+            return True
+        except Exception as e:
+            conn.rollback()
+            logging.error(f"DB Update Error: {e}")
+            return False
+        finally:
+            conn.close()
+
     def run(self):
+        self.stats = {}
         if not os.path.exists(self.schedules_dir):
             logging.error(f"Directory {self.schedules_dir} not found.")
             return False
 
-        conn = sqlite3.connect(self.db_path)
-        all_lessons = []
-        
         logging.info("Processing schedule files...")
-        for dirpath, _, filenames in os.walk(self.schedules_dir):
-            if dirpath == self.schedules_dir: continue
-            
-            relative_path = os.path.relpath(dirpath, self.schedules_dir)
-            path_parts = relative_path.split(os.sep)
-            faculty = path_parts[0] if path_parts else "Неизвестно"
-            course_str = path_parts[1] if len(path_parts) > 1 else "Без курса"
-            course = re.search(r'\d+', course_str).group(0) if re.search(r'\d+', course_str) else "N/A"
-            
-            for filename in filenames:
-                file_path = os.path.join(dirpath, filename)
-                current_file_course = course
-                if current_file_course == "N/A":
-                    match = re.search(r'(\d+)\s*курс', filename, re.IGNORECASE)
-                    if match: current_file_course = match.group(1)
-                
-                lessons = self.process_single_file(file_path, faculty, current_file_course)
-                all_lessons.extend(lessons)
+        all_lessons = self.collect_lessons()
 
         if not all_lessons:
             logging.warning("No lessons found.")
-            conn.close()
             return False
 
+        return self._apply(all_lessons)
+
+    # --- Потоковый режим: файлы разбираются по мере скачивания, строки копятся в staging-таблице ---
+
+    def begin_staging(self):
+        """Создаёт пустую staging-таблицу и сбрасывает счётчики кэша."""
+        self.stats = {}
+        self.parse_cache_hits = 0
+        self.parse_cache_misses = 0
+        self.cell_parser.reset_counters()
+        self._used_cache_paths = set()
+        self._reset_staging_table()
+
+    def _reset_staging_table(self):
+        conn = sqlite3.connect(self.db_path)
         try:
-            cursor = conn.cursor()
-            cursor.execute("BEGIN TRANSACTION;")
-            cursor.execute("DELETE FROM schedule;")
-            cursor.executemany("""
-            INSERT INTO schedule (group_name, lesson_date, time, subject, teacher, location, week_type, faculty, course)
-            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
-            """, all_lessons)
+            conn.execute(f"DROP TABLE IF EXISTS {STAGING_TABLE}")
+            conn.execute(CREATE_STAGING_SQL)
+            conn.commit()
+        finally:
+            conn.close()
+
+    def lookup_cached(self, file_path: str) -> tuple[tuple[str, str, str], str | None, list[tuple] | None]:
+        """Returns (job, cache_path, cached_lessons | None) для одного файла."""
+        job = self.job_for_path(file_path)
+        cache_path = self._cache_path(file_path)
+        if cache_path:
+            self._used_cache_paths.add(cache_path)
+        cached = self._load_cached(cache_path)
+        if cached is not None:
+            self.parse_cache_hits += 1
+        else:
+            self.parse_cache_misses += 1
+        return job, cache_path, cached
+
+    def stage_lessons(self, lessons: list[tuple], cache_path: str | None = None):
+        """Дописывает пачку занятий одного файла в staging-таблицу (и, если нужно, в кэш разбора)."""
+        if cache_path:
+            self._store_cached(cache_path, lessons)
+        if not lessons:
+            return
+        conn = sqlite3.connect(self.db_path)
+        try:
+            conn.executemany(INSERT_LESSON_SQL.replace("INTO schedule ", f"INTO {STAGING_TABLE} "), lessons)
             conn.commit()
-            logging.info(f"Updated DB with {len(all_lessons)} lessons.")
+        finally:
+            conn.close()
+
+    def apply_staged(self) -> bool:
+        """Переносит накопленные в staging-таблице занятия в schedule (diff или full)."""
+        self._prune_parse_cache(self._used_cache_paths)
+        if self.mode == "swap":
+            return self._publish_swap()
+
+        conn = sqlite3.connect(self.db_path)
+        try:
+            all_lessons = conn.execute(f"""
+                SELECT group_name, lesson_date, time, subject, teacher, location, week_type, faculty, course
+                FROM {STAGING_TABLE} ORDER BY id
+            """).fetchall()
+        finally:
+            conn.close()
+        if not all_lessons:
+            logging.warning("No lessons found.")
+            return False
+        return self._apply(all_lessons)
+
+    # --- Публикация через подмену таблиц ---
+
+    def _publish_swap(self) -> bool:
+        """
+        Строит индексы на schedule_staging и подменяет ею schedule двумя RENAME
+        в одной короткой транзакции. Прошлое поколение остаётся в schedule_previous
+        для мгновенного отката (rollback_to_previous).
+        """
+        conn = sqlite3.connect(self.db_path, isolation_level=None)
+        try:
+            total = conn.execute(f"SELECT COUNT(*) FROM {STAGING_TABLE}").fetchone()[0]
+            if not total:
+                logging.warning("No lessons found.")
+                return False
+
+            # Освобождаем имена индексов прошлого поколения и строим индексы до захвата блокировки
+            conn.execute(f"DROP TABLE IF EXISTS {PREVIOUS_TABLE}")
+            canonical_taken = conn.execute(
+                "SELECT 1 FROM sqlite_master WHERE type = 'index' AND name = ?",
+                (next(iter(SCHEDULE_INDEXES)),),
+            ).fetchone()
+            suffix = "_alt" if canonical_taken else ""
+            for index_name, columns in SCHEDULE_INDEXES.items():
+                conn.execute(f"CREATE INDEX {index_name}{suffix} ON {STAGING_TABLE} {columns}")
+
+            has_live = conn.execute(
+                "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'schedule'"
+            ).fetchone()
+            inserted = removed = 0
+            if has_live:
+                key_cols = "group_name, lesson_date, time, subject, teacher, location"
+                inserted = conn.execute(
+                    f"SELECT COUNT(*) FROM (SELECT {key_cols} FROM {STAGING_TABLE} EXCEPT SELECT {key_cols} FROM schedule)"
+                ).fetchone()[0]
+                removed = conn.execute(
+                    f"SELECT COUNT(*) FROM (SELECT {key_cols} FROM schedule EXCEPT SELECT {key_cols} FROM {STAGING_TABLE})"
+                ).fetchone()[0]
+
+            started = time.perf_counter()
+            conn.execute("BEGIN IMMEDIATE")
+            if has_live:
+                conn.execute(f"ALTER TABLE schedule RENAME TO {PREVIOUS_TABLE}")
+            conn.execute(f"ALTER TABLE {STAGING_TABLE} RENAME TO schedule")
+            conn.execute("COMMIT")
+            lock_ms = round((time.perf_counter() - started) * 1000, 2)
+
+            self.stats = {
+                "mode": "swap",
+                "lessons_total": total,
+                "parse_cache_hits": self.parse_cache_hits,
+                "parse_cache_misses": self.parse_cache_misses,
+                **self.cell_parser.counters(),
+                "inserted": inserted,
+                "removed": removed,
+                "changed": 0,
+                "swap_lock_ms": lock_ms,
+            }
+            logging.info(f"Schedule swapped in: {total} lessons (+{inserted} -{removed}), lock {lock_ms} ms")
             return True
         except Exception as e:
-            conn.rollback()
-            logging.error(f"DB Update Error: {e}")
+            if conn.in_transaction:
+                conn.execute("ROLLBACK")
+            logging.error(f"DB Swap Error: {e}")
             return False
         finally:
             conn.close()
 
+    def rollback_to_previous(self) -> bool:
+        """Мгновенно возвращает прошлое поколение расписания (меняет schedule и schedule_previous местами)."""
+        conn = sqlite3.connect(self.db_path, isolation_level=None)
+        try:
+            if not conn.execute(
+                "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = ?", (PREVIOUS_TABLE,)
+            ).fetchone():
+                logging.warning("Нет предыдущего поколения расписания для отката.")
+                return False
+            conn.execute("BEGIN IMMEDIATE")
+            conn.execute("ALTER TABLE schedule RENAME TO schedule_rollback_tmp")
+            conn.execute(f"ALTER TABLE {PREVIOUS_TABLE} RENAME TO schedule")
+            conn.execute(f"ALTER TABLE schedule_rollback_tmp RENAME TO {PREVIOUS_TABLE}")
+            conn.execute("COMMIT")
+            logging.info("Расписание откатено к предыдущему поколению.")
+            return True
+        except Exception as e:
+            if conn.in_transaction:
+                conn.execute("ROLLBACK")
+            logging.error(f"Schedule rollback error: {e}")
+            return False
+        finally:
+            conn.close()
+
+
+_worker_processor: ScheduleProcessor | None = None
+
+
+def _parse_file_worker(job: tuple[str, str, str]) -> tuple[list[tuple], int, int]:
+    """
+    Точка входа процесса-воркера: разбирает один файл. Процессор (и кэш ячеек)
+    живёт всё время жизни воркера. Returns: (занятия, попадания, промахи кэша ячеек).
+    """
+    global _worker_processor
+    if _worker_processor is None:
+        _worker_processor = ScheduleProcessor()
+    parser = _worker_processor.cell_parser
+    parser.reset_counters()
+    lessons = _worker_processor.process_single_file(*job)
+    return lessons, parser.hits, parser.misses
+
+
+async def run_sync_pipeline(fetcher: ScheduleFetcher, processor: ScheduleProcessor) -> list[str]:
+    """
+    Конвейер скачивание → разбор: каждый файл попадает в очередь сразу после скачивания,
+    разбирается (в пуле процессов при parse_workers > 1) и пачкой пишется в staging-таблицу,
+    пока обход Blackboard ещё идёт. Returns: список актуальных файлов (как ScheduleFetcher.run).
+    """
+    loop = asyncio.get_running_loop()
+    queue: asyncio.Queue = asyncio.Queue()
+    consumers_count = max(1, processor.parse_workers)
+    # sqlite-запись и хэширование — в одном потоке, чтобы не конкурировать за блокировку БД
+    io_executor = ThreadPoolExecutor(max_workers=1)
+    parse_pool = None
+    if processor.parse_workers > 1:
+        parse_pool = ProcessPoolExecutor(
+            max_workers=processor.parse_workers, mp_context=multiprocessing.get_context("spawn")
+        )
+
+    async def consumer():
+        while True:
+            file_path = await queue.get()
+            if file_path is None:
+                return
+            job, cache_path, lessons = await loop.run_in_executor(io_executor, processor.lookup_cached, file_path)
+            if lessons is None:
+                if parse_pool:
+                    lessons = processor.merge_worker_result(
+                        await loop.run_in_executor(parse_pool, _parse_file_worker, job)
+                    )
+                else:
+                    lessons = await loop.run_in_executor(io_executor, processor.process_single_file, *job)
+            await loop.run_in_executor(io_executor, processor.stage_lessons, lessons, cache_path)
+
+    try:
+        await loop.run_in_executor(io_executor, processor.begin_staging)
+        consumers = [asyncio.create_task(consumer()) for _ in range(consumers_count)]
+        try:
+            xls_files = await fetcher.run(on_file=queue.put)
+        finally:
+            for _ in consumers:
+                queue.put_nowait(None)
+            await asyncio.gather(*consumers)
+        return xls_files
+    finally:
+        io_executor.shutdown(wait=True)
+        if parse_pool:
+            parse_pool.shutdown(wait=True)
+
+
 async def run_full_sync():
     start_time = datetime.now(timezone.utc)
     logging.info(f"Начало полного цикла обновления расписания: {start_time}")
@@ -525,14 +1180,18 @@ async def run_full_sync():
     details = {}
     status = "ERROR"
     try:
-        xls_files = await fetcher.run()
+        # Файлы разбираются по мере скачивания и копятся в staging-таблице
+        xls_files = await run_sync_pipeline(fetcher, processor)
         details["excel_files_downloaded"] = len(xls_files)
+        details["excel_files_changed"] = fetcher.changed_files
         
-        # Теоретически тут можно посчитать rows_processed, 
-        # но ScheduleProcessor напрямую через sqlite3 пишет в БД.
         # Для простоты считаем успешным, если не было исключений.
+        # Счётчики вставленных/удалённых/изменённых строк пишем в details_json.
         if xls_files:
-            processor.run()
+            # Запись в БД — блокирующая, выносим из event loop бота
+            loop = asyncio.get_running_loop()
+            await loop.run_in_executor(None, processor.apply_staged)
+            details.update(processor.stats)
             status = "SUCCESS"
         else:
             logging.warning("Не удалось скачать файлы расписания.")
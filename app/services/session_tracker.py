@@ -1,4 +1,3 @@
-import asyncio
 import logging
 from aiogram import Bot
 
@@ -57,7 +56,9 @@ async def run_session_tracking(bot: Bot):
     for user_id, record_book_number in users:
         try:
             old_data, last_updated = await get_cached_session_results(record_book_number)
-            status, new_data = await UsurtScraper.get_session_results(record_book_number, use_cache=False)
+            status, new_data = await UsurtScraper.get_session_results(
+                record_book_number, use_cache=False, interactive=False
+            )
             
             if status == "SUCCESS" and new_data:
                 # Compare and notify if we had previous data
@@ -76,7 +77,6 @@ async def run_session_tracking(bot: Bot):
                 
         except Exception as e:
             logging.error(f"Ошибка при отслеживании сессии для {record_book_number}: {e}")
-            
-        await asyncio.sleep(2) # Задержка, чтобы не DDoS-ить сайт УрГУПС
+        # Темп запросов к сайту УрГУПС задаёт общий report_limiter
     
     logging.info("✅ Фоновая проверка сессии завершена.")
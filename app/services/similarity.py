@@ -0,0 +1,75 @@
+"""
+Общие функции сходства множеств предметов для кластеризации и маппинга кластеров.
+
+Предметы один раз кодируются в словарь (subject → номер бита), множество
+предметов становится битовой маской (int), а пересечение и объединение —
+побитовыми & / | с popcount (int.bit_count) вместо операций над set строк.
+"""
+import re
+from typing import Dict, Iterable, List
+
+SUBGROUP_SUFFIX_RE = re.compile(r'\s*\(\d+\s*п/г\)')
+
+
+def normalize_subject(subject: str) -> str:
+    """Убирает подгруппу "(1п/г)" из названия предмета расписания."""
+    return SUBGROUP_SUFFIX_RE.sub('', subject).strip()
+
+
+class SubjectVocabulary:
+    """Словарь предметов: каждому названию — свой бит в маске."""
+
+    def __init__(self, normalize: bool = False):
+        self.normalize = normalize
+        self.ids: Dict[str, int] = {}
+        self._normalized: Dict[str, str] = {}
+
+    def _key(self, subject: str) -> str:
+        if not self.normalize:
+            return subject
+        key = self._normalized.get(subject)
+        if key is None:
+            key = self._normalized[subject] = normalize_subject(subject)
+        return key
+
+    def add(self, subjects: Iterable[str]):
+        for subject in subjects:
+            self.ids.setdefault(self._key(subject), len(self.ids))
+
+    def encode(self, subjects: Iterable[str]) -> int:
+        """Битовая маска множества; предметы не из словаря добавляются в него."""
+        mask = 0
+        for subject in subjects:
+            key = self._key(subject)
+            bit = self.ids.get(key)
+            if bit is None:
+                bit = self.ids[key] = len(self.ids)
+            mask |= 1 << bit
+        return mask
+
+
+def jaccard_bits(a: int, b: int) -> float:
+    """Коэффициент Жаккара для двух масок (0.0, если одна из них пуста)."""
+    if not a or not b:
+        return 0.0
+    union = (a | b).bit_count()
+    return (a & b).bit_count() / union if union > 0 else 0.0
+
+
+def inclusion_score_bits(cluster: int, group: int) -> float:
+    """
+    Доля предметов группы, которые есть у кластера, плюс 0.1 × Жаккар
+    для разрешения спорных случаев между курсами.
+    """
+    if not cluster or not group:
+        return 0.0
+    intersection = (cluster & group).bit_count()
+    union = (cluster | group).bit_count()
+    inclusion = intersection / group.bit_count()
+    jaccard = intersection / union if union > 0 else 0.0
+    return inclusion + (jaccard * 0.1)
+
+
+def inclusion_matrix(clusters: List[int], groups: List[int]) -> List[List[float]]:
+    """Матрица inclusion_score_bits: строка на группу, столбец на кластер."""
+    return [[inclusion_score_bits(cluster, group) for cluster in clusters] for group in groups]
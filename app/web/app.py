@@ -22,21 +22,23 @@ from fastapi.templating import Jinja2Templates
 from app.bot.formatter import filter_results_by_settings
 from app.bot.handlers.teachers import is_teacher_match
 from app.core.config import ADMIN_ID, BASE_DIR, DB_PATH, TELEGRAM_BOT_TOKEN
-from app.core.database import close_db_connection, get_db_connection, initialize_database
+from app.core.database import close_db_connection, get_read_connection, initialize_database
+from app.core.http_client import close_http_clients
 from app.core.repositories.job_log import get_last_two_job_logs
 from app.core.repositories.rating import (
     get_cluster_by_group,
     get_cluster_subjects,
     get_expelled_statistics,
     get_group_by_record_book,
-    get_rating_position,
+    get_rating_positions,
     get_student_cluster_info,
     get_top_students,
 )
-from app.core.repositories.schedule import get_schedule_by_teacher, get_teachers_for_subject
+from app.core.repositories.schedule import get_schedule_by_teacher, get_teachers_for_subjects
 from app.core.repositories.subject import (
     get_cluster_subject_stats,
     get_global_subject_stats,
+    get_global_subject_stats_bulk,
     get_record_book_subjects,
     get_record_books_in_cluster,
     get_subject_note,
@@ -60,9 +62,9 @@ from app.core.repositories.user import (
 )
 from app.core.state import GlobalState
 from app.services.db_transfer import export_rating_data, import_rating_data
-from app.services.rating_updater import run_rating_update
+from app.services.rating_updater import run_full_recluster, run_rating_update
 from app.services.schedule_api import UsurtScraper
-from app.services.schedule_sync import run_full_sync
+from app.services.schedule_sync import ScheduleProcessor, run_full_sync
 
 logger = logging.getLogger(__name__)
 
@@ -75,6 +77,7 @@ async def lifespan(app: FastAPI):
         await GlobalState.reload()
     yield
     logger.info("Остановка веб-приложения.")
+    await close_http_clients()
     await close_db_connection()
 
 
@@ -91,6 +94,7 @@ class JobRegistry:
         self._locks = {
             "schedule_sync": asyncio.Lock(),
             "rating_update": asyncio.Lock(),
+            "recluster": asyncio.Lock(),
             "db_import": asyncio.Lock(),
             "broadcast": asyncio.Lock(),
         }
@@ -227,7 +231,7 @@ def _lesson_dict(row) -> dict[str, Any]:
 
 
 async def _schedule_for_group(group: str, target_date: str | None = None, user_id: int | None = None):
-    db = await get_db_connection()
+    db = await get_read_connection()
     params: tuple[Any, ...]
     if target_date:
         query = """
@@ -306,39 +310,23 @@ async def _session_payload(user_id: int, record_book: str, use_cache: bool = Tru
     if status != "SUCCESS" or data is None:
         return {"status": status, "record_book": record_book, "results": [], "summary": None}
 
-    rating_info = {}
-    for scope in ("cluster", "year", "all"):
-        pos = await get_rating_position(record_book, scope)
-        if pos:
-            rating_info[f"{scope}_pos"] = pos
+    rating_info = await get_rating_positions(record_book)
 
     cluster_id = None
-    db = await get_db_connection()
+    db = await get_read_connection()
     async with db.execute("SELECT cluster_id FROM rating_data WHERE record_book = ?", (record_book,)) as cur:
         row = await cur.fetchone()
         if row and row[0]:
             cluster_id = row[0]
 
     cluster_subject_stats = await get_cluster_subject_stats(cluster_id) if cluster_id else {}
-    subject_stats = {}
-    for item in data:
-        subject = item.get("subject", "").strip()
-        if subject and subject not in subject_stats:
-            stats = await get_global_subject_stats(subject)
-            if stats:
-                subject_stats[subject] = stats
+    subjects = [subject for subject in (item.get("subject", "").strip() for item in data) if subject]
+    subject_stats = await get_global_subject_stats_bulk(subjects)
 
     teacher_map = {}
     student_group = await get_group_by_record_book(record_book)
     if student_group:
-        seen = set()
-        for item in data:
-            subject = item.get("subject", "").strip()
-            if subject and subject not in seen:
-                seen.add(subject)
-                teachers = await get_teachers_for_subject(student_group, subject)
-                if teachers:
-                    teacher_map[subject] = teachers
+        teacher_map = await get_teachers_for_subjects(student_group, subjects)
 
     filtered = filter_results_by_settings(data, settings)
     total = len(data)
@@ -608,6 +596,19 @@ async def api_admin_start_job(job_name: str, admin: dict = Depends(require_admin
         return jobs.start("schedule_sync", run)
     if job_name == "rating_update":
         return jobs.start("rating_update", lambda: run_rating_update())
+    if job_name == "recluster":
+        async def run():
+            await run_full_recluster()
+            return "Кластеры пересчитаны"
+
+        return jobs.start("recluster", run)
+    if job_name == "schedule_rollback":
+        processor = ScheduleProcessor()
+        success = await asyncio.get_running_loop().run_in_executor(None, processor.rollback_to_previous)
+        if not success:
+            raise HTTPException(status_code=409, detail="Нет предыдущей версии расписания")
+        await GlobalState.reload()
+        return {"status": "success", "message": "Расписание откатено к предыдущей версии"}
     if job_name == "reload_structure":
         await GlobalState.reload()
         return {"status": "success", "message": "Структура перезагружена"}
@@ -680,11 +681,7 @@ async def api_admin_group_subject(group_name: str, subject_name: str, admin: dic
 async def api_admin_record_book(record_book: str, admin: dict = Depends(require_admin)):
     subjects = await get_record_book_subjects(record_book)
     group_name = await get_group_by_record_book(record_book)
-    rating = {}
-    for scope in ("cluster", "year", "all"):
-        pos = await get_rating_position(record_book, scope)
-        if pos:
-            rating[f"{scope}_pos"] = pos
+    rating = await get_rating_positions(record_book)
     return {"record_book": record_book, "group": group_name, "subjects": subjects, "rating": rating}
 
 
@@ -46,3 +46,40 @@ async def test_periodic_update_failure(mocker):
     args, kwargs = bot.send_message.call_args
     assert args[0] == 123456789
     assert "❌ *Ошибка авто-обновления*" in args[1]
+
+
+@pytest.mark.asyncio
+async def test_rating_update_scrapes_years_in_parallel(mocker):
+    import asyncio
+    from app.services import rating_updater
+
+    events = []
+
+    async def fake_scrape(year, **kwargs):
+        events.append(("start", year))
+        await asyncio.sleep(0.05 if year == 2021 else 0.01)
+        events.append(("scraped", year))
+        return {"total": 1, "success": 1, "not_found": 0, "error": 0}
+
+    async def fake_clustering(enrollment_year, full=False):
+        events.append(("clustered", enrollment_year))
+        return {"mode": "incremental", "records": 0, "updated": 0, "expelled": 0}
+
+    mocker.patch('app.core.config.PARSING_YEARS', [2021, 2022])
+    mocker.patch('app.core.repositories.rating.get_records_count_by_year', AsyncMock(return_value=0))
+    mocker.patch('app.core.repositories.rating.get_last_parsed_num', AsyncMock(return_value=0))
+    save_log = mocker.patch('app.core.repositories.job_log.save_job_log', AsyncMock())
+    mocker.patch('app.core.repositories.job_log.cleanup_old_job_logs', AsyncMock())
+    mocker.patch.object(rating_updater, 'scrape_all_records', fake_scrape)
+    mocker.patch.object(rating_updater, 'run_clustering', fake_clustering)
+    mocker.patch.object(rating_updater, 'map_clusters_to_groups', AsyncMock())
+    mocker.patch.object(rating_updater, 'calculate_subject_stats', AsyncMock())
+
+    await rating_updater.run_rating_update()
+
+    # Оба года стартуют сразу, 2022 кластеризуется, пока 2021 ещё парсится
+    assert events[:2] == [("start", 2021), ("start", 2022)]
+    assert events.index(("clustered", 2022)) < events.index(("scraped", 2021))
+    args = save_log.call_args.args
+    assert args[3] == "SUCCESS"
+    assert args[4]["total"] == 2 and "clustering_2021" in args[4]
@@ -0,0 +1,69 @@
+import json
+
+import pytest
+
+from app.services.clustering import cluster_students, cluster_students_naive
+from tools.bench_clustering import make_cohort
+
+
+def _record(book: str, subjects: list[str]) -> dict:
+    return {"record_book": book, "subjects_json": json.dumps([{"subject": s} for s in subjects])}
+
+
+def test_cluster_students_matches_naive_on_synthetic_cohort():
+    """Индексный движок даёт ровно то же жадное разбиение, что и O(n²) версия."""
+    records = make_cohort(1500, seed=7, subjects_pool=400)
+    assert cluster_students(records, base_year=2023) == cluster_students_naive(records, base_year=2023)
+
+
+def test_cluster_students_threshold_boundary():
+    """Пара с J ровно 0.8 попадает в кластер, с J < 0.8 — нет; пустые пропускаются."""
+    base = [f"S{i}" for i in range(5)]
+    records = [
+        _record("A", base),
+        _record("B", base[:4]),                 # J = 4/5
+        _record("C", base[:3] + ["X"]),        # J = 3/6
+        _record("D", []),
+    ]
+    clusters = cluster_students(records, base_year=2022)
+    assert clusters == cluster_students_naive(records, base_year=2022)
+    assert clusters["A"] == clusters["B"] == 2022001
+    assert clusters["C"] == 2022002
+    assert "D" not in clusters
+
+
+def test_similarity_strips_subgroups():
+    from app.services.cluster_mapper import _similarity
+
+    score = _similarity({"Математика", "Физика"}, {"Математика (1п/г)", "Химия"})
+    assert score == 0.5 + (1 / 3) * 0.1
+    assert _similarity(set(), {"Химия"}) == 0.0
+
+
+@pytest.mark.asyncio
+async def test_map_clusters_to_groups_picks_best_cluster_per_course(mocker):
+    """Группа привязывается к лучшему кластеру своего курса; при равенстве — к первому."""
+    from app.services import cluster_mapper
+
+    mocker.patch.object(cluster_mapper, "get_schedule_groups_subjects", return_value={
+        "ПИ-101": {"course": 1, "subjects": {"Математика (1п/г)", "Физика", "История"}},
+        "ЭК-401": {"course": 4, "subjects": {"Экономика", "Право"}},
+        "СОт-111": {"course": 1, "subjects": {"Черчение"}},
+    })
+    mocker.patch.object(cluster_mapper, "get_all_distinct_clusters", return_value=[2025001, 2025002, 2022001, 2022002])
+    cluster_subjects = {
+        2025001: {"Математика", "Физика"},
+        2025002: {"Математика", "Физика", "История", "Химия"},
+        2022001: {"Экономика", "Право"},
+        2022002: {"Экономика", "Право"},
+    }
+    mocker.patch.object(cluster_mapper, "get_cluster_subjects", side_effect=lambda cid: cluster_subjects[cid])
+    save = mocker.patch.object(cluster_mapper, "save_cluster_group")
+
+    await cluster_mapper.map_clusters_to_groups()
+
+    saved = {call.args[1]: (call.args[0], call.args[2]) for call in save.call_args_list}
+    assert saved == {
+        "ПИ-101": (2025002, round(1 + 0.75 * 0.1, 3)),
+        "ЭК-401": (2022001, 1.1),
+    }
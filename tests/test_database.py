@@ -355,3 +355,225 @@ async def test_expelled_students_workflow():
     assert stats["since_year_start"] >= 0
     assert stats["since_semester_start"] >= 0
 
+
+
+# === Read Pool Tests ===
+
+@pytest.mark.asyncio
+async def test_read_pool_serves_reads_after_initialize():
+    """После initialize_database чтения идут через read-only пул и видят закоммиченные записи."""
+    import aiosqlite
+
+    await database.initialize_database()
+    writer = await database.get_db_connection()
+    reader = await database.get_read_connection()
+    assert reader is not writer
+    assert reader in database._read_pool
+
+    await user.save_user_group_db(777, "ПИ-777")
+    assert await user.get_user_group_db(777) == "ПИ-777"
+
+    with pytest.raises(aiosqlite.OperationalError):
+        await reader.execute("DELETE FROM users")
+
+    # После закрытия пул пуст — чтение идёт через основное подключение
+    await database.close_db_connection()
+    assert await database.get_read_connection() is await database.get_db_connection()
+
+
+@pytest.mark.asyncio
+async def test_rating_write_buffer_batches_commits():
+    """Зачётки пишутся пачками, возобновление видит только закоммиченные записи."""
+    from app.services.rating_updater import RatingWriteBuffer, _make_record_handler
+
+    await database.initialize_database()
+    buffer = RatingWriteBuffer(max_records=3, max_seconds=3600)
+    on_result = _make_record_handler(buffer)
+    data = [{"subject": "Математика", "passed": True, "semester": "1 семестр 2023/2024"}]
+
+    for num in range(1, 8):
+        await on_result(f"2023{num:04d}", "SUCCESS", data)
+    await on_result("20230008", "NOT_FOUND", None)
+
+    assert buffer.commits == 2
+    assert len(buffer.pending) == 1
+    assert await rating.get_last_parsed_num(2023) == 6
+
+    await buffer.flush()
+    assert buffer.commits == 3
+    assert buffer.saved == 7
+    assert await rating.get_last_parsed_num(2023) == 7
+    assert await rating.get_records_count_by_year(2023) == 7
+
+
+@pytest.mark.asyncio
+async def test_incremental_clustering_touches_only_changed_records():
+    """Повторная кластеризация обрабатывает только зачётки с изменившимися предметами."""
+    from app.services.clustering import run_clustering
+
+    await database.initialize_database()
+
+    def subjects(*names):
+        return json.dumps([{"subject": n, "semester": "1 семестр 2025/2026"} for n in names], ensure_ascii=False)
+
+    plan_a = ["Математика", "Физика", "История", "Химия", "Право"]
+    plan_b = ["Экономика", "Маркетинг", "Менеджмент", "Статистика", "Финансы"]
+    await rating.save_rating_records([
+        ("20230001", 2023, subjects(*plan_a), 5, 5, 100.0, "2025/2026"),
+        ("20230002", 2023, subjects(*plan_a[:4]), 4, 4, 100.0, "2025/2026"),
+        ("20230003", 2023, subjects(*plan_b), 5, 5, 100.0, "2025/2026"),
+    ])
+
+    first = await run_clustering(2023)
+    assert first["mode"] == "full"
+    assert first["updated"] == 3
+    centroids = await rating.get_cluster_centroids(2023)
+    assert centroids == {2023001: set(plan_a), 2023002: set(plan_b)}
+    assert await rating.get_dirty_rating_records(2023) == []
+
+    # Без изменений предметов — перезапись той же зачётки не делает её «грязной»
+    await rating.save_rating_records([("20230001", 2023, subjects(*plan_a), 5, 5, 100.0, "2025/2026")])
+    assert (await run_clustering(2023))["records"] == 0
+
+    # Студент сменил план, плюс новый студент с незнакомым набором предметов
+    await rating.save_rating_records([
+        ("20230002", 2023, subjects(*plan_b), 5, 5, 100.0, "2025/2026"),
+        ("20230004", 2023, subjects("Черчение", "Геодезия"), 2, 2, 100.0, "2025/2026"),
+    ])
+    second = await run_clustering(2023)
+    assert second == {"mode": "incremental", "records": 2, "updated": 2, "expelled": 0}
+    assert (await rating.get_student_cluster_info("20230002"))["cluster_id"] == 2023002
+    assert (await rating.get_student_cluster_info("20230004"))["cluster_id"] == 2023003
+    assert (await rating.get_student_cluster_info("20230001"))["cluster_id"] == 2023001
+    assert 2023003 in await rating.get_cluster_centroids(2023)
+
+
+@pytest.mark.asyncio
+async def test_rating_subjects_follow_subjects_json():
+    """rating_subjects синхронизируется при записи, отчислении и дозаполнении."""
+    await database.initialize_database()
+    db = await database.get_db_connection()
+    items = [
+        {"subject": "Математика", "semester": "1 семестр", "grade": "Отлично", "grade_value": 5, "passed": True},
+        {"subject": "Физика", "semester": "1 семестр", "grade": "Неуд", "passed": False},
+        {"subject": "Физика", "semester": "2 семестр", "grade": "Хорошо", "passed": True},
+    ]
+    await rating.save_rating_records([
+        ("20240001", 2024, json.dumps(items, ensure_ascii=False), 3, 2, 66.7, "2024/2025"),
+        ("20240002", 2024, json.dumps(items[:1], ensure_ascii=False), 1, 1, 100.0, "2024/2025"),
+    ])
+    await rating.update_rating_clusters([("20240001", 2024001), ("20240002", 2024001)])
+
+    assert await rating.get_cluster_subjects(2024001) in ({"Математика", "Физика"}, {"Математика"})
+    statuses = await subject.get_subject_status_in_cluster(2024001, "Физика")
+    assert statuses == [
+        {"record_book": "20240001", "status": "❌ Не сдано", "mark": "Неуд"},
+        {"record_book": "20240002", "status": "Нет в профиле", "mark": "-"},
+    ]
+
+    # Изменение предметов переписывает строки зачётки
+    await rating.save_rating_records([("20240002", 2024, json.dumps(items[1:2], ensure_ascii=False), 1, 0, 0.0, "2024/2025")])
+    statuses = await subject.get_subject_status_in_cluster(2024001, "Физика")
+    assert statuses[1] == {"record_book": "20240002", "status": "❌ Не сдано", "mark": "Неуд"}
+
+    # Отчисление удаляет строки, дозаполнение подхватывает записи, вставленные в обход репозитория
+    await rating.save_expelled_students([("20240002", 2024, 2024001)])
+    await db.execute(
+        "INSERT INTO rating_data (record_book, enrollment_year, subjects_json) VALUES (?, ?, ?)",
+        ("20240003", 2024, json.dumps(items[:1], ensure_ascii=False)),
+    )
+    await db.commit()
+    await rating.sync_rating_subjects()
+    async with db.execute("SELECT record_book, COUNT(*) FROM rating_subjects GROUP BY record_book ORDER BY 1") as cursor:
+        assert [tuple(row) for row in await cursor.fetchall()] == [("20240001", 3), ("20240003", 1)]
+
+
+@pytest.mark.asyncio
+async def test_subject_stats_aggregated_in_sql():
+    """Статистика по записям и по людям; имена без пробелов по краям, отчисленные не учитываются."""
+    from app.services.subject_stats import calculate_subject_stats
+
+    await database.initialize_database()
+    items = [
+        {"subject": "Физика", "semester": "1 семестр", "grade": "Неуд", "passed": False},
+        {"subject": " Физика ", "semester": "2 семестр", "grade": "Хорошо", "passed": True},
+        {"subject": "Химия", "semester": "1 семестр", "grade": "Неуд", "passed": False},
+    ]
+    await rating.save_rating_records([
+        ("20240001", 2024, json.dumps(items, ensure_ascii=False), 3, 1, 33.3, "2024/2025"),
+        ("20240002", 2024, json.dumps(items[:1], ensure_ascii=False), 1, 0, 0.0, "2024/2025"),
+        ("20240003", 2024, json.dumps(items[1:], ensure_ascii=False), 2, 1, 50.0, "2024/2025"),
+    ])
+    await rating.update_rating_clusters([("20240001", 2024001), ("20240002", 2024001)])
+    await rating.save_expelled_students([("20240003", 2024, 2024002)])
+
+    await calculate_subject_stats()
+
+    db = await database.get_db_connection()
+    async with db.execute(
+        "SELECT subject, total_students, passed_students, pass_rate, total_persons, passed_persons, person_pass_rate "
+        "FROM subject_global_stats ORDER BY subject"
+    ) as cursor:
+        assert [tuple(row) for row in await cursor.fetchall()] == [
+            ("Физика", 3, 1, 33.3, 2, 1, 50.0),
+            ("Химия", 1, 0, 0.0, 1, 0, 0.0),
+        ]
+    async with db.execute(
+        "SELECT cluster_id, subject, total_students, total_persons, passed_persons FROM cluster_subject_stats ORDER BY subject"
+    ) as cursor:
+        assert [tuple(row) for row in await cursor.fetchall()] == [
+            (2024001, "Физика", 3, 2, 1),
+            (2024001, "Химия", 1, 1, 0),
+        ]
+
+
+@pytest.mark.asyncio
+async def test_rating_ranks_and_bulk_subject_stats():
+    """Места в рейтинге (с rating_ranks и без), топ и пакетная статистика предметов."""
+    await database.initialize_database()
+    db = await database.get_db_connection()
+    await db.executemany(
+        "INSERT INTO rating_data (record_book, enrollment_year, pass_rate, cluster_id, is_expelled) VALUES (?, ?, ?, ?, ?)",
+        [
+            ("20230001", 2023, 90.0, 2023001, 0),
+            ("20230002", 2023, 95.0, 2023001, 0),
+            ("20230003", 2023, 99.0, 2023002, 0),
+            ("20230004", 2023, 100.0, 2023001, 1),
+            ("20240001", 2024, 97.0, None, 0),
+            ("20240002", 2024, 80.0, 2024001, 0),
+        ],
+    )
+    await db.executemany(
+        "INSERT INTO subject_global_stats (subject, total_students, passed_students, pass_rate, "
+        "total_persons, passed_persons, person_pass_rate) VALUES (?, ?, ?, ?, ?, ?, ?)",
+        [("Физика", 10, 8, 80.0, 5, 4, 80.0), ("Химия", 4, 1, 25.0, 4, 1, 25.0)],
+    )
+    await db.commit()
+
+    expected = {
+        "20230001": {"cluster_pos": (2, 2), "year_pos": (3, 3), "all_pos": (4, 5)},
+        "20230003": {"cluster_pos": (1, 1), "year_pos": (1, 3), "all_pos": (1, 5)},
+        # Без кластера позиция "cluster" — по всем
+        "20240001": {"cluster_pos": (2, 5), "year_pos": (1, 2), "all_pos": (2, 5)},
+        "20240002": {"cluster_pos": (1, 1), "year_pos": (2, 2), "all_pos": (5, 5)},
+    }
+    # Сначала rating_ranks пуст (запасной подсчёт по rating_data), затем — материализованный рейтинг
+    for rebuild in (False, True):
+        if rebuild:
+            assert await rating.rebuild_rating_ranks() == 5
+        for book, positions in expected.items():
+            assert await rating.get_rating_positions(book) == positions, (book, rebuild)
+            assert await rating.get_rating_position(book, "year") == positions["year_pos"]
+        assert await rating.get_rating_positions("20230004") == {}
+        assert await rating.get_rating_positions("nope") == {}
+        top = await rating.get_top_students(scope="year", scope_value=2023, limit=2)
+        assert [s["record_book"] for s in top] == ["20230003", "20230002"]
+        top = await rating.get_top_students(scope="cluster", scope_value=2023001)
+        assert [s["record_book"] for s in top] == ["20230002", "20230001"]
+        assert [s["record_book"] for s in await rating.get_top_students(limit=3)] == ["20230003", "20240001", "20230002"]
+
+    bulk = await subject.get_global_subject_stats_bulk(["Физика", "Химия", "Физика", "Астрономия"])
+    assert bulk == {
+        "Физика": await subject.get_global_subject_stats("Физика"),
+        "Химия": await subject.get_global_subject_stats("Химия"),
+    }
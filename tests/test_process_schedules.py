@@ -5,7 +5,8 @@ import os
 
 sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
 
-from app.services.schedule_sync import ScheduleProcessor, MONTHS_MAP
+from app.services.schedule_sync import ScheduleProcessor
+from app.services.schedule_cells import MONTHS_MAP
 
 processor = ScheduleProcessor()
 determine_week_type = processor.determine_week_type
@@ -124,3 +125,305 @@ def test_months_map():
 def test_months_map_parametrized(month_name, expected_num):
     """Параметризованный тест словаря месяцев."""
     assert MONTHS_MAP[month_name] == expected_num
+
+
+# === Diff-apply ===
+
+def _make_schedule_db(db_path, rows):
+    import sqlite3
+    conn = sqlite3.connect(db_path)
+    conn.execute("""
+        CREATE TABLE schedule (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            faculty TEXT, course TEXT, group_name TEXT, week_type TEXT,
+            lesson_date TEXT, time TEXT, subject TEXT, teacher TEXT, location TEXT
+        )
+    """)
+    conn.executemany("""
+        INSERT INTO schedule (group_name, lesson_date, time, subject, teacher, location, week_type, faculty, course)
+        VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+    """, rows)
+    conn.commit()
+    conn.close()
+
+
+def test_run_diff_applies_only_changes(tmp_path, mocker):
+    """Diff-режим трогает только изменившиеся строки и не пересоздаёт остальные."""
+    import sqlite3
+
+    kept = ("ГР-1", "2025-09-01", "08:30", "Математика", "Иванов И.И.", "101", "нечетная", "ФЭУ", "1")
+    changed = ("ГР-1", "2025-09-01", "10:15", "Физика", "Петров П.П.", "202", "нечетная", "ФЭУ", "1")
+    removed = ("ГР-2", "2025-09-02", "08:30", "Химия", "Сидоров С.С.", "303", "четная", "ФЭУ", "1")
+    added = ("ГР-2", "2025-09-03", "12:00", "История", "Не указан", "Не указана", "четная", "ФЭУ", "1")
+
+    db_path = str(tmp_path / "schedule.db")
+    _make_schedule_db(db_path, [kept, changed, removed])
+    conn = sqlite3.connect(db_path)
+    kept_id = conn.execute("SELECT id FROM schedule WHERE subject = 'Математика'").fetchone()[0]
+    conn.close()
+
+    proc = ScheduleProcessor(mode="diff")
+    proc.db_path = db_path
+    proc.schedules_dir = str(tmp_path)
+    changed_new = changed[:6] + ("четная", "ФЭУ", "2")
+    mocker.patch.object(proc, "collect_lessons", return_value=[kept, changed_new, added])
+
+    assert proc.run() is True
+    assert proc.stats["inserted"] == 1
+    assert proc.stats["removed"] == 1
+    assert proc.stats["changed"] == 1
+    assert proc.stats["unchanged"] == 1
+
+    conn = sqlite3.connect(db_path)
+    rows = conn.execute(
+        "SELECT id, group_name, lesson_date, time, subject, teacher, location, week_type, faculty, course FROM schedule"
+    ).fetchall()
+    conn.close()
+    by_subject = {row[4]: row for row in rows}
+    assert set(by_subject) == {"Математика", "Физика", "История"}
+    assert by_subject["Математика"][0] == kept_id
+    assert by_subject["Физика"][7:] == ("четная", "ФЭУ", "2")
+
+
+def test_run_full_mode_replaces_table(tmp_path, mocker):
+    """Full-режим сохраняет прежнее поведение: DELETE + полная вставка."""
+    import sqlite3
+
+    old = ("ГР-1", "2025-09-01", "08:30", "Математика", "Иванов И.И.", "101", "нечетная", "ФЭУ", "1")
+    new = ("ГР-1", "2025-09-01", "10:15", "Физика", "Петров П.П.", "202", "нечетная", "ФЭУ", "1")
+    db_path = str(tmp_path / "schedule.db")
+    _make_schedule_db(db_path, [old])
+
+    proc = ScheduleProcessor(mode="full")
+    proc.db_path = db_path
+    proc.schedules_dir = str(tmp_path)
+    mocker.patch.object(proc, "collect_lessons", return_value=[new])
+
+    assert proc.run() is True
+    assert proc.stats["inserted"] == 1
+    assert proc.stats["removed"] == 1
+
+    conn = sqlite3.connect(db_path)
+    subjects = [r[0] for r in conn.execute("SELECT subject FROM schedule")]
+    conn.close()
+    assert subjects == ["Физика"]
+
+
+# === Кэш разбора и манифест ===
+
+def test_collect_lessons_uses_parse_cache(tmp_path, mocker):
+    """Неизменившийся файл не разбирается повторно."""
+    schedules = tmp_path / "schedules"
+    (schedules / "ФЭУ").mkdir(parents=True)
+    (schedules / "ФЭУ" / "Нечетная неделя_1 курс.xls").write_bytes(b"content-v1")
+
+    proc = ScheduleProcessor()
+    proc.schedules_dir = str(schedules)
+    proc.parse_cache_dir = str(tmp_path / "cache")
+    lesson = ("ГР-1", "2025-09-01", "08:30", "Математика", "Иванов И.И.", "101", "нечетная", "ФЭУ", "1")
+    parse = mocker.patch.object(proc, "process_single_file", return_value=[lesson])
+
+    assert proc.collect_lessons() == [lesson]
+    assert proc.collect_lessons() == [lesson]
+    assert parse.call_count == 1
+    assert proc.parse_cache_hits == 1
+
+    (schedules / "ФЭУ" / "Нечетная неделя_1 курс.xls").write_bytes(b"content-v2")
+    proc.collect_lessons()
+    assert parse.call_count == 2
+    assert len(list((tmp_path / "cache").iterdir())) == 1
+
+
+def test_cell_parser_memoises_repeated_cells():
+    """Повторная ячейка берётся из LRU, старые записи вытесняются по лимиту."""
+    from app.services.schedule_cells import LessonCellParser
+
+    parser = LessonCellParser(maxsize=2)
+    cell = "Химия 1 п/г\nдоцент Петров П.П.\nАуд. 101"
+    first = parser.parse_lesson(cell)
+    assert parser.parse_lesson(cell) is first
+    assert first == {"subject": "Химия 1 п/г (1п/г)", "teacher": "доцент Петров П.П.", "location": "Ауд. 101"}
+    assert parser.counters() == {"cell_cache_hits": 1, "cell_cache_misses": 1, "cell_cache_hit_rate": 0.5}
+
+    parser.parse_lesson("Физика")
+    parser.parse_lesson("История")
+    parser.parse_lesson(cell)
+    assert parser.misses == 4
+    assert len(parser._lessons) == 2
+
+
+def test_fast_reader_matches_legacy(tmp_path):
+    """Быстрое чтение книги даёт те же занятия, что и построчный str() по ячейкам."""
+    openpyxl = pytest.importorskip("openpyxl")
+
+    wb = openpyxl.Workbook()
+    ws = wb.active
+    ws.append(["Расписание"])
+    ws.append(["День", "Часы", " ГР-1 ", "ГР-2", None, "ГР-3"])
+    ws.append(["1 сентября", "08:30-10:00", "Математика\nИванов И.И.\nАуд. 101", None, None, "Физика"])
+    ws.append([None, "10:15-11:45", None, "История\nПетров П.П.\nБ-204"])
+    ws.append([None, None, "Химия 1 п/г\nСидорова А.В."])
+    ws.append(["2 сентября"])
+    ws.append([None, "08:30-10:00", 42, None, None, "Экономика\nНе указан\nСпортзал"])
+    path = tmp_path / "Нечетная неделя_1 курс.xlsx"
+    wb.save(path)
+
+    proc = ScheduleProcessor()
+    proc.fast_reader = False
+    legacy = proc.process_single_file(str(path), "ФЭУ", "1")
+    proc.fast_reader = True
+    fast = proc.process_single_file(str(path), "ФЭУ", "1")
+
+    assert legacy
+    assert fast == legacy
+
+
+@pytest.mark.asyncio
+async def test_download_file_sends_conditional_get(tmp_path, mocker):
+    """Повторное скачивание использует ETag из манифеста и не трогает файл при 304."""
+    from app.services.schedule_sync import ScheduleFetcher, ScheduleManifest
+
+    fetcher = ScheduleFetcher()
+    fetcher.download_dir = str(tmp_path)
+    fetcher.manifest = ScheduleManifest(str(tmp_path / "manifest.json"))
+    save_path = str(tmp_path / "ФЭУ" / "week_file.xls")
+
+    def make_response(status, body=b"", headers=None):
+        async def iter_chunked(size):
+            for i in range(0, len(body), 4):
+                yield body[i:i + 4]
+
+        resp = mocker.MagicMock()
+        resp.status = status
+        resp.headers = headers or {}
+        resp.content.iter_chunked = iter_chunked
+        ctx = mocker.MagicMock()
+        ctx.__aenter__ = mocker.AsyncMock(return_value=resp)
+        ctx.__aexit__ = mocker.AsyncMock(return_value=False)
+        return ctx
+
+    session = mocker.MagicMock()
+    session.get.return_value = make_response(200, b"xls-bytes", {"ETag": '"abc"'})
+    fetcher._session = session
+
+    assert await fetcher._download_file("http://bb/file.xls", save_path) is True
+    assert fetcher.changed_files == 1
+    assert fetcher.manifest.get("http://bb/file.xls")["etag"] == '"abc"'
+
+    session.get.return_value = make_response(304)
+    assert await fetcher._download_file("http://bb/file.xls", save_path) is True
+    assert session.get.call_args.kwargs["headers"]["If-None-Match"] == '"abc"'
+    assert fetcher.changed_files == 1
+    with open(save_path, "rb") as f:
+        assert f.read() == b"xls-bytes"
+
+
+@pytest.mark.asyncio
+async def test_get_page_retries_on_network_error(mocker):
+    """Листинг повторяется после сетевой ошибки."""
+    import aiohttp
+    from app.services.schedule_sync import ScheduleFetcher
+
+    fetcher = ScheduleFetcher()
+    fetcher.backoff_base = 0
+    fetch = mocker.patch.object(
+        fetcher, "_fetch_text",
+        side_effect=[aiohttp.ClientConnectionError("reset"), "<html><a href='x'>ok</a></html>"],
+    )
+
+    soup = await fetcher._get_page("http://bb/listing")
+    assert soup.find("a").get_text() == "ok"
+    assert fetch.call_count == 2
+
+
+@pytest.mark.asyncio
+async def test_sync_pipeline_stages_files_as_they_arrive(tmp_path, mocker):
+    """Файлы разбираются по мере скачивания и копятся в staging-таблице до apply_staged."""
+    import sqlite3
+    from app.services.schedule_sync import ScheduleFetcher, run_sync_pipeline
+
+    schedules = tmp_path / "schedules"
+    db_path = str(tmp_path / "schedule.db")
+    _make_schedule_db(db_path, [])
+
+    proc = ScheduleProcessor(mode="diff")
+    proc.db_path = db_path
+    proc.schedules_dir = str(schedules)
+    proc.parse_cache_dir = str(tmp_path / "cache")
+    proc.parse_workers = 1
+    lessons_by_file = {
+        "a.xls": [("ГР-1", "2025-09-01", "08:30", "Математика", "Иванов И.И.", "101", "нечетная", "ФЭУ", "1")],
+        "b.xls": [("ГР-2", "2025-09-01", "10:15", "Физика", "Петров П.П.", "202", "нечетная", "ФЭУ", "1")],
+    }
+    mocker.patch.object(
+        proc, "process_single_file",
+        side_effect=lambda path, faculty, course: lessons_by_file[os.path.basename(path)],
+    )
+
+    fetcher = ScheduleFetcher()
+
+    async def fake_run(on_file=None):
+        paths = []
+        for name in lessons_by_file:
+            path = schedules / "ФЭУ" / name
+            path.parent.mkdir(parents=True, exist_ok=True)
+            path.write_bytes(name.encode())
+            await on_file(str(path))
+            paths.append(str(path))
+        return paths
+
+    mocker.patch.object(fetcher, "run", side_effect=fake_run)
+
+    files = await run_sync_pipeline(fetcher, proc)
+    assert len(files) == 2
+
+    conn = sqlite3.connect(db_path)
+    staged = conn.execute("SELECT COUNT(*) FROM schedule_staging").fetchone()[0]
+    conn.close()
+    assert staged == 2
+
+    assert proc.apply_staged() is True
+    assert proc.stats["inserted"] == 2
+    conn = sqlite3.connect(db_path)
+    subjects = sorted(r[0] for r in conn.execute("SELECT subject FROM schedule"))
+    conn.close()
+    assert subjects == ["Математика", "Физика"]
+
+
+def test_run_swap_mode_publishes_and_rolls_back(tmp_path, mocker):
+    """Swap-режим подменяет таблицу целиком, оставляя прошлое поколение для отката."""
+    import sqlite3
+
+    old = ("ГР-1", "2025-09-01", "08:30", "Математика", "Иванов И.И.", "101", "нечетная", "ФЭУ", "1")
+    new = ("ГР-1", "2025-09-01", "10:15", "Физика", "Петров П.П.", "202", "нечетная", "ФЭУ", "1")
+    db_path = str(tmp_path / "schedule.db")
+    _make_schedule_db(db_path, [old])
+    conn = sqlite3.connect(db_path)
+    conn.execute("CREATE INDEX idx_group_date ON schedule (group_name, lesson_date)")
+    conn.commit()
+    conn.close()
+
+    proc = ScheduleProcessor(mode="swap")
+    proc.db_path = db_path
+    proc.schedules_dir = str(tmp_path)
+
+    for lessons in ([new], [old, new]):
+        mocker.patch.object(proc, "collect_lessons", return_value=lessons)
+        assert proc.run() is True
+    assert proc.stats["inserted"] == 1
+    assert proc.stats["removed"] == 0
+
+    conn = sqlite3.connect(db_path)
+    live = sorted(r[0] for r in conn.execute("SELECT subject FROM schedule"))
+    previous = sorted(r[0] for r in conn.execute("SELECT subject FROM schedule_previous"))
+    indexes = {r[0] for r in conn.execute("SELECT name FROM sqlite_master WHERE type = 'index' AND tbl_name = 'schedule'")}
+    conn.close()
+    assert live == ["Математика", "Физика"]
+    assert previous == ["Физика"]
+    assert len(indexes) == 3
+
+    assert proc.rollback_to_previous() is True
+    conn = sqlite3.connect(db_path)
+    live = sorted(r[0] for r in conn.execute("SELECT subject FROM schedule"))
+    conn.close()
+    assert live == ["Физика"]
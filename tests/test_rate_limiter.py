@@ -0,0 +1,81 @@
+import asyncio
+import time
+
+import pytest
+
+from app.services.rate_limiter import AdaptiveLimiter
+
+
+async def _run(limiter, count, duration=0.01, fail=False, interactive=False, log=None, name=None):
+    async def request(i):
+        async with limiter.slot(interactive) as slot:
+            if log is not None:
+                log.append(name or i)
+            await asyncio.sleep(duration)
+            if fail:
+                slot.fail()
+    await asyncio.gather(*(request(i) for i in range(count)))
+
+
+@pytest.mark.asyncio
+async def test_token_bucket_paces_requests():
+    limiter = AdaptiveLimiter(max_rate=20, max_limit=4, target_latency=0, rate=20, limit=4)
+    started = time.monotonic()
+    await _run(limiter, 6, duration=0)
+    # Один токен в запасе, остальные пять — по 1/20 с
+    assert time.monotonic() - started >= 5 / 20 * 0.9
+    assert limiter.successes == 6
+
+
+@pytest.mark.asyncio
+async def test_window_limits_in_flight():
+    limiter = AdaptiveLimiter(max_rate=1000, max_limit=2, target_latency=0, rate=1000, limit=2)
+    peak = 0
+
+    async def request():
+        nonlocal peak
+        async with limiter.slot():
+            peak = max(peak, limiter.in_flight)
+            await asyncio.sleep(0.01)
+
+    await asyncio.gather(*(request() for _ in range(8)))
+    assert peak == 2
+    assert limiter.in_flight == 0
+
+
+@pytest.mark.asyncio
+async def test_fast_answers_increase_and_failures_halve():
+    limiter = AdaptiveLimiter(max_rate=100, max_limit=8, target_latency=1.0, rate=10, limit=1, cooldown=10)
+    await _run(limiter, 20, duration=0)
+    assert limiter.limit > 4 and limiter.rate > 10
+    limit, rate = limiter.limit, limiter.rate
+
+    # Пачка ошибок в пределах cooldown — одно уменьшение
+    await _run(limiter, 3, duration=0, fail=True)
+    assert limiter.decreases == 1
+    assert limiter.limit == pytest.approx(limit * 0.5)
+    assert limiter.rate == pytest.approx(rate * 0.5)
+
+    with pytest.raises(asyncio.TimeoutError):
+        async with limiter.slot():
+            raise asyncio.TimeoutError
+    assert limiter.failures == 4
+
+
+@pytest.mark.asyncio
+async def test_slow_answers_do_not_increase():
+    limiter = AdaptiveLimiter(max_rate=100, max_limit=8, target_latency=0.001, rate=50, limit=2)
+    await _run(limiter, 4, duration=0.01)
+    assert limiter.limit == 2 and limiter.rate == 50
+
+
+@pytest.mark.asyncio
+async def test_interactive_requests_go_first():
+    limiter = AdaptiveLimiter(max_rate=1000, max_limit=1, target_latency=0, rate=1000, limit=1)
+    log = []
+    background = asyncio.create_task(_run(limiter, 4, duration=0.01, log=log, name="bg"))
+    await asyncio.sleep(0)
+    await _run(limiter, 1, duration=0.01, interactive=True, log=log, name="live")
+    await background
+    # Первый фоновый уже выполнялся, живой запрос — следующим
+    assert log[:2] == ["bg", "live"]
@@ -285,3 +285,26 @@ async def test_get_teachers_fallback_to_teacher_stats(teacher_db, monkeypatch):
 
     await conn.close()
     monkeypatch.setattr(db_mod, "_global_db_conn", None)
+
+
+@pytest.mark.asyncio
+async def test_get_teachers_for_subjects_matches_single_lookups(teacher_db, monkeypatch):
+    """Пакетный поиск даёт то же, что get_teachers_for_subject по каждому предмету."""
+    import app.core.database as db_mod
+
+    conn = await aiosqlite.connect(teacher_db)
+    conn.row_factory = aiosqlite.Row
+    monkeypatch.setattr(db_mod, "_global_db_conn", conn)
+
+    from app.core.repositories.schedule import get_teachers_for_subject, get_teachers_for_subjects
+
+    subjects = ["Физика", "Физика (1п/г)", "Математика", "Философия", "История транспорта", "Астрономия"]
+    bulk = await get_teachers_for_subjects("СОт-115", subjects)
+    for subject in subjects:
+        single = await get_teachers_for_subject("СОт-115", subject)
+        assert sorted(bulk.get(subject, [])) == sorted(single), subject
+    assert "Астрономия" not in bulk
+    assert await get_teachers_for_subjects("АБВГ-999", subjects) == {}
+
+    await conn.close()
+    monkeypatch.setattr(db_mod, "_global_db_conn", None)
@@ -184,3 +184,122 @@ async def test_get_session_results_with_cache(mocker, sample_session_results):
 # Note: Интеграционные тесты с моками Playwright (expired cache, no cache) удалены,
 # так как требуют слишком сложной настройки async моков и являются хрупкими.
 # Логика кэширования и TTL покрыта юнит-тестами выше.
+
+
+class _FakeResponse:
+    def __init__(self, status, text):
+        self.status = status
+        self._text = text
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc):
+        return False
+
+    async def text(self):
+        return self._text
+
+
+class _FakeReportSession:
+    """Отвечает как report.usurt.ru; post_replies — очередь (статус, html) для POST."""
+
+    FORM = '<input name="__VIEWSTATE" value="vs{n}"><input name="__EVENTVALIDATION" value="ev">'
+    REPORT = "<table><tr><td>2023/2024</td></tr><tr><td>Дисциплина</td></tr><tr><td>Математика</td><td>Отлично</td></tr></table>"
+
+    def __init__(self, post_replies=()):
+        self.gets = 0
+        self.posts = []
+        self.post_replies = list(post_replies)
+
+    def get(self, url):
+        self.gets += 1
+        return _FakeResponse(200, self.FORM.format(n=self.gets))
+
+    def post(self, url, data):
+        self.posts.append(data)
+        status, html = self.post_replies.pop(0) if self.post_replies else (200, self.REPORT)
+        return _FakeResponse(status, html)
+
+
+@pytest.mark.asyncio
+async def test_scrape_record_book_reuses_form_state():
+    from app.services.rate_limiter import AdaptiveLimiter
+    from app.services.rating_scraper import AspFormState, scrape_record_book
+
+    limiter = AdaptiveLimiter(max_rate=1000, max_limit=4, target_latency=1, rate=1000, limit=4)
+    session = _FakeReportSession(post_replies=[
+        (200, _FakeReportSession.REPORT),
+        (200, _FakeReportSession.REPORT),
+        (200, "ASP.NET session has expired"),
+        (200, _FakeReportSession.REPORT),
+        (500, ""),
+        (200, _FakeReportSession.REPORT),
+    ])
+    state = AspFormState()
+
+    for book in ("20230001", "20230002"):
+        status, data = await scrape_record_book(session, book, limiter=limiter, form_state=state)
+        assert status == "SUCCESS" and data[0]["subject"] == "Математика"
+    # Одна страница формы на две зачётки
+    assert session.gets == 1 and len(session.posts) == 2
+    assert session.posts[1]["__VIEWSTATE"] == "vs1"
+    assert session.posts[1]["ReportViewer1$ctl00$ctl03$ctl00"] == "20230002"
+
+    # Истекшая сессия и ошибка POST сбрасывают поля — следующий запрос берёт свежую форму
+    assert (await scrape_record_book(session, "20230003", limiter=limiter, form_state=state))[0] == "SUCCESS"
+    assert session.gets == 2 and session.posts[-1]["__VIEWSTATE"] == "vs2"
+    assert (await scrape_record_book(session, "20230004", limiter=limiter, form_state=state))[0] == "SUCCESS"
+    assert session.gets == 3 and session.posts[-1]["__VIEWSTATE"] == "vs3"
+    assert state.refreshes == 3 and state.reuses == 3
+
+
+@pytest.mark.asyncio
+async def test_http_sessions_share_keepalive_pool():
+    from app.core.http_client import close_http_clients, create_http_session, get_http_connector
+
+    first = create_http_session()
+    second = create_http_session()
+    try:
+        assert first.connector is second.connector is get_http_connector()
+        assert first.cookie_jar is not second.cookie_jar
+        assert not first.connector.force_close
+    finally:
+        await first.close()
+        await second.close()
+
+    # Закрытие сессии не закрывает общий пул, close_http_clients — закрывает
+    connector = get_http_connector()
+    assert not connector.closed
+    await close_http_clients()
+    assert connector.closed
+    assert get_http_connector() is not connector
+    await close_http_clients()
+
+
+@pytest.mark.asyncio
+async def test_http_connector_from_other_loop_is_closed():
+    import asyncio
+    import threading
+    from app.core import http_client
+
+    other_loop = asyncio.new_event_loop()
+    thread = threading.Thread(target=other_loop.run_forever, daemon=True)
+    thread.start()
+    try:
+        async def make_connector():
+            return http_client.get_http_connector()
+
+        stale = asyncio.run_coroutine_threadsafe(make_connector(), other_loop).result(5)
+        current = http_client.get_http_connector()
+        assert current is not stale
+        for _ in range(50):
+            if stale.closed:
+                break
+            await asyncio.sleep(0.01)
+        assert stale.closed
+    finally:
+        await http_client.close_http_clients()
+        other_loop.call_soon_threadsafe(other_loop.stop)
+        thread.join(5)
+        other_loop.close()
@@ -0,0 +1,61 @@
+"""
+Бенчмарк кластеризации студентов: индексный движок против исходного O(n²) алгоритма.
+
+Синтетические потоки: учебные планы по 30–50 предметов из общего пула,
+у каждого студента часть предметов выпадает, часть добавляется (перезачёты, выборные).
+Для потоков не больше --naive-max дополнительно запускается эталон и сверяется результат.
+
+    python -m tools.bench_clustering --sizes 2000 10000 50000 --naive-max 10000
+"""
+import argparse
+import json
+import os
+import random
+import sys
+import time
+
+sys.path.append(os.getcwd())
+
+from app.services.clustering import cluster_students, cluster_students_naive
+
+
+def make_cohort(size: int, seed: int = 0, subjects_pool: int = 3000) -> list[dict]:
+    rnd = random.Random(seed)
+    plans = [
+        rnd.sample(range(subjects_pool), rnd.randint(30, 50))
+        for _ in range(max(1, size // 40))
+    ]
+    records = []
+    for n in range(size):
+        plan = plans[rnd.randrange(len(plans))]
+        subjects = [s for s in plan if rnd.random() > 0.08]
+        subjects += rnd.sample(range(subjects_pool), rnd.randint(0, 3))
+        records.append({
+            "record_book": f"2024{n:05d}",
+            "subjects_json": json.dumps([{"subject": f"Предмет {s}"} for s in subjects], ensure_ascii=False),
+        })
+    return records
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", type=int, nargs="+", default=[2000, 10000, 50000])
+    parser.add_argument("--naive-max", type=int, default=10000)
+    args = parser.parse_args()
+
+    for size in args.sizes:
+        records = make_cohort(size, seed=size)
+        started = time.perf_counter()
+        fast = cluster_students(records, base_year=2024)
+        fast_elapsed = time.perf_counter() - started
+        line = f"n={size:<6} index {fast_elapsed:8.2f}s  кластеров={len(set(fast.values())):<6}"
+        if size <= args.naive_max:
+            started = time.perf_counter()
+            naive = cluster_students_naive(records, base_year=2024)
+            naive_elapsed = time.perf_counter() - started
+            line += f" naive {naive_elapsed:8.2f}s  x{naive_elapsed / fast_elapsed:.1f}  совпадает={fast == naive}"
+        print(line)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,89 @@
+"""
+Нагрузочный замер задержек чтения расписания во время записи рейтинга.
+
+Писатель (как rating_updater) делает поток мелких upsert + commit в rating_data,
+параллельно N читателей запрашивают расписание группы (как /api/schedule).
+Сравниваются пул чтения выключен (0) и включён (DB_READ_POOL_SIZE).
+
+    python -m tools.bench_db_reads --readers 16 --requests 200 --pool 0 4
+"""
+import argparse
+import asyncio
+import os
+import statistics
+import sys
+import tempfile
+import time
+
+sys.path.append(os.getcwd())
+
+from app.core import database
+from app.core.repositories.rating import save_rating_record
+from app.core.repositories.schedule import get_schedule_by_group
+
+
+async def seed(groups: int, lessons_per_group: int):
+    db = await database.get_db_connection()
+    rows = [
+        ("ФЭУ", "1", f"ГР-{g}", "нечетная", f"2025-09-{d % 28 + 1:02d}", "08:30", "Математика", "Иванов И.И.", "101")
+        for g in range(groups) for d in range(lessons_per_group)
+    ]
+    await db.executemany(
+        "INSERT INTO schedule (faculty, course, group_name, week_type, lesson_date, time, subject, teacher, location)"
+        " VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+        rows,
+    )
+    await db.commit()
+
+
+async def run_once(pool_size: int, readers: int, requests: int, groups: int) -> list[float]:
+    await database.open_read_pool(pool_size)
+    stop = asyncio.Event()
+
+    async def writer():
+        n = 0
+        while not stop.is_set():
+            await save_rating_record(f"{n:08d}", 2024, "[]" * 200, 10, 9, 0.9, "2024/2025")
+            n += 1
+
+    latencies: list[float] = []
+
+    async def reader(idx: int):
+        for i in range(requests):
+            started = time.perf_counter()
+            await get_schedule_by_group(f"ГР-{(idx + i) % groups}", "2025-09-05")
+            latencies.append((time.perf_counter() - started) * 1000)
+
+    writer_task = asyncio.create_task(writer())
+    await asyncio.gather(*(reader(i) for i in range(readers)))
+    stop.set()
+    await writer_task
+    return latencies
+
+
+async def main_async(args):
+    with tempfile.TemporaryDirectory() as root:
+        database.DB_PATH = os.path.join(root, "bench.db")
+        await database.initialize_database()
+        await seed(args.groups, 60)
+        for pool_size in args.pool:
+            latencies = sorted(await run_once(pool_size, args.readers, args.requests, args.groups))
+            p99 = latencies[int(len(latencies) * 0.99) - 1]
+            print(
+                f"pool={pool_size:<3} p50={statistics.median(latencies):7.2f} мс  "
+                f"p99={p99:7.2f} мс  запросов={len(latencies)}"
+            )
+        await database.close_db_connection()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--readers", type=int, default=16)
+    parser.add_argument("--requests", type=int, default=200)
+    parser.add_argument("--groups", type=int, default=200)
+    parser.add_argument("--pool", type=int, nargs="+", default=[0, database.DB_READ_POOL_SIZE])
+    asyncio.run(main_async(parser.parse_args()))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,117 @@
+"""
+Бенчмарк разбора xls/xlsx-файлов расписания: один процесс против пула процессов.
+
+Генерирует синтетический корпус книг в формате Blackboard (День / Часы / группы)
+и замеряет ScheduleProcessor.parse_files с разным числом воркеров.
+С --readers дополнительно сравнивает старое (_read_rows) и быстрое чтение книги:
+время и пик памяти (tracemalloc) на один файл.
+
+    python -m tools.bench_schedule_parse --files 24 --groups 30 --workers 1 4
+    python -m tools.bench_schedule_parse --files 8 --groups 60 --readers
+"""
+import argparse
+import os
+import random
+import sys
+import tempfile
+import time
+import tracemalloc
+
+sys.path.append(os.getcwd())
+
+from app.services.schedule_sync import ScheduleProcessor
+
+SUBJECTS = ["Математика", "Физика", "История", "Программирование", "Экономика", "Химия 1 п/г"]
+TEACHERS = ["Иванов И.И.", "доцент Петров П.П.", "Сидорова А.В.", "Не указан"]
+ROOMS = ["Ауд. 101", "Б-204", "Ауд. 315", "Спортзал"]
+TIMES = ["08:30-10:00", "10:15-11:45", "12:00-13:30", "14:10-15:40", "15:50-17:20", "17:30-19:00"]
+MONTHS = ["сентября", "октября", "ноября", "декабря"]
+
+
+def make_workbook(path: str, groups: int, days: int, seed: int):
+    import openpyxl
+
+    rnd = random.Random(seed)
+    wb = openpyxl.Workbook()
+    ws = wb.active
+    ws.append(["Расписание занятий"])
+    ws.append(["День", "Часы", *[f"ГР-{seed}{g:02d}" for g in range(groups)]])
+    for day in range(days):
+        date_cell = f"{day % 28 + 1} {MONTHS[day // 28 % len(MONTHS)]}"
+        for slot, time_slot in enumerate(TIMES):
+            row = [date_cell if slot == 0 else "", time_slot]
+            for _ in range(groups):
+                if rnd.random() < 0.6:
+                    row.append(f"{rnd.choice(SUBJECTS)}\n{rnd.choice(TEACHERS)}\n{rnd.choice(ROOMS)}")
+                else:
+                    row.append(None)
+            ws.append(row)
+    wb.save(path)
+
+
+def build_corpus(root: str, files: int, groups: int, days: int) -> list[tuple[str, str, str]]:
+    jobs = []
+    faculty_dir = os.path.join(root, "ФЭУ")
+    os.makedirs(faculty_dir, exist_ok=True)
+    for i in range(files):
+        path = os.path.join(faculty_dir, f"Нечетная неделя_{i + 1} курс_{i}.xlsx")
+        make_workbook(path, groups, days, seed=i)
+        jobs.append((path, "ФЭУ", str(i % 5 + 1)))
+    return jobs
+
+
+def compare_readers(jobs: list[tuple[str, str, str]]):
+    for fast in (False, True):
+        processor = ScheduleProcessor()
+        processor.fast_reader = fast
+        elapsed = 0.0
+        peak = 0
+        lessons = 0
+        for path, faculty, course in jobs:
+            tracemalloc.start()
+            started = time.perf_counter()
+            lessons += len(processor.process_single_file(path, faculty, course))
+            elapsed += time.perf_counter() - started
+            peak = max(peak, tracemalloc.get_traced_memory()[1])
+            tracemalloc.stop()
+        name = "fast" if fast else "legacy"
+        print(
+            f"reader={name:<7} {elapsed / len(jobs) * 1000:8.1f} мс/файл  "
+            f"пик памяти {peak / 1024 / 1024:6.1f} МБ  занятий={lessons}"
+        )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--files", type=int, default=24)
+    parser.add_argument("--groups", type=int, default=30)
+    parser.add_argument("--days", type=int, default=14)
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, os.cpu_count() or 1])
+    parser.add_argument("--readers", action="store_true", help="сравнить старое и быстрое чтение книг")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as root:
+        print(f"Генерация корпуса: {args.files} файлов × {args.groups} групп × {args.days} дней...")
+        jobs = build_corpus(root, args.files, args.groups, args.days)
+
+        if args.readers:
+            compare_readers(jobs)
+            return
+
+        baseline = None
+        for workers in args.workers:
+            processor = ScheduleProcessor()
+            processor.parse_workers = workers
+            started = time.perf_counter()
+            results = processor.parse_files(jobs)
+            elapsed = time.perf_counter() - started
+            lessons = sum(len(r) for r in results)
+            baseline = baseline or elapsed
+            print(
+                f"workers={workers:<3} {elapsed:7.2f}s  занятий={lessons:<8} "
+                f"ускорение x{baseline / elapsed:.2f}"
+            )
+
+
+if __name__ == "__main__":
+    main()
@@ -7,9 +7,7 @@ import os
 sys.path.append(os.getcwd())
 
 from app.core.config import PARSING_YEARS
-from app.services.clustering import run_clustering
-from app.services.cluster_mapper import map_clusters_to_groups
-from app.services.subject_stats import calculate_subject_stats
+from app.services.rating_updater import run_full_recluster
 from app.core.database import initialize_database
 
 async def recluster_all():
@@ -18,17 +16,10 @@ async def recluster_all():
     # Инициализация БД
     await initialize_database()
     
-    logging.info(f"Начинаю пересчет кластеров для годов: {PARSING_YEARS}")
+    logging.info(f"Начинаю полный пересчет кластеров для годов: {PARSING_YEARS}")
     
-    for year in PARSING_YEARS:
-        logging.info(f"--- Обработка {year} года ---")
-        await run_clustering(enrollment_year=year)
-    
-    logging.info("--- Обновление маппинга кластеров на группы ---")
-    await map_clusters_to_groups()
-    
-    logging.info("--- Пересчет статистики предметов ---")
-    await calculate_subject_stats()
+    # Полная перекластеризация + маппинг кластеров на группы + статистика предметов
+    await run_full_recluster()
     
     logging.info("🚀 Пересчет успешно завершен!")
 